@@ -0,0 +1,448 @@
+"""
+Offline cycle benchmark: runs full file-transfer cycles (direct and
+proxy) and, where Firefox and geckodriver are installed, browser cycles
+against local stand-ins, and reports cycles per hour, per-phase time and
+bytes moved.
+
+    python -m benchmarks.cycle_benchmark --cycles 5 --save base.json
+    python -m benchmarks.cycle_benchmark --compare base.json --tolerance 20
+
+Nothing leaves the host. Every target is served by an HTTPS stand-in:
+masque-plus is a SOCKS5 stand-in that sends each CONNECT there, direct
+curl is pointed there with --connect-to (HTTP/1.1 over TLS, the stand-in
+has no HTTP/3), and tcpdump and sudo are fakes put first on PATH (tcpdump
+records its invocations in <work dir>/tcpdump.jsonl). Breaker, timeout,
+endpoint and payload state is kept in the work directory, not ~/.cache.
+
+Cycles per hour leave out REST_TIME. "overhead" is the cycle time spent
+outside the traffic phase: capture and proxy start and stop, the part a
+regression in the loop itself shows up in.
+"""
+
+# Imports #
+import argparse
+import contextlib
+import io
+import json
+import os
+import shlex
+import shutil
+import socket
+import sys
+import tempfile
+import types
+
+import file_transfer_with_proxy
+from traffic_tools.core import STEPS, TransferLoop
+from traffic_tools.endpoints import EndpointSelector
+from traffic_tools.health import TargetHealth
+from traffic_tools.masque import MasqueProxy
+from traffic_tools.metrics import percentile
+from traffic_tools.payloads import PayloadPool
+from traffic_tools.standins import HttpStandIn, QuicStandIn, make_certificate
+from traffic_tools.supervisor import ProcessSupervisor
+from traffic_tools.timeouts import AdaptiveTimeouts
+from traffic_tools.tunnels import get_backend
+
+# Constants #
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ("direct", "proxy", "browser")
+PHASES = ("capture_start", "proxy_start", "traffic", "proxy_stop", "capture_stop")
+STANDIN_SETTINGS = (  # Settings the browser cycles take over from the transfer ones
+    "OUTPUT_DIR",
+    "PROXY_HOST",
+    "PROXY_PORT",
+    "PROXY_MODE",
+    "TUNNEL_BACKEND",
+    "MASQUE_ENDPOINTS",
+)
+YOUTUBE_PAGES = {  # Enough of YouTube for BrowserLoop to find a video
+    "/results": "<html><body>"
+    + "".join(
+        f'<ytd-video-renderer><a id="thumbnail" href="/watch?v={i}">{i}</a>'
+        "</ytd-video-renderer>"
+        for i in range(5)
+    )
+    + "</body></html>",
+    "/watch": '<html><body><video src="/videoplayback" muted></video></body></html>',
+}
+
+
+# Classes #
+class LocalTransferLoop(TransferLoop):
+    """
+    A TransferLoop whose direct mode reaches the stand-in: curl connects
+    every host to `connect_to` instead (over TCP, without --http3-only).
+    """
+
+    connect_to: str = None
+
+    def get_transport_options(self) -> list:
+        if self.mode == "direct":
+            return ["--connect-to", f"::{self.connect_to}"]
+        return super().get_transport_options()
+
+
+# Functions #
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_wrapper(bin_dir: str, name: str, command: list) -> str:
+    """An executable `name` in `bin_dir` running `command` with its arguments."""
+    path = os.path.join(bin_dir, name)
+    with open(path, "w") as file:
+        file.write("#!/bin/sh\n")
+        file.write(f"export PYTHONPATH={shlex.quote(ROOT)}\n")
+        file.write(f'exec {" ".join(shlex.quote(arg) for arg in command)} "$@"\n')
+    os.chmod(path, 0o755)
+    return path
+
+
+def get_settings(module, **overrides) -> types.SimpleNamespace:
+    """The uppercase constants of a script module, with `overrides`."""
+    settings = {name: getattr(module, name) for name in dir(module) if name.isupper()}
+    settings.update(overrides)
+    return types.SimpleNamespace(**settings)
+
+
+def get_tunnel(
+    settings, supervisor, steps: dict, work_dir: str, masque: str
+) -> MasqueProxy:
+    """The masque-plus stand-in, with its endpoint ranking kept in `work_dir`."""
+    endpoints = EndpointSelector(
+        settings.MASQUE_ENDPOINTS,
+        path=os.path.join(work_dir, "endpoints.json"),
+        ttl=settings.ENDPOINT_CACHE_TTL,
+    )
+    backend = get_backend(
+        "masque-plus",
+        binary=masque,
+        host=settings.PROXY_HOST,
+        port=settings.PROXY_PORT,
+        supervisor=supervisor,
+    )
+    return MasqueProxy(
+        settings, supervisor, steps, endpoints=endpoints, backend=backend
+    )
+
+
+def isolate_state(loop: TransferLoop, work_dir: str) -> None:
+    """Keep a loop's breaker and timeout state in `work_dir`."""
+    s = loop.settings
+    loop.health = TargetHealth(
+        os.path.join(work_dir, f"health_{loop.mode}.json"),
+        failure_threshold=s.BREAKER_FAILURES,
+        cooldown=s.BREAKER_COOLDOWN,
+    )
+    if loop.timeouts:
+        loop.timeouts = AdaptiveTimeouts(
+            os.path.join(work_dir, f"timeouts_{loop.mode}.json"), s.TIMEOUT_SEC
+        )
+
+
+def run_transfer_cycles(
+    mode: str,
+    settings,
+    cycles: int,
+    seed: int,
+    http: HttpStandIn,
+    supervisor,
+    work_dir: str,
+    masque: str,
+    payload_pool: PayloadPool = None,
+):
+    """Run `cycles` file-transfer cycles in `mode`, yield their measurements."""
+    tunnel = None
+    if mode == "proxy":
+        tunnel = get_tunnel(settings, supervisor, STEPS[mode], work_dir, masque)
+    loop = LocalTransferLoop(
+        settings, mode, supervisor, payload_pool=payload_pool, tunnel=tunnel
+    )
+    loop.connect_to = http.address
+    isolate_state(loop, work_dir)
+    try:
+        for cycle in range(1, cycles + 1):
+            moved = http.bytes_sent + http.bytes_received
+            result = loop.run_cycle(cycle, seed=seed + cycle)
+            result["moved"] = http.bytes_sent + http.bytes_received - moved
+            yield result
+    finally:
+        loop.close()
+
+
+def run_browser_cycles(
+    settings,
+    cycles: int,
+    seed: int,
+    watch_time: float,
+    http: HttpStandIn,
+    supervisor,
+    work_dir: str,
+    masque: str,
+):
+    """Run `cycles` browser cycles through the proxy, yield their measurements."""
+    # Imported here: needs selenium and the patched geckodriver package
+    import youtube_loop_firefox_with_proxy
+    from traffic_tools.browser import STEPS as BROWSER_STEPS
+    from traffic_tools.browser import BrowserLoop, build_firefox_options
+
+    # The YouTube script's settings, on the same stand-ins as the transfer cycles
+    settings = get_settings(
+        youtube_loop_firefox_with_proxy,
+        WATCH_TIME=watch_time,
+        **{name: getattr(settings, name) for name in STANDIN_SETTINGS},
+    )
+    profile = os.path.join(work_dir, "firefox_profile")
+    os.makedirs(profile, exist_ok=True)
+    options = build_firefox_options(settings, profile, "proxy")
+    options.add_argument("-headless")
+    options.accept_insecure_certs = True  # The stand-in's certificate is self-signed
+    tunnel = get_tunnel(settings, supervisor, BROWSER_STEPS["proxy"], work_dir, masque)
+    loop = BrowserLoop(settings, "proxy", supervisor, options, tunnel=tunnel)
+    try:
+        for cycle in range(1, cycles + 1):
+            moved = http.bytes_sent + http.bytes_received
+            result = loop.run_cycle(cycle, seed=seed + cycle)
+            result["mode"] = "browser"
+            result["moved"] = http.bytes_sent + http.bytes_received - moved
+            yield result
+    finally:
+        loop.close()
+
+
+def summarize(results: list) -> dict:
+    """Per mode: cycles per hour, median cycle, overhead and phase times, bytes moved."""
+    summary = {}
+    for mode in MODES:
+        ran = [r for r in results if r["mode"] == mode and not r["skipped"]]
+        if not ran:
+            continue
+        durations = [r["duration"] for r in ran]
+        cycle_time = percentile(durations, 50)
+        summary[mode] = {
+            "cycles": len(ran),
+            "skipped": sum(r["mode"] == mode and r["skipped"] for r in results),
+            "cycles_per_hour": 3600 / cycle_time if cycle_time else None,
+            "cycle_time": cycle_time,
+            "overhead": percentile(
+                [r["duration"] - r["phases"].get("traffic", 0) for r in ran], 50
+            ),
+            "phases": {
+                phase: percentile([r["phases"][phase] for r in ran], 50)
+                for phase in PHASES
+                if all(phase in r["phases"] for r in ran)
+            },
+            "moved_mb": percentile([r["moved"] for r in ran], 50) / 1024 / 1024,
+        }
+    return summary
+
+
+def print_summary(summary: dict) -> None:
+    print(
+        f"{'mode':<8} {'cycles':>6} {'cycles/h':>9} {'cycle':>8} {'overhead':>9} "
+        f"{'moved':>9}  phases"
+    )
+    for mode, row in summary.items():
+        phases = ", ".join(f"{name} {t:.2f}s" for name, t in row["phases"].items())
+        skipped = f" ({row['skipped']} skipped)" if row["skipped"] else ""
+        print(
+            f"{mode:<8} {row['cycles']:>6} {row['cycles_per_hour']:>9.0f} "
+            f"{row['cycle_time']:>7.2f}s {row['overhead']:>8.2f}s "
+            f"{row['moved_mb']:>7.1f}MB  {phases}{skipped}"
+        )
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of more than `tolerance` percent against a saved summary."""
+    regressions = []
+    for mode, row in summary.items():
+        base = baseline.get(mode)
+        if not base:
+            continue
+        if row["cycles_per_hour"] < base["cycles_per_hour"] * (1 - tolerance / 100):
+            regressions.append(
+                f"{mode}: {row['cycles_per_hour']:.0f} cycles/h, "
+                f"was {base['cycles_per_hour']:.0f}"
+            )
+        if row["overhead"] > base["overhead"] * (1 + tolerance / 100):
+            regressions.append(
+                f"{mode}: {row['overhead']:.2f}s overhead, was {base['overhead']:.2f}s"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=3, help="cycles per mode")
+    parser.add_argument(
+        "--modes", default=",".join(MODES), help="comma-separated: " + ", ".join(MODES)
+    )
+    parser.add_argument("--curl", default=shutil.which("curl"), help="curl binary")
+    parser.add_argument(
+        "--proxy-mode",
+        choices=("persistent", "per_cycle"),
+        default=file_transfer_with_proxy.PROXY_MODE,
+    )
+    parser.add_argument(
+        "--handshake", type=float, default=0.3, help="fake masque-plus setup seconds"
+    )
+    parser.add_argument("--min-kb", type=int, default=10, help="smallest body served")
+    parser.add_argument("--max-kb", type=int, default=500, help="largest body served")
+    parser.add_argument(
+        "--watch-time", type=float, default=5, help="browser cycles' WATCH_TIME"
+    )
+    parser.add_argument("--seed", type=int, default=1, help="workload seed base")
+    parser.add_argument("--work-dir", help="kept afterwards (default: a temp dir)")
+    parser.add_argument("--save", help="write the summary to this JSON file")
+    parser.add_argument("--compare", help="summary JSON to check for regressions")
+    parser.add_argument(
+        "--tolerance", type=float, default=20, help="allowed regression (percent)"
+    )
+    parser.add_argument("--verbose", action="store_true", help="show the cycle logs")
+    args = parser.parse_args()
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    if not args.curl:
+        parser.error("curl not found, pass --curl")
+    if "browser" in modes and not (
+        shutil.which("firefox") and shutil.which("geckodriver")
+    ):
+        print("[BENCH] Firefox or geckodriver not found, skipping browser cycles")
+        modes.remove("browser")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="cycle_benchmark_")
+    bin_dir = os.path.join(work_dir, "bin")
+    out_dir = os.path.join(work_dir, "out")
+    os.makedirs(bin_dir, exist_ok=True)
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"[BENCH] Work directory: {work_dir}")
+
+    certfile, keyfile = make_certificate(work_dir)
+    http = HttpStandIn(
+        min_size=args.min_kb * 1024,
+        max_size=args.max_kb * 1024,
+        certfile=certfile,
+        keyfile=keyfile,
+        pages=YOUTUBE_PAGES,
+        seed=args.seed,
+    )
+    quic = QuicStandIn(delay=0.005)
+
+    # Fakes first on PATH; masque-plus is called by path, like ./masque-plus
+    standins = [sys.executable, "-m", "traffic_tools.standins"]
+    write_wrapper(bin_dir, "sudo", [])
+    tcpdump_record = os.path.join(work_dir, "tcpdump.jsonl")
+    write_wrapper(
+        bin_dir, "tcpdump", standins + ["tcpdump", "--record", tcpdump_record, "--"]
+    )
+    masque = write_wrapper(
+        bin_dir,
+        "masque-plus",
+        standins
+        + ["masque-plus", "--redirect", http.address, "--delay", str(args.handshake)],
+    )
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+
+    proxy_port = get_free_port()
+    settings = get_settings(
+        file_transfer_with_proxy,
+        OUTPUT_DIR=out_dir,
+        CURL_PATH=args.curl,
+        PROXY_PORT=proxy_port,
+        PROXY_URL=f"socks5h://127.0.0.1:{proxy_port}",
+        PROXY_MODE=args.proxy_mode,
+        TUNNEL_BACKEND="masque-plus",
+        MASQUE_ENDPOINTS=[quic.endpoint],
+    )
+    supervisor = ProcessSupervisor(
+        "cycle_benchmark.py", run_dir=os.path.join(work_dir, "run")
+    )
+    payload_pool = None
+    if settings.PAYLOAD_POOL_MB:
+        payload_pool = PayloadPool(
+            path=os.path.join(work_dir, "payload.pool"),
+            size=settings.PAYLOAD_POOL_MB * 1024 * 1024,
+        )
+
+    results = []
+    try:
+        for mode in modes:
+            print(f"[BENCH] {args.cycles} {mode} cycles...")
+            if mode == "browser":
+                cycles = run_browser_cycles(
+                    settings,
+                    args.cycles,
+                    args.seed,
+                    args.watch_time,
+                    http,
+                    supervisor,
+                    work_dir,
+                    masque,
+                )
+            else:
+                cycles = run_transfer_cycles(
+                    mode,
+                    settings,
+                    args.cycles,
+                    args.seed,
+                    http,
+                    supervisor,
+                    work_dir,
+                    masque,
+                    payload_pool=payload_pool,
+                )
+            log = io.StringIO()
+            while True:
+                with contextlib.redirect_stdout(sys.stdout if args.verbose else log):
+                    result = next(cycles, None)
+                if result is None:
+                    break
+                results.append(result)
+                status = "skipped" if result["skipped"] else "ok"
+                print(
+                    f"  -> {mode} #{result['cycle']}: {result['duration']:.2f}s, "
+                    f"{result['moved'] / 1024 / 1024:.1f}MB moved ({status})"
+                )
+                if result["skipped"] and not args.verbose:
+                    print(log.getvalue()[-2000:])
+                log.seek(0)
+                log.truncate()
+    except KeyboardInterrupt:
+        print("\n[STOP] Benchmark stopped by user.")
+    finally:
+        supervisor.close()
+        http.close()
+        quic.close()
+        if payload_pool:
+            payload_pool.close()
+
+    captures = 0
+    if os.path.exists(tcpdump_record):
+        with open(tcpdump_record, "r") as file:
+            captures = sum(1 for line in file)
+    print(
+        f"\n[RESULT] {http.requests} requests served, {http.errors} errors, "
+        f"{captures} tcpdump runs recorded (REST_TIME not included)"
+    )
+    summary = summarize(results)
+    print_summary(summary)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(summary, file, indent=2)
+    if not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if args.compare:
+        with open(args.compare, "r") as file:
+            regressions = compare(summary, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"[BENCH] No regression beyond {args.tolerance:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
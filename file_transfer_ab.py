@@ -0,0 +1,112 @@
+import json
+import os
+import random
+import time
+
+import file_transfer_with_proxy as settings
+from traffic_tools.ab import CYCLES_SUFFIX, compare, print_comparison, read_cycles
+from traffic_tools.core import TransferLoop, get_timestamp, remove_upload_files
+from traffic_tools.payloads import PayloadPool
+from traffic_tools.supervisor import ProcessSupervisor
+
+# ==========================================
+# 1. A/B CONFIGURATION
+# ==========================================
+# Both arms take the traffic, target and proxy settings of
+# file_transfer_with_proxy.py, so they only differ in the route:
+# A = direct (curl --http3-only), B = proxy (curl via the MASQUE client).
+# Each pair runs one cycle of each arm with the same workload seed.
+AB_ORDER = "random"          # "abab" = A then B in every pair, "random" = the order of each pair is a coin flip
+AB_SEED = 1000               # Pair N runs the workload seeded with AB_SEED + N in both arms
+AB_REST_TIME = 15            # Rest time between two cycles (seconds)
+AB_PROXY_MODE = "per_cycle"  # A persistent tunnel would idle (and be captured) in the direct cycles
+ARMS = ("direct", "proxy")
+
+# ==========================================
+# 2. MAIN LOOP
+# ==========================================
+
+def print_cycle(result):
+    """One line per cycle, for following the run"""
+    if result["skipped"]:
+        print(f"  -> [{result['mode']}] skipped")
+        return
+    ttfb = f"{result['ttfb_ms']:.0f}ms" if result["ttfb_ms"] is not None else "-"
+    capture = f"{result['capture_bytes'] / 1024 / 1024:.1f}MB" if result["capture_bytes"] is not None else "-"
+    print(f"  -> [{result['mode']}] {result['ok']}/{result['requests']} ok, "
+          f"{result['bytes'] / 1024 / 1024:.1f}MB at {result['mbps']:.1f} Mbps, "
+          f"ttfb {ttfb}, pcap {capture}, {result['duration']:.1f}s")
+
+def main():
+    if not os.path.exists(settings.OUTPUT_DIR):
+        os.makedirs(settings.OUTPUT_DIR)
+    cycles_path = os.path.join(settings.OUTPUT_DIR, f"ab_{get_timestamp()}{CYCLES_SUFFIX}")
+
+    print("=" * 70)
+    print("HTTP/3 Traffic A/B Benchmark: DIRECT vs MASQUE PROXY")
+    print("=" * 70)
+    print(f"Proxy: {settings.PROXY_URL} ({settings.TUNNEL_BACKEND}, {AB_PROXY_MODE})")
+    print(f"Order: {AB_ORDER}, workload seed: {AB_SEED} + pair")
+    print(f"Results: {cycles_path}")
+    print("=" * 70)
+
+    # Clean up processes left over by a crashed run (other loops are left alone)
+    supervisor = ProcessSupervisor(os.path.basename(__file__))
+    supervisor.cleanup_stale()
+
+    try:
+        user_val = input("\nEnter pair count (Enter=Infinite): ").strip()
+        max_pairs = int(user_val) if user_val else 0
+    except (ValueError, EOFError):
+        max_pairs = 0
+
+    # Shared by both arms, so the pool is only generated once
+    payload_pool = None
+    if settings.PAYLOAD_POOL_MB:
+        payload_pool = PayloadPool(size=settings.PAYLOAD_POOL_MB * 1024 * 1024)
+
+    # Each loop draws its workload from its own RNG, seeded per pair
+    order_rng = random.Random(AB_SEED)
+    loops = {}
+    pair = 1
+
+    try:
+        loops["direct"] = TransferLoop(settings, "direct", supervisor, payload_pool)
+        loops["proxy"] = TransferLoop(settings, "proxy", supervisor, payload_pool, proxy_mode=AB_PROXY_MODE)
+
+        while max_pairs <= 0 or pair <= max_pairs:
+            order = list(ARMS)
+            if AB_ORDER == "random":
+                order_rng.shuffle(order)
+
+            for arm in order:
+                print(f"\n{'=' * 70}")
+                print(f" PAIR #{pair}" + (f" / {max_pairs}" if max_pairs > 0 else "") + f" - {arm.upper()}")
+                print(f"{'=' * 70}")
+                result = loops[arm].run_cycle(pair, seed=AB_SEED + pair)
+                result["pair"] = pair
+                result["position"] = order.index(arm)
+                with open(cycles_path, "a") as f:
+                    f.write(json.dumps(result) + "\n")
+                print_cycle(result)
+
+                print(f"\n[SYSTEM] Resting {AB_REST_TIME}s...")
+                time.sleep(AB_REST_TIME)
+            pair += 1
+
+    except KeyboardInterrupt:
+        print("\n[STOP] Script stopped by user.")
+    finally:
+        print("\n[CLEANUP] Cleaning up...")
+        for loop in loops.values():
+            loop.close()
+        supervisor.close()
+        remove_upload_files()
+
+        if os.path.exists(cycles_path):
+            print(f"\n[RESULT] Medians with bootstrap CIs, overhead of the proxy on paired cycles ({cycles_path}):")
+            print_comparison(compare(read_cycles([cycles_path])))
+        print("[DONE] Finished.")
+
+if __name__ == "__main__":
+    main()
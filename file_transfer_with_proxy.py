@@ -1,12 +1,7 @@
-import subprocess
-import time
-import os
-import signal
-import datetime
-import random
-import string
 import sys
 
+from traffic_tools.core import run_loop
+
 # ==========================================
 # 1. SYSTEM CONFIGURATION
 # ==========================================
@@ -19,12 +14,45 @@ REST_TIME = 15   # Rest time between cycles (seconds)
 PROXY_HOST = "127.0.0.1"
 PROXY_PORT = 1080
 PROXY_URL = f"socks5h://{PROXY_HOST}:{PROXY_PORT}"  # socks5h to resolve DNS via proxy
+PROXY_READY_TIMEOUT = 30  # Max wait for the proxy to pass traffic (seconds)
+PROXY_PROBE_TARGET = "cloudflare-quic.com:443"  # CONNECT through the tunnel to check it ("" = handshake only)
+PROXY_MODE = "per_cycle"   # "per_cycle" = restart masque-plus every cycle, "persistent" = keep it across cycles (its health probes land in the pcaps)
+PROXY_ROTATE_EVERY = 0     # Persistent mode: restart masque-plus every N cycles (0 = only when unhealthy)
+PROXY_CHECK_INTERVAL = 10  # Persistent mode: seconds between health checks
+TUNNEL_BACKEND = "masque-plus"  # MASQUE client: "masque-plus" or "usque" (both ship in the image)
+MASQUE_ENDPOINTS = [       # Candidates, ranked by QUIC RTT; the fastest one is used
+    "162.159.198.2:443",
+    "162.159.198.1:443",
+]
+ENDPOINT_CACHE_TTL = 600   # Seconds a ranking is reused before probing again
+MAX_ENDPOINT_ATTEMPTS = 2  # Endpoints tried per start before giving up
 
 # Traffic Configuration
 UPLOAD_SIZE_MB = 5 
 DOWNLOAD_PHOTOS = 8     # Number of photos downloaded per cycle
 DOWNLOAD_WEBSITES = 40    # Number of websites downloaded per cycle (8-10)
+WEBSITE_JITTER = 2        # Up to this many extra websites, drawn at random per cycle
 TIMEOUT_SEC = 25         # Safe timeout
+DOWNLOAD_CONCURRENCY = 8  # Parallel downloads (1 = one after another)
+MAX_PER_HOST = 2          # Max in-flight requests to the same host
+REQUEST_DELAY = 0.2       # Pause of each worker after a request (seconds)
+DOWNLOAD_MODE = "workers"  # "workers" = one curl per URL, "batch" = one curl --parallel per phase (opt-in)
+UPLOAD_MODE = "file"       # "file" = temp file + multipart form upload, "stream" = octet-stream POST piped into curl (opt-in)
+PAYLOAD_POOL_MB = 64       # Random data generated once and sliced by uploads (0 = fresh os.urandom)
+
+# Load scheduler (SCHEDULE_MODE = "rate"): photos, websites and uploads are
+# mixed in the ratio DOWNLOAD_PHOTOS : DOWNLOAD_WEBSITES : 1
+SCHEDULE_MODE = "fixed"     # "fixed" = the counts above, "rate" = the load target below
+TARGET_MBPS = 50            # Throughput target (0 = unlimited)
+TARGET_RPS = 10             # Requests per second (0 = unlimited)
+POISSON_ARRIVALS = True     # Random (exponential) gaps between requests instead of even ones
+CYCLE_BYTE_BUDGET_MB = 500  # End the cycle's traffic after this much data (0 = no limit)
+CYCLE_TIME_BUDGET = 60      # ... or after this many seconds (0 = no limit)
+
+# Target health: hosts that keep failing to connect or timing out are skipped
+BREAKER_FAILURES = 3        # Consecutive exit codes 7/28 before a host is skipped
+BREAKER_COOLDOWN = 300      # Seconds before a skipped host gets one probe request
+ADAPTIVE_TIMEOUTS = True    # Timeouts per target from its p99 latency (TIMEOUT_SEC until 20 samples)
 
 # ==========================================
 # 2. TARGET CONFIGURATION (FIXED - HTTP/3 ONLY)
@@ -46,332 +74,11 @@ VALID_DOWNLOAD_TARGETS = [
 ]
 
 # ==========================================
-# 3. SYSTEM FUNCTIONS (PCAP & PROXY)
-# ==========================================
-
-def get_timestamp():
-    return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-
-def start_tcpdump(filename):
-    """Start recording PCAP file, filter out VNC ports"""
-    pcap_path = os.path.join(OUTPUT_DIR, filename)
-    print(f"\n[SYSTEM] 1. Starting TCPDUMP -> {pcap_path}")
-    
-    # Filter out ports 5901/6901 to avoid recording VNC image traffic
-    cmd = [
-        "sudo", "tcpdump", "-i", INTERFACE,
-        "-w", pcap_path,
-        "not", "port", "6901", "and", "not", "port", "5901"
-    ]
-    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    return proc
-
-def stop_tcpdump(proc):
-    """Stop tcpdump safely"""
-    print("[SYSTEM] 6. Stopping TCPDUMP...")
-    try:
-        proc.send_signal(signal.SIGTERM)
-        proc.wait(timeout=5)
-    except subprocess.TimeoutExpired:
-        subprocess.run(["sudo", "kill", "-9", str(proc.pid)], stderr=subprocess.DEVNULL)
-        proc.wait()
-    except Exception as e:
-        print(f"  -> Error stopping tcpdump: {e}")
-
-def start_proxy():
-    """Start Masque Client (Proxy)"""
-    print(f"[PROXY]  2. Starting Masque Client...")
-    
-    # Clean old processes if any
-    subprocess.run(["pkill", "-9", "masque-plus"], stderr=subprocess.DEVNULL)
-    time.sleep(2)  # Increased wait for cleanup
-    
-    cmd = [
-        "./masque-plus", "--endpoint", "162.159.198.2:443"
-    ]
-    
-    # Capture output for debugging
-    proc = subprocess.Popen(
-        cmd, 
-        stdout=subprocess.PIPE, 
-        stderr=subprocess.PIPE,
-        preexec_fn=os.setsid,
-        text=True
-    )
-    
-    # Wait longer for proxy to establish connection
-    print("  -> Waiting for proxy to establish QUIC connection...")
-    time.sleep(8)  # Increased from 5 to 8 seconds
-    
-    # Check if process is still running
-    if proc.poll() is not None:
-        stdout, stderr = proc.communicate()
-        print("  -> ERROR: masque-plus exited prematurely!")
-        print(f"  -> STDOUT: {stdout[:200]}")
-        print(f"  -> STDERR: {stderr[:200]}")
-        return None
-    
-    # Test if proxy is actually listening
-    for attempt in range(3):
-        test_result = subprocess.run(
-            ["netstat", "-tuln"], 
-            capture_output=True, 
-            text=True
-        )
-        if f":{PROXY_PORT}" in test_result.stdout:
-            print(f"  ✓ Masque client started (PID: {proc.pid})")
-            print(f"  ✓ Proxy listening on {PROXY_HOST}:{PROXY_PORT}")
-            return proc
-        else:
-            if attempt < 2:
-                print(f"  -> Port not ready yet, waiting... (attempt {attempt + 1}/3)")
-                time.sleep(2)
-    
-    print(f"  ✗ WARNING: Proxy may not be fully ready on port {PROXY_PORT}")
-    print(f"  -> Continuing anyway, PID: {proc.pid}")
-    return proc
-
-def stop_proxy(proc):
-    """Stop Masque Client"""
-    print("[PROXY]  5. Stopping Masque Client (Closing Flow)...")
-    
-    if proc:
-        try:
-            print(f"  -> Killing process group for PID {proc.pid}...")
-            os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
-        except Exception as e:
-            print(f"  -> Could not kill process group: {e}")
-    
-    subprocess.run(["pkill", "-9", "masque-plus"], stderr=subprocess.DEVNULL)
-    time.sleep(1)
-
-def get_random_string(length=10):
-    letters = string.ascii_lowercase + string.digits
-    return ''.join(random.choice(letters) for i in range(length))
-
-def generate_dummy_file(filename, size_mb):
-    """Generate dummy file with random content (hard to compress)"""
-    actual_size = size_mb + random.uniform(-0.5, 0.5)
-    if actual_size < 0.1: actual_size = 0.1
-    with open(filename, 'wb') as f:
-        f.write(os.urandom(int(actual_size * 1024 * 1024)))
-
-# ==========================================
-# 4. TRAFFIC FUNCTIONS (CURL HTTP/3 WITH PROXY)
-# ==========================================
-
-def get_random_photo_url():
-    """Generate random photo URL from Picsum"""
-    width = random.randint(800, 1920)
-    height = random.randint(600, 1080)
-    seed = get_random_string(5)
-    return f"https://picsum.photos/seed/{seed}/{width}/{height}"
-
-def get_random_website_url():
-    """Generate random website URL"""
-    domain = random.choice(VALID_DOWNLOAD_TARGETS)
-    return f"{domain}/?v={get_random_string(8)}"
-
-def run_download_action(target, download_type="file"):
-    """Download via MASQUE PROXY (proxy handles HTTP/3)"""
-    type_label = "PHOTO" if download_type == "photo" else "WEB"
-    print(f"  [{type_label}] {target}")
-    
-    cmd = [
-        CURL_PATH, 
-        "--proxy", PROXY_URL,   # Route through Masque - IT handles HTTP/3
-        # NOTE: NO --http3-only! Masque proxy converts traffic to HTTP/3
-        "--ipv4",               # IPv4 only
-        "-k",                   # Ignore SSL errors
-        "-L",                   # Follow redirects
-        "-s",                   # Silent mode
-        "-o", "/dev/null",      # Discard output
-        "--max-time", str(TIMEOUT_SEC), 
-        "-A", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36",
-        target
-    ]
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, timeout=TIMEOUT_SEC+5)
-        if result.returncode != 0:
-            stderr = result.stderr.decode('utf-8', errors='ignore')
-            stdout = result.stdout.decode('utf-8', errors='ignore')
-            print(f"    ✗ Failed (code {result.returncode})")
-            
-            # Detailed error messages for common issues
-            if result.returncode == 3:
-                print(f"    -> Error 3: Proxy connection failed")
-                print(f"    -> Is masque-plus running? Check: ps aux | grep masque")
-            elif result.returncode == 7:
-                print(f"    -> Error 7: Failed to connect to host")
-            elif result.returncode == 28:
-                print(f"    -> Error 28: Timeout")
-            
-            if stderr:
-                print(f"    -> STDERR: {stderr[:150]}")
-        else:
-            print(f"    ✓ Success")
-    except subprocess.TimeoutExpired:
-        print(f"    ✗ Timeout after {TIMEOUT_SEC}s")
-    except Exception as e:
-        print(f"    ✗ Error: {e}")
-
-def run_upload_action():
-    """Upload via MASQUE PROXY (proxy handles HTTP/3)"""
-    target = random.choice(VALID_UPLOAD_TARGETS)
-    filename = f"up_{get_random_string(5)}.bin"
-    generate_dummy_file(filename, UPLOAD_SIZE_MB)
-    
-    print(f"  [UP]   {target} ({UPLOAD_SIZE_MB}MB via Masque Proxy)")
-    
-    cmd = [
-        CURL_PATH, 
-        "--proxy", PROXY_URL,   # Route through Masque - IT handles HTTP/3
-        # NOTE: NO --http3-only! Masque proxy converts traffic to HTTP/3
-        "--ipv4",               # IPv4 only
-        "-k",                   # Ignore SSL errors
-        "-s",                   # Silent mode
-        "-o", "/dev/null",      # Discard response
-        "--max-time", str(TIMEOUT_SEC * 2),
-        "-F", f"file=@{filename}",  # Form upload
-        "-A", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36",
-        target
-    ]
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, timeout=TIMEOUT_SEC*2+10)
-        if result.returncode != 0:
-            stderr = result.stderr.decode('utf-8', errors='ignore')
-            print(f"  ✗ Upload failed (code {result.returncode})")
-            if 'proxy' in stderr.lower():
-                print(f"  -> Proxy error - check masque-plus")
-            if stderr:
-                print(f"  -> STDERR: {stderr[:150]}")
-        else:
-            print(f"  ✓ Upload success")
-    except subprocess.TimeoutExpired:
-        print(f"  ✗ Upload timeout after {TIMEOUT_SEC*2}s")
-    except Exception as e:
-        print(f"  ✗ Error: {e}")
-    finally:
-        # Clean up dummy file immediately
-        if os.path.exists(filename): 
-            os.remove(filename)
-
-# ==========================================
-# 5. MAIN LOOP
+# 3. MAIN LOOP (traffic_tools/core.py)
 # ==========================================
 
 def main():
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        
-    print("=" * 70)
-    print("HTTP/3 Traffic Generator WITH MASQUE PROXY")
-    print("=" * 70)
-    print(f"Proxy: {PROXY_URL}")
-    print(f"Note: Masque proxy handles HTTP/3 conversion")
-    print(f"Upload size: {UPLOAD_SIZE_MB}MB per cycle")
-    print(f"Download: {DOWNLOAD_PHOTOS} photos + {DOWNLOAD_WEBSITES}-{DOWNLOAD_WEBSITES+2} websites per cycle")
-    print("=" * 70)
-
-    # Clean up old processes
-    subprocess.run(["sudo", "killall", "tcpdump"], stderr=subprocess.DEVNULL)
-    subprocess.run(["pkill", "-9", "masque-plus"], stderr=subprocess.DEVNULL)
-
-    try:
-        user_val = input("\nEnter loop count (Enter=Infinite): ").strip()
-        max_cycles = int(user_val) if user_val else 0
-    except:
-        max_cycles = 0
-
-    cycle_count = 1
-    
-    try:
-        while True:
-            if max_cycles > 0 and cycle_count > max_cycles:
-                break
-
-            print(f"\n{'=' * 70}")
-            print(f" CYCLE #{cycle_count}" + (f" / {max_cycles}" if max_cycles > 0 else ""))
-            print(f"{'=' * 70}")
-            
-            # --- STEP 1: CAPTURE PACKETS ---
-            pcap_name = f"proxy_traffic_{get_timestamp()}.pcap"
-            tcp_proc = start_tcpdump(pcap_name)
-            time.sleep(2) 
-            
-            # --- STEP 2: START PROXY ---
-            masque_proc = start_proxy()
-            
-            if masque_proc is None:
-                print("[ERROR] Failed to start masque-plus. Skipping traffic.")
-                stop_tcpdump(tcp_proc)
-                time.sleep(REST_TIME)
-                cycle_count += 1
-                continue
-            
-            # CRITICAL: Wait longer for proxy to be fully ready
-            print("  -> Waiting for proxy to be fully ready...")
-            time.sleep(3)
-            
-            # Verify proxy is still running
-            if masque_proc.poll() is not None:
-                print("[ERROR] Proxy died after starting. Skipping traffic.")
-                stop_tcpdump(tcp_proc)
-                time.sleep(REST_TIME)
-                cycle_count += 1
-                continue
-            
-            # --- STEP 3: DOWNLOAD (Traffic via Proxy) ---
-            print("[TRAFFIC] 3. Download Phase (HTTP/3 via Proxy)...")
-            
-            # Download multiple photos
-            print(f"  Downloading {DOWNLOAD_PHOTOS} photos...")
-            for i in range(DOWNLOAD_PHOTOS):
-                photo_url = get_random_photo_url()
-                run_download_action(photo_url, "photo")
-                time.sleep(0.2)  # Reduce delay to speed up
-            
-            # Download multiple websites
-            num_websites = random.randint(DOWNLOAD_WEBSITES, DOWNLOAD_WEBSITES + 2)
-            print(f"  Downloading {num_websites} websites...")
-            for i in range(num_websites):
-                website_url = get_random_website_url()
-                run_download_action(website_url, "website")
-                time.sleep(0.2)  # Reduce delay to speed up
-            
-            # --- STEP 4: UPLOAD (Traffic via Proxy) ---
-            print(f"[TRAFFIC] 4. Upload Phase (HTTP/3 via Proxy, {UPLOAD_SIZE_MB}MB)...")
-            run_upload_action()
-            
-            # --- STEP 5: STOP PROXY ---
-            stop_proxy(masque_proc)
-            time.sleep(2)
-            
-            # --- STEP 6: STOP TCPDUMP ---
-            stop_tcpdump(tcp_proc)
-            
-            # --- STEP 7: REST ---
-            print(f"\n[SYSTEM] Resting {REST_TIME}s...")
-            time.sleep(REST_TIME)
-            cycle_count += 1
-            
-    except KeyboardInterrupt:
-        print("\n[STOP] Script stopped by user.")
-    finally:
-        print("\n[CLEANUP] Cleaning up...")
-        subprocess.run(["sudo", "killall", "tcpdump"], stderr=subprocess.DEVNULL)
-        subprocess.run(["pkill", "-9", "masque-plus"], stderr=subprocess.DEVNULL)
-        
-        # Delete temporary upload files if any remain
-        for f in os.listdir("."):
-            if f.startswith("up_") and f.endswith(".bin"):
-                try:
-                    os.remove(f)
-                except:
-                    pass
-        print("[DONE] Finished.")
+    run_loop(sys.modules[__name__], mode="proxy")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
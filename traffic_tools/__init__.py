@@ -0,0 +1,9 @@
+"""
+    Traffic Tools
+    =============
+    Shared helpers for the traffic capture scripts (file transfer and
+    YouTube loops, with and without the MASQUE proxy).
+
+    Submodules are imported explicitly by the scripts, so importing this
+    package stays cheap.
+"""
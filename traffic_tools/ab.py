@@ -0,0 +1,176 @@
+"""
+Statistics of interleaved A/B runs (file_transfer_ab.py).
+
+Every cycle's measurements are appended to a `<name>.cycles.jsonl` file.
+Cycles of both arms that ran the same workload share a `pair` number,
+so the overhead of the proxy is estimated on paired cycles, which
+cancels out the drift of the network over the run. Run
+`python -m traffic_tools.ab FILE...` to print the comparison again.
+"""
+
+# Imports #
+import argparse
+import json
+import random
+
+from .metrics import percentile
+
+# Constants #
+CYCLES_SUFFIX = ".cycles.jsonl"
+COMPARED = (  # (heading, field, scale, format)
+    ("throughput", "mbps", 1, "{:.1f}Mbps"),
+    ("ttfb", "ttfb_ms", 1, "{:.0f}ms"),
+    ("total", "total_ms", 1, "{:.0f}ms"),
+    ("capture", "capture_bytes", 1 / 1024**2, "{:.1f}MB"),
+    ("moved", "bytes", 1 / 1024**2, "{:.1f}MB"),
+    ("cycle", "duration", 1, "{:.1f}s"),
+)
+CONFIDENCE = 0.95
+RESAMPLES = 2000
+
+
+# Functions #
+def median(values: list) -> float:
+    return percentile(values, 50)
+
+
+def bootstrap_ci(
+    values: list,
+    confidence: float = CONFIDENCE,
+    resamples: int = RESAMPLES,
+    seed: int = 0,
+) -> tuple:
+    """Percentile bootstrap confidence interval of the median."""
+    if not values:
+        return None, None
+    rng = random.Random(seed)
+    medians = [median(rng.choices(values, k=len(values))) for i in range(resamples)]
+    tail = (1 - confidence) / 2 * 100
+    return percentile(medians, tail), percentile(medians, 100 - tail)
+
+
+def paired_overhead(
+    pairs: list,
+    confidence: float = CONFIDENCE,
+    resamples: int = RESAMPLES,
+    seed: int = 0,
+) -> tuple:
+    """
+    Overhead of B over A in percent, median(B) / median(A) - 1, for a
+    list of (a, b) pairs, with its bootstrap confidence interval (pairs
+    are resampled together). (None, None, None) if A's median is 0.
+    """
+
+    def overhead(sample):
+        baseline = median([a for a, b in sample])
+        if not baseline:
+            return None
+        return (median([b for a, b in sample]) / baseline - 1) * 100
+
+    estimate = overhead(pairs) if pairs else None
+    if estimate is None:
+        return None, None, None
+    rng = random.Random(seed)
+    resampled = [overhead(rng.choices(pairs, k=len(pairs))) for i in range(resamples)]
+    resampled = [value for value in resampled if value is not None]
+    tail = (1 - confidence) / 2 * 100
+    return estimate, percentile(resampled, tail), percentile(resampled, 100 - tail)
+
+
+def read_cycles(paths: list) -> list:
+    cycles = []
+    for path in paths:
+        with open(path, "r") as file:
+            for line in file:
+                try:
+                    cycles.append(json.loads(line))
+                except ValueError:
+                    continue
+    return cycles
+
+
+def compare(cycles: list, baseline: str = "direct", treatment: str = "proxy") -> list:
+    """
+    One row per compared field: median and confidence interval of each
+    arm, and the paired overhead of `treatment` over `baseline`. Skipped
+    cycles and missing values are left out.
+    """
+    arms = {baseline: {}, treatment: {}}
+    for cycle in cycles:
+        if cycle.get("mode") in arms and not cycle.get("skipped"):
+            arms[cycle["mode"]][cycle.get("pair")] = cycle
+
+    rows = []
+    for heading, field, scale, fmt in COMPARED:
+        row = {"heading": heading, "format": fmt}
+        for arm in (baseline, treatment):
+            values = [
+                c[field] * scale for c in arms[arm].values() if c.get(field) is not None
+            ]
+            low, high = bootstrap_ci(values)
+            row[arm] = {
+                "n": len(values),
+                "median": median(values) if values else None,
+                "low": low,
+                "high": high,
+            }
+        pairs = [
+            (arms[baseline][pair][field], cycle[field])
+            for pair, cycle in arms[treatment].items()
+            if pair in arms[baseline]
+            and cycle.get(field) is not None
+            and arms[baseline][pair].get(field) is not None
+        ]
+        estimate, low, high = paired_overhead(pairs)
+        row["overhead"] = {"n": len(pairs), "pct": estimate, "low": low, "high": high}
+        rows.append(row)
+    return rows
+
+
+def print_comparison(
+    rows: list, baseline: str = "direct", treatment: str = "proxy"
+) -> None:
+    def cell(stats, fmt):
+        if stats["median"] is None:
+            return "-"
+        return (
+            f"{fmt.format(stats['median'])} "
+            f"[{fmt.format(stats['low'])}-{fmt.format(stats['high'])}]"
+        )
+
+    confidence = f"{CONFIDENCE * 100:.0f}% CI"
+    print(
+        f"{'metric':<12} {baseline + ' (' + confidence + ')':>30} "
+        f"{treatment + ' (' + confidence + ')':>30} {'overhead':>26}"
+    )
+    for row in rows:
+        overhead = row["overhead"]
+        if overhead["pct"] is None:
+            change = "-"
+        else:
+            change = (
+                f"{overhead['pct']:+.1f}% [{overhead['low']:+.1f}/"
+                f"{overhead['high']:+.1f}] n={overhead['n']}"
+            )
+        print(
+            f"{row['heading']:<12} {cell(row[baseline], row['format']):>30} "
+            f"{cell(row[treatment], row['format']):>30} {change:>26}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help=f"{CYCLES_SUFFIX} files")
+    parser.add_argument("--baseline", default="direct", help="mode of arm A")
+    parser.add_argument("--treatment", default="proxy", help="mode of arm B")
+    args = parser.parse_args()
+    cycles = read_cycles(args.paths)
+    if not cycles:
+        print("No cycles found")
+        return
+    rows = compare(cycles, args.baseline, args.treatment)
+    print_comparison(rows, args.baseline, args.treatment)
+
+
+if __name__ == "__main__":
+    main()
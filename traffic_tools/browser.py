@@ -0,0 +1,446 @@
+"""
+The YouTube capture loop shared by youtube_loop_firefox_with_proxy.py and
+youtube_loop_firefox_without_proxy.py.
+
+The scripts only hold their configuration constants. A `BrowserLoop`
+reads them from the script module (`settings`) and runs cycles in one
+mode: "proxy" (Firefox through the MASQUE client's SOCKS5 proxy) or
+"direct". Needs selenium and undetected_geckodriver, unlike the rest of
+the package.
+"""
+
+# Imports #
+import os
+import random
+import time
+import traceback
+
+import undetected_geckodriver as uc
+from selenium.webdriver.common.by import By
+from selenium.webdriver.firefox.options import Options
+
+from .capture import start_tcpdump, stop_tcpdump
+from .core import get_timestamp
+from .masque import MasqueProxy
+from .supervisor import ProcessSupervisor
+
+# Constants #
+MODES = ("proxy", "direct")
+STEPS = {  # Step numbers printed in the log of each mode
+    "proxy": {
+        "tcpdump": 1,
+        "proxy": 2,
+        "browser": 3,
+        "stop_proxy": 4,
+        "stop_tcpdump": 5,
+    },
+    "direct": {"tcpdump": 1, "browser": 3, "stop_tcpdump": 5},
+}
+PCAP_PREFIX = "youtube_session"
+YOUTUBE_URL = "https://www.youtube.com"
+PLAY_SCRIPT = """
+    let video = document.querySelector('video');
+    if (video) {
+        video.muted = false;
+        video.play().then(() => {
+            console.log('Video playing');
+        }).catch(err => {
+            video.muted = true;
+            video.play();
+        });
+    }
+"""
+
+
+# Functions #
+def find_firefox_profile() -> str:
+    """Find the default Firefox profile automatically"""
+    print("[PROFILE] Looking for Firefox profile...")
+
+    # Common Firefox profile locations
+    possible_paths = [
+        os.path.expanduser("~/.mozilla/firefox"),
+        "/home/headless/.mozilla/firefox",
+    ]
+
+    for base_path in possible_paths:
+        if not os.path.exists(base_path):
+            continue
+        # Look for profiles.ini, and the first profile it lists that exists
+        profiles_ini = os.path.join(base_path, "profiles.ini")
+        if os.path.exists(profiles_ini):
+            print(f"  -> Found profiles.ini at: {profiles_ini}")
+            with open(profiles_ini, "r") as f:
+                content = f.read()
+            for line in content.split("\n"):
+                if line.startswith("Path="):
+                    profile_name = line.split("=")[1].strip()
+                    profile_path = os.path.join(base_path, profile_name)
+                    if os.path.exists(profile_path):
+                        print(f"  -> Found profile: {profile_path}")
+                        return profile_path
+
+        # If no profiles.ini, look for .default or .default-release folders
+        try:
+            for item in os.listdir(base_path):
+                if ".default" in item and os.path.isdir(os.path.join(base_path, item)):
+                    profile_path = os.path.join(base_path, item)
+                    print(f"  -> Found default profile: {profile_path}")
+                    return profile_path
+        except OSError:
+            pass
+
+    print("  -> [WARNING] Could not auto-detect Firefox profile!")
+    print("  -> You may need to set FIREFOX_PROFILE_PATH manually")
+    return None
+
+
+def get_profile_path(settings) -> str:
+    """FIREFOX_PROFILE_PATH, or the auto-detected profile; None (and help) if missing"""
+    if settings.FIREFOX_PROFILE_PATH:
+        profile_path = settings.FIREFOX_PROFILE_PATH
+        print(f"Using manually set profile: {profile_path}")
+    else:
+        profile_path = find_firefox_profile()
+        if not profile_path:
+            print("\n" + "=" * 70)
+            print("ERROR: Could not find Firefox profile automatically!")
+            print("=" * 70)
+            print("\nTo find your profile manually:")
+            print("1. Open Firefox normally")
+            print("2. Type in address bar: about:profiles")
+            print("3. Look for 'Root Directory' of your default profile")
+            print("4. Copy that path and set it at the top of this script:")
+            print("   FIREFOX_PROFILE_PATH = '/path/to/your/profile'")
+            print("=" * 70)
+            return None
+
+    if not os.path.exists(profile_path):
+        print(f"\n[ERROR] Profile path does not exist: {profile_path}")
+        print("Please check the path and try again.")
+        return None
+    return profile_path
+
+
+def build_firefox_options(settings, profile_path: str, mode: str) -> Options:
+    """Build the Firefox options for YOUR real profile"""
+    options = Options()
+
+    # ========== USE YOUR REAL PROFILE (WHERE YOU'RE LOGGED IN) ==========
+    options.add_argument("-profile")
+    options.add_argument(profile_path)
+
+    # Proxy settings
+    if mode == "proxy":
+        options.set_preference("network.proxy.type", 1)
+        options.set_preference("network.proxy.socks", settings.PROXY_HOST)
+        options.set_preference("network.proxy.socks_port", settings.PROXY_PORT)
+        options.set_preference("network.proxy.socks_version", 5)
+        options.set_preference("network.proxy.socks_remote_dns", True)
+
+    # Media autoplay
+    options.set_preference("media.autoplay.default", 0)
+    options.set_preference("media.autoplay.allow-muted", True)
+    options.set_preference("media.autoplay.blocking_enabled", False)
+
+    # Minimal anti-detection (since we're using real profile, less needed)
+    options.set_preference("dom.webdriver.enabled", False)
+    return options
+
+
+# Main class #
+class BrowserLoop:
+    """
+    One YouTube capture loop in `mode` ("proxy" or "direct").
+
+    `settings` is the script module with the configuration constants
+    (OUTPUT_DIR, WATCH_TIME, SEARCH_KEYWORDS, ...) and `options` the
+    Firefox options every session is launched with. Each session is
+    launched once the cycle's capture and proxy are up and quit before the
+    capture stops, so a pcap only holds its own browser's traffic.
+    `run_cycle()` captures one cycle
+    and returns its measurements. `tunnel` (a `MasqueProxy`) replaces the
+    MASQUE client built from the settings in proxy mode.
+    """
+
+    def __init__(
+        self,
+        settings,
+        mode: str,
+        supervisor: ProcessSupervisor,
+        options: Options,
+        tunnel: MasqueProxy = None,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        s = settings
+        self.settings = settings
+        self.mode: str = mode
+        self.supervisor: ProcessSupervisor = supervisor
+        self.options: Options = options
+        self.steps: dict = STEPS[mode]
+        # Draws the search keyword and the video, seeded per cycle by run_cycle
+        self.rng = random.Random()
+
+        # The MASQUE client, with its output in a log file per cycle next to the pcap
+        self.tunnel = None
+        if mode == "proxy":
+            self.tunnel = tunnel or MasqueProxy(s, supervisor, self.steps)
+
+        # A real profile can only be opened by one Firefox at a time (max_live=1).
+        # No prefill: a browser starting between cycles would land in a pcap.
+        self.pool = uc.FirefoxPool(
+            size=1,
+            max_uses=s.BROWSER_MAX_USES,
+            max_live=1,
+            factory=self.launch_firefox,
+            prefill=False,
+        )
+
+    # --- Browser ---
+
+    def launch_firefox(self):
+        """Launch a Firefox session whose geckodriver and browser processes are supervised"""
+        driver = uc.Firefox(options=self.options)
+        self.supervisor.adopt("geckodriver", driver.service.process.pid)
+        return driver
+
+    def run_firefox_session(self) -> bool:
+        """Search YouTube, play a video and watch it; False if no browser was ready"""
+        s = self.settings
+        print(
+            f"[BROWSER] {self.steps['browser']}. Taking a Firefox session from "
+            "the pool (launched now unless one is kept from the last cycle)..."
+        )
+        try:
+            driver = self.pool.acquire(timeout=s.BROWSER_LAUNCH_TIMEOUT)
+        except TimeoutError as e:
+            print(f"  -> Error: {e}")
+            return False
+
+        try:
+            # Go to YouTube - you should already be logged in!
+            print("  -> Loading YouTube (you should be logged in already)...")
+            driver.get(YOUTUBE_URL)
+            time.sleep(4)
+
+            # Check if logged in
+            try:
+                sign_in_button = driver.find_elements(
+                    By.XPATH, "//a[contains(@href, 'accounts.google.com')]"
+                )
+                if sign_in_button and "Sign in" in sign_in_button[0].text:
+                    print(
+                        "  -> [WARNING] Not logged in! "
+                        "You may need to sign in manually first."
+                    )
+                else:
+                    print("  -> ✓ Appears to be logged in!")
+            except Exception:
+                pass
+
+            # Search for video
+            keyword = self.rng.choice(s.SEARCH_KEYWORDS)
+            print(f"  -> Searching for: '{keyword}'")
+            query = keyword.replace(" ", "+")
+            driver.get(f"{YOUTUBE_URL}/results?search_query={query}")
+
+            print("  -> Waiting for search results...")
+            time.sleep(3)
+
+            # Get video list
+            videos = driver.find_elements(
+                By.CSS_SELECTOR, "ytd-video-renderer a#thumbnail"
+            )
+            if videos:
+                self.play_video(driver, videos)
+            else:
+                print("  -> No videos found!")
+
+            # Watch video
+            print(f"  -> Watching for {s.WATCH_TIME}s...")
+            time.sleep(s.WATCH_TIME)
+
+        except Exception as e:
+            print(f"  -> Error: {e}")
+            traceback.print_exc()
+        finally:
+            # A worn-out browser is quit here, before the capture stops
+            print("[BROWSER] Returning Firefox to the pool...")
+            self.pool.release(driver, wait=True)
+        return True
+
+    def play_video(self, driver, videos: list) -> None:
+        """Open one of the top search results and start playing it"""
+        limit = min(len(videos), 20)
+        target = self.rng.choice(videos[:limit])
+        print(
+            f"  -> Found {len(videos)} videos. Selected random one from top {limit}..."
+        )
+
+        video_url = target.get_attribute("href")
+        if not video_url:
+            return
+        print("  -> Navigating to video...")
+        driver.get(video_url)
+        time.sleep(6)
+
+        # Check for VPN detection
+        page_text = driver.page_source
+        if "VPN/Proxy Detected" in page_text or "turn off your VPN" in page_text:
+            print("  -> [WARNING] YouTube still detected VPN/Proxy!")
+            print("  -> This means the proxy IP is blocked, not bot detection")
+            print("  -> Traffic is still being captured...")
+            return
+        print("  -> ✓ No VPN detection! Video should play normally")
+
+        # Force play video
+        print("  -> Playing video...")
+        driver.execute_script(PLAY_SCRIPT)
+
+        # Scroll naturally
+        time.sleep(2)
+        driver.execute_script("window.scrollTo(0, 300);")
+        time.sleep(1)
+        driver.execute_script("window.scrollTo(0, 150);")
+
+    # --- Cycle ---
+
+    def run_cycle(self, cycle: int, seed: int = None) -> dict:
+        """
+        Capture one cycle and return its measurements: phase times and
+        capture size. A `seed` makes the keyword and video choices the
+        same as for any other cycle with that seed.
+        """
+        s = self.settings
+        if seed is not None:
+            self.rng.seed(seed)
+        result = {
+            "mode": self.mode,
+            "cycle": cycle,
+            "seed": seed,
+            "time": time.time(),
+            "skipped": False,
+            "phases": {},
+        }
+        phases = result["phases"]
+        started = time.monotonic()
+        self.supervisor.reap()  # Forget children that exited on their own
+
+        # --- CAPTURE PACKETS ---
+        pcap_path = os.path.join(s.OUTPUT_DIR, f"{PCAP_PREFIX}_{get_timestamp()}.pcap")
+        result["pcap"] = pcap_path
+        print(f"\n[SYSTEM] {self.steps['tcpdump']}.Starting TCPDUMP -> {pcap_path}")
+        tcp_proc = start_tcpdump(self.supervisor, s.INTERFACE, pcap_path)
+        time.sleep(3)
+        phases["capture_start"] = time.monotonic() - started
+
+        # --- START PROXY ---
+        if self.tunnel:
+            mark = time.monotonic()
+            masque_proc = self.tunnel.begin_cycle(pcap_path)
+            phases["proxy_start"] = time.monotonic() - mark
+            if masque_proc is None:
+                print(
+                    f"[ERROR] Failed to start {self.tunnel.backend.name}. "
+                    "Skipping this cycle."
+                )
+                result["tunnel"] = self.tunnel.report()
+                self.stop_capture(tcp_proc)
+                result["skipped"] = True
+                result["duration"] = time.monotonic() - started
+                return result
+
+        # --- WATCH A VIDEO ---
+        mark = time.monotonic()
+        result["watched"] = self.run_firefox_session()
+        phases["traffic"] = time.monotonic() - mark
+
+        # --- STOP PROXY (kept running in persistent mode) ---
+        mark = time.monotonic()
+        if self.tunnel:
+            result["tunnel"] = self.tunnel.end_cycle()
+            phases["proxy_stop"] = time.monotonic() - mark
+        else:
+            time.sleep(2)
+
+        # --- STOP TCPDUMP ---
+        mark = time.monotonic()
+        self.stop_capture(tcp_proc)
+        phases["capture_stop"] = time.monotonic() - mark
+
+        try:
+            result["capture_bytes"] = os.path.getsize(pcap_path)
+        except OSError:
+            result["capture_bytes"] = None
+        result["duration"] = time.monotonic() - started
+        return result
+
+    def stop_capture(self, proc) -> None:
+        print(f"[SYSTEM] {self.steps['stop_tcpdump']}.Stopping TCPDUMP...")
+        stop_tcpdump(self.supervisor, proc)
+
+    def close(self) -> None:
+        if self.tunnel:
+            self.tunnel.close()
+        self.pool.close()
+
+
+def run_loop(settings, mode: str) -> None:
+    """The interactive capture loop of a YouTube script"""
+    s = settings
+    if not os.path.exists(s.OUTPUT_DIR):
+        os.makedirs(s.OUTPUT_DIR)
+
+    print("=" * 70)
+    print("YouTube Automation Script v8 - Using YOUR Real Firefox Profile")
+    print("=" * 70)
+
+    profile_path = get_profile_path(s)
+    if not profile_path:
+        return
+
+    print(f"Profile found: {profile_path}")
+    print("=" * 70)
+    print("\nIMPORTANT: Make sure you're logged into YouTube in Firefox!")
+    print("If not, open Firefox normally and sign in first, then run this script.")
+    print("=" * 70)
+
+    # Every child process (tcpdump, masque-plus, geckodriver and its Firefox)
+    # is owned by the supervisor, so cleanup never touches another loop on
+    # this host. Clean up processes left over by a crashed run.
+    print("\n[INIT] Cleaning processes left over by a crashed run...")
+    supervisor = ProcessSupervisor(os.path.basename(s.__file__))
+    supervisor.cleanup_stale()
+
+    try:
+        user_val = input("\nEnter loop count (Enter=Infinite): ").strip()
+        max_cycles = int(user_val) if user_val else 0
+    except (ValueError, EOFError):
+        max_cycles = 0
+
+    loop = None
+    cycle_count = 1
+    try:
+        options = build_firefox_options(s, profile_path, mode)
+        loop = BrowserLoop(s, mode, supervisor, options)
+        while max_cycles <= 0 or cycle_count <= max_cycles:
+            print(f"\n{'=' * 70}")
+            limit = f" / {max_cycles}" if max_cycles > 0 else ""
+            print(f" CYCLE #{cycle_count}{limit}")
+            print(f"{'=' * 70}")
+            result = loop.run_cycle(cycle_count)
+
+            # --- REST ---
+            print(f"\n[SYSTEM] Resting for {s.REST_TIME}s...")
+            time.sleep(s.REST_TIME)
+            if not result["skipped"]:
+                cycle_count += 1
+    except KeyboardInterrupt:
+        print("\n[STOP] Script stopped by user.")
+    finally:
+        print("\n[CLEANUP] Final cleanup...")
+        if loop:
+            loop.close()
+        supervisor.close()
+        print("[DONE] All processes cleaned up.")
@@ -0,0 +1,29 @@
+# Imports #
+import subprocess
+
+from .supervisor import ProcessSupervisor
+
+
+# Functions #
+def start_tcpdump(
+    supervisor: ProcessSupervisor, interface: str, pcap_path: str
+) -> subprocess.Popen:
+    """Start recording a PCAP file, filtering out the VNC ports"""
+    # Filter out ports 5901/6901 to avoid recording VNC image traffic
+    cmd = [
+        "sudo", "tcpdump", "-i", interface,
+        "-w", pcap_path,
+        "not", "port", "6901", "and", "not", "port", "5901",
+    ]  # fmt: skip
+    return supervisor.popen(
+        "tcpdump", cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def stop_tcpdump(supervisor: ProcessSupervisor, proc) -> None:
+    """Stop tcpdump safely"""
+    try:
+        # SIGTERM lets tcpdump flush the pcap, SIGKILL after 5s
+        supervisor.stop(proc, timeout=5)
+    except Exception as e:
+        print(f"  -> Error stopping tcpdump: {e}")
@@ -0,0 +1,672 @@
+"""
+The file transfer capture loop shared by file_transfer_with_proxy.py,
+file_transfer_without_proxy.py and file_transfer_ab.py.
+
+The scripts only hold their configuration constants. A `TransferLoop`
+reads them from the script module (`settings`) and runs cycles in one
+mode: "proxy" (curl through the MASQUE client's SOCKS5 proxy) or
+"direct" (curl --http3-only).
+"""
+
+# Imports #
+import datetime
+import os
+import random
+import string
+import subprocess
+import time
+
+from .capture import start_tcpdump, stop_tcpdump
+from .curl_batch import run_curl_batch
+from .downloads import run_download_phase
+from .health import TargetHealth, get_health_path
+from .masque import MasqueProxy
+from .metrics import (
+    WRITE_OUT,
+    MetricsRecorder,
+    get_metrics_path,
+    parse_write_out,
+    percentile,
+    read_records,
+)
+from .payloads import PayloadPool, iter_payload, stream_to_process
+from .scheduler import RequestScheduler
+from .supervisor import ProcessSupervisor
+from .timeouts import AdaptiveTimeouts, get_timeouts_path
+
+# Constants #
+MODES = ("proxy", "direct")
+STEPS = {  # Step numbers printed in the log of each mode
+    "proxy": {
+        "tcpdump": 1,
+        "proxy": 2,
+        "download": 3,
+        "upload": 4,
+        "stop_proxy": 5,
+        "stop_tcpdump": 6,
+    },
+    "direct": {"tcpdump": 1, "download": 2, "upload": 3, "stop_tcpdump": 4},
+}
+PCAP_PREFIXES = {"proxy": "proxy_traffic", "direct": "traffic_session"}
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+# Functions #
+def get_timestamp() -> str:
+    return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+
+def get_random_string(length: int = 10, rng=random) -> str:
+    letters = string.ascii_lowercase + string.digits
+    return "".join(rng.choice(letters) for i in range(length))
+
+
+def get_upload_size(size_mb: float, rng=random) -> int:
+    """Upload size in bytes: size_mb +/- 0.5MB (at least 0.1MB)"""
+    actual_size = max(0.1, size_mb + rng.uniform(-0.5, 0.5))
+    return int(actual_size * 1024 * 1024)
+
+
+def generate_dummy_file(filename: str, size: int, payload_pool=None) -> None:
+    """Generate dummy file of `size` bytes with random content (hard to compress)"""
+    with open(filename, "wb") as f:
+        make_payload = payload_pool.iter_payload if payload_pool else iter_payload
+        for chunk in make_payload(size):
+            f.write(chunk)
+
+
+def get_transfer_size(result: tuple) -> int:
+    """Bytes moved by one transfer, from its write-out report"""
+    report = result[3] or {}
+    return (report.get("size_download") or 0) + (report.get("size_upload") or 0)
+
+
+def summarize_cycle(records: list) -> dict:
+    """Requests, bytes and median latencies of one cycle's metrics records"""
+    ok = [r for r in records if r.get("exitcode") == 0 and not r.get("error")]
+    ttfb = [r["time_starttransfer"] for r in ok if r.get("time_starttransfer")]
+    total = [r["time_total"] for r in ok if r.get("time_total")]
+    return {
+        "requests": len(records),
+        "ok": len(ok),
+        "bytes": sum(
+            (r.get("size_download") or 0) + (r.get("size_upload") or 0) for r in ok
+        ),
+        "ttfb_ms": percentile(ttfb, 50) * 1000 if ttfb else None,
+        "total_ms": percentile(total, 50) * 1000 if total else None,
+    }
+
+
+def remove_upload_files() -> None:
+    """Delete temporary upload files left in the working directory"""
+    for f in os.listdir("."):
+        if f.startswith("up_") and f.endswith(".bin"):
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+
+
+# Main class #
+class TransferLoop:
+    """
+    One file transfer capture loop in `mode` ("proxy" or "direct").
+
+    `settings` is the script module with the configuration constants
+    (OUTPUT_DIR, UPLOAD_SIZE_MB, PROXY_PORT, ...). `run_cycle()` captures
+    one cycle of traffic and returns its measurements. Loops running side
+    by side share the `supervisor` and `payload_pool`; `proxy_mode`
+    overrides the settings' PROXY_MODE and `tunnel` (a `MasqueProxy`) the
+    MASQUE client built from the settings.
+    """
+
+    def __init__(
+        self,
+        settings,
+        mode: str,
+        supervisor: ProcessSupervisor,
+        payload_pool: PayloadPool = None,
+        proxy_mode: str = None,
+        tunnel: MasqueProxy = None,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        self.settings = settings
+        self.mode: str = mode
+        self.supervisor: ProcessSupervisor = supervisor
+        self.payload_pool: PayloadPool = payload_pool
+        self.steps: dict = STEPS[mode]
+        # Draws the workload (targets, counts, sizes, arrivals), independent
+        # of the global random module; run_cycle seeds it per cycle
+        self.rng = random.Random()
+
+        s = settings
+        # Parallel transfers; 0 or less would never dispatch anything
+        self.concurrency: int = max(1, s.DOWNLOAD_CONCURRENCY)
+
+        # Breaker state is kept across runs, separately with and without the proxy
+        self.health = TargetHealth(
+            get_health_path(mode),
+            failure_threshold=s.BREAKER_FAILURES,
+            cooldown=s.BREAKER_COOLDOWN,
+        )
+        self.timeouts = None
+        if s.ADAPTIVE_TIMEOUTS:
+            self.timeouts = AdaptiveTimeouts(get_timeouts_path(mode), s.TIMEOUT_SEC)
+
+        # The MASQUE client, with its output in a log file per cycle next to the pcap
+        self.tunnel = None
+        self.backend = None
+        if mode == "proxy":
+            self.tunnel = tunnel or MasqueProxy(
+                s, supervisor, self.steps, mode=proxy_mode
+            )
+            self.backend = self.tunnel.backend
+
+    @property
+    def label(self) -> str:
+        """The mode, with the tunnel backend in proxy mode"""
+        return f"{self.mode}/{self.backend.name}" if self.backend else self.mode
+
+    # --- Capture ---
+
+    def start_tcpdump(self, filename: str):
+        """Start recording PCAP file, filter out VNC ports"""
+        pcap_path = os.path.join(self.settings.OUTPUT_DIR, filename)
+        print(f"\n[SYSTEM] {self.steps['tcpdump']}. Starting TCPDUMP -> {pcap_path}")
+        return start_tcpdump(self.supervisor, self.settings.INTERFACE, pcap_path)
+
+    def stop_tcpdump(self, proc) -> None:
+        """Stop tcpdump safely"""
+        print(f"[SYSTEM] {self.steps['stop_tcpdump']}. Stopping TCPDUMP...")
+        stop_tcpdump(self.supervisor, proc)
+
+    # --- Traffic ---
+
+    def get_random_photo_url(self) -> str:
+        """Generate random photo URL from Picsum (None if Picsum is being skipped)"""
+        if not self.health.choose(["picsum.photos"], self.rng):
+            return None
+        width = self.rng.randint(800, 1920)
+        height = self.rng.randint(600, 1080)
+        seed = get_random_string(5, self.rng)
+        return f"https://picsum.photos/seed/{seed}/{width}/{height}"
+
+    def get_random_website_url(self) -> str:
+        """Generate random website URL from the healthy targets (None if there are none)"""
+        domain = self.health.choose(self.settings.VALID_DOWNLOAD_TARGETS, self.rng)
+        if domain is None:
+            return None
+        return f"{domain}/?v={get_random_string(8, self.rng)}"
+
+    def get_transport_options(self) -> list:
+        """curl options that route a transfer in this mode"""
+        if self.mode == "proxy":
+            # Route through Masque - IT handles HTTP/3
+            # NOTE: NO --http3-only! Masque proxy converts traffic to HTTP/3
+            return ["--proxy", self.settings.PROXY_URL]
+        return ["--http3-only"]  # CRITICAL: Use HTTP/3 only, fail if not possible
+
+    def get_download_options(self) -> list:
+        """curl options shared by every download (single and batch mode)"""
+        return self.get_transport_options() + [
+            "--ipv4",  # IPv4 only
+            "-k",  # Ignore SSL errors
+            "-L",  # Follow redirects
+            "-s",  # Silent mode
+            "--max-time", str(self.settings.TIMEOUT_SEC),
+            "-A", USER_AGENT,
+        ]  # fmt: skip
+
+    def download_target(self, target: str, kind: str = "website") -> tuple:
+        """Download one target in this mode"""
+        s = self.settings
+        if self.timeouts:
+            max_time, connect_timeout = self.timeouts.get(target, kind)
+        else:
+            max_time, connect_timeout = s.TIMEOUT_SEC, None
+        # The last --max-time wins
+        cmd = (
+            [s.CURL_PATH] + self.get_download_options() + ["--max-time", str(max_time)]
+        )
+        if connect_timeout:
+            cmd += ["--connect-timeout", str(connect_timeout)]
+        cmd += ["-o", "/dev/null", "-w", WRITE_OUT, target]
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, timeout=max_time + 5)
+            report = parse_write_out(result.stdout.decode("utf-8", errors="ignore"))
+            stderr = result.stderr.decode("utf-8", errors="ignore")
+            return result.returncode, stderr, None, report
+        except subprocess.TimeoutExpired:
+            return None, "", f"Timeout after {max_time}s", None
+        except Exception as e:
+            return None, "", f"Error: {e}", None
+
+    def run_download_action(
+        self,
+        target: str,
+        download_type: str = "file",
+        result: tuple = None,
+        metrics=None,
+    ) -> None:
+        """Report (and record) one download, running it first unless a result is given"""
+        type_label = "PHOTO" if download_type == "photo" else "WEB"
+        print(f"  [{type_label}] {target}")
+
+        if result is None:
+            result = self.download_target(target, download_type)
+
+        returncode, stderr, error, report = result
+        if metrics:
+            metrics.record(download_type, target, report, error)
+        self.health.record(target, returncode, error)
+        if self.timeouts:
+            self.timeouts.record(target, download_type, report)
+        if error:
+            print(f"    ✗ {error}")
+        elif returncode != 0 and self.mode == "direct":
+            print(f"    ⚠ Failed (code {returncode})")
+        elif returncode != 0:
+            print(f"    ✗ Failed (code {returncode})")
+            # Detailed error messages for common issues
+            if returncode == 3:
+                print("    -> Error 3: Proxy connection failed")
+                print(
+                    f"    -> Is {self.backend.name} running? Check: ps aux | grep masque"
+                )
+            elif returncode == 7:
+                print("    -> Error 7: Failed to connect to host")
+            elif returncode == 28:
+                print("    -> Error 28: Timeout")
+            if stderr:
+                print(f"    -> STDERR: {stderr[:150]}")
+        else:
+            print("    ✓ Success")
+
+    def upload_target(self, target: str, size: int = None) -> tuple:
+        """Upload `size` bytes (a drawn size if None) to a target in this mode"""
+        s = self.settings
+        if size is None:
+            size = get_upload_size(s.UPLOAD_SIZE_MB, self.rng)
+        if self.timeouts:
+            max_time, connect_timeout = self.timeouts.get(
+                target, "upload", s.TIMEOUT_SEC * 2
+            )
+        else:
+            max_time, connect_timeout = s.TIMEOUT_SEC * 2, None
+        filename = None
+
+        cmd = [s.CURL_PATH] + self.get_transport_options() + [
+            "--ipv4",  # IPv4 only
+            "-k",  # Ignore SSL errors
+            "-s",  # Silent mode
+            "-o", "/dev/null",  # Discard response
+            "--max-time", str(max_time),
+            "-w", WRITE_OUT,  # Transfer metrics on stdout
+            "-A", USER_AGENT,
+        ]  # fmt: skip
+        if connect_timeout:
+            cmd += ["--connect-timeout", str(connect_timeout)]
+
+        try:
+            if s.UPLOAD_MODE == "stream":
+                # Stream generated bytes through stdin: nothing on disk, one chunk
+                # in memory. Only -T streams; -F file=@- and --data-binary @-
+                # make curl read all of stdin before sending.
+                cmd += [
+                    "-T", "-", "-X", "POST",
+                    "-H", "Content-Type: application/octet-stream",
+                    "-H", "Expect:",  # Don't wait for 100-continue
+                    target,
+                ]  # fmt: skip
+                pool = self.payload_pool
+                make_payload = pool.iter_payload if pool else iter_payload
+                payload = make_payload(size)
+                result = stream_to_process(cmd, payload, timeout=max_time + 10)
+            else:
+                filename = f"up_{get_random_string(5)}.bin"
+                generate_dummy_file(filename, size, self.payload_pool)
+                cmd += ["-F", f"file=@{filename}", target]  # Form upload
+                result = subprocess.run(cmd, capture_output=True, timeout=max_time + 10)
+            report = parse_write_out(result.stdout.decode("utf-8", errors="ignore"))
+            stderr = result.stderr.decode("utf-8", errors="ignore")
+            return result.returncode, stderr, None, report
+        except subprocess.TimeoutExpired:
+            return None, "", f"Upload timeout after {max_time}s", None
+        except Exception as e:
+            return None, "", f"Error: {e}", None
+        finally:
+            # Clean up dummy file immediately
+            if filename and os.path.exists(filename):
+                os.remove(filename)
+
+    def run_upload_action(
+        self, metrics=None, target: str = None, result: tuple = None
+    ) -> None:
+        """Report (and record) one upload, running it first unless a result is given"""
+        s = self.settings
+        if target is None:
+            target = self.rng.choice(s.VALID_UPLOAD_TARGETS)
+        via = "via Masque Proxy" if self.mode == "proxy" else "via --http3-only"
+        print(f"  [UP]   {target} ({s.UPLOAD_SIZE_MB}MB {via})")
+
+        if result is None:
+            result = self.upload_target(target)
+
+        returncode, stderr, error, report = result
+        if metrics:
+            metrics.record("upload", target, report, error)
+        if self.timeouts:
+            self.timeouts.record(target, "upload", report)
+        if error:
+            print(f"  ✗ {error}")
+        elif returncode != 0:
+            print(f"  ✗ Upload failed (code {returncode})")
+            if self.mode == "direct":
+                if "QUIC" in stderr or "HTTP/3" in stderr:
+                    print("  -> Attempted H3 but failed")
+                else:
+                    print("  -> Server may not support H3 upload")
+                return
+            if "proxy" in stderr.lower():
+                print(f"  -> Proxy error - check {self.backend.name}")
+            if stderr:
+                print(f"  -> STDERR: {stderr[:150]}")
+        else:
+            print("  ✓ Upload success")
+
+    def run_fixed_traffic(self, metrics=None) -> None:
+        """The fixed download phase (photos, then websites) and one upload"""
+        s = self.settings
+        via = " via Proxy" if self.mode == "proxy" else ""
+        print(f"[TRAFFIC] {self.steps['download']}. Download Phase (HTTP/3{via})...")
+
+        # Photos first, then websites, on a pool of parallel workers
+        num_websites = s.DOWNLOAD_WEBSITES + self.rng.randint(0, s.WEBSITE_JITTER)
+        jobs = [
+            (self.get_random_photo_url(), "photo") for i in range(s.DOWNLOAD_PHOTOS)
+        ]
+        jobs += [
+            (self.get_random_website_url(), "website") for i in range(num_websites)
+        ]
+        jobs = [(url, kind) for url, kind in jobs if url]  # Drop skipped hosts
+        download_types = dict(jobs)
+        num_photos = sum(kind == "photo" for _, kind in jobs)
+        print(
+            f"  Downloading {num_photos} photos + {len(jobs) - num_photos} websites "
+            f"({self.concurrency} in parallel, {s.DOWNLOAD_MODE} mode)..."
+        )
+        urls = [url for url, _ in jobs]
+
+        def report(url, result):
+            self.run_download_action(url, download_types[url], result, metrics)
+
+        if s.DOWNLOAD_MODE == "batch":
+            # One curl for the whole phase, reusing its connections
+            timeouts = self.timeouts
+            max_times = [
+                timeouts.get(url, download_types[url])[0] if timeouts else s.TIMEOUT_SEC
+                for url in urls
+            ]
+            rounds = len(urls) // self.concurrency + 1
+            run_curl_batch(
+                s.CURL_PATH,
+                urls,
+                self.get_download_options(),
+                parallel_max=self.concurrency,
+                timeout=max(max_times, default=0) * rounds + 10,
+                on_result=report,
+                per_url_options=(
+                    [timeouts.get_options(url, download_types[url]) for url in urls]
+                    if timeouts
+                    else None
+                ),
+            )
+        else:
+            run_download_phase(
+                urls,
+                lambda url: self.download_target(url, download_types[url]),
+                concurrency=self.concurrency,
+                per_host=s.MAX_PER_HOST,
+                delay=s.REQUEST_DELAY,
+                on_result=report,
+            )
+
+        print(
+            f"[TRAFFIC] {self.steps['upload']}. Upload Phase "
+            f"(HTTP/3{via}, {s.UPLOAD_SIZE_MB}MB)..."
+        )
+        self.run_upload_action(metrics)
+
+    def run_scheduled_traffic(self, metrics=None) -> dict:
+        """Mixed downloads and uploads at the target load, until a cycle budget is used up"""
+        s = self.settings
+        weights = {
+            "photo": s.DOWNLOAD_PHOTOS,
+            "website": s.DOWNLOAD_WEBSITES,
+            "upload": 1,
+        }
+        kinds, kind_weights = list(weights), list(weights.values())
+
+        def next_job():
+            for attempt in range(10):  # Skipped hosts give no URL, draw again
+                kind = self.rng.choices(kinds, weights=kind_weights)[0]
+                if kind == "upload":
+                    # Drawn here, not on the worker, to keep the draws in order
+                    target = self.rng.choice(s.VALID_UPLOAD_TARGETS)
+                    size = get_upload_size(s.UPLOAD_SIZE_MB, self.rng)
+                    return (kind, target), lambda: self.upload_target(target, size)
+                if kind == "photo":
+                    target = self.get_random_photo_url()
+                else:
+                    target = self.get_random_website_url()
+                if target:
+                    return (kind, target), lambda: self.download_target(target, kind)
+            return None
+
+        def report(job, result):
+            kind, target = job
+            if kind == "upload":
+                self.run_upload_action(metrics, target, result)
+            else:
+                self.run_download_action(target, kind, result, metrics)
+
+        via = " via Proxy" if self.mode == "proxy" else ""
+        print(
+            f"[TRAFFIC] {self.steps['download']}-{self.steps['upload']}. "
+            f"Scheduled Phase (HTTP/3{via})..."
+        )
+        print(
+            f"  Target: {s.TARGET_MBPS or 'unlimited'} Mbps, "
+            f"{s.TARGET_RPS or 'unlimited'} req/s"
+            f"{' (Poisson arrivals)' if s.POISSON_ARRIVALS else ''}, "
+            f"budget: {s.CYCLE_BYTE_BUDGET_MB or '-'}MB / {s.CYCLE_TIME_BUDGET or '-'}s"
+        )
+        scheduler = RequestScheduler(
+            concurrency=self.concurrency,
+            request_rate=s.TARGET_RPS,
+            throughput_mbps=s.TARGET_MBPS,
+            poisson=s.POISSON_ARRIVALS,
+            rng=self.rng,
+        )
+        totals = scheduler.run(
+            next_job,
+            get_transfer_size,
+            byte_budget=s.CYCLE_BYTE_BUDGET_MB * 1024 * 1024,
+            time_budget=s.CYCLE_TIME_BUDGET,
+            on_result=report,
+        )
+        mbps = totals["bytes"] * 8 / 1e6 / max(totals["elapsed"], 0.001)
+        print(
+            f"  -> {totals['requests']} requests, "
+            f"{totals['bytes'] / 1024 / 1024:.1f}MB "
+            f"in {totals['elapsed']:.1f}s ({mbps:.1f} Mbps)"
+        )
+        return totals
+
+    # --- Cycle ---
+
+    def run_cycle(self, cycle: int, seed: int = None) -> dict:
+        """
+        Capture one cycle and return its measurements: phase times, bytes,
+        throughput, median latencies and capture size. A `seed` makes the
+        workload (targets, counts, sizes, arrivals) the same as for any
+        other cycle with that seed.
+        """
+        s = self.settings
+        if seed is not None:
+            self.rng.seed(seed)
+        result = {
+            "mode": self.mode,
+            "backend": self.backend.name if self.backend else None,
+            "cycle": cycle,
+            "seed": seed,
+            "time": time.time(),
+            "skipped": False,
+            "phases": {},
+        }
+        phases = result["phases"]
+        started = time.monotonic()
+        self.supervisor.reap()  # Forget children that exited on their own
+
+        # --- CAPTURE PACKETS ---
+        pcap_name = f"{PCAP_PREFIXES[self.mode]}_{get_timestamp()}.pcap"
+        pcap_path = os.path.join(s.OUTPUT_DIR, pcap_name)
+        result["pcap"] = pcap_path
+        tcp_proc = self.start_tcpdump(pcap_name)
+        time.sleep(2)
+        phases["capture_start"] = time.monotonic() - started
+
+        # --- START PROXY ---
+        if self.tunnel:
+            mark = time.monotonic()
+            masque_proc = self.tunnel.begin_cycle(pcap_path)
+            phases["proxy_start"] = time.monotonic() - mark
+            if masque_proc is None or masque_proc.poll() is not None:
+                if masque_proc is None:
+                    print(
+                        f"[ERROR] Failed to start {self.backend.name}. Skipping traffic."
+                    )
+                else:
+                    print("[ERROR] Proxy died after starting. Skipping traffic.")
+                result["tunnel"] = self.tunnel.report()
+                self.stop_tcpdump(tcp_proc)
+                result["skipped"] = True
+                return result
+
+        # --- DOWNLOADS AND UPLOADS ---
+        metrics = MetricsRecorder(
+            get_metrics_path(pcap_path),
+            mode=self.mode,
+            cycle=cycle,
+            backend=result["backend"],
+        )
+        mark = time.monotonic()
+        if s.SCHEDULE_MODE == "rate":
+            self.run_scheduled_traffic(metrics)
+        else:
+            self.run_fixed_traffic(metrics)
+        phases["traffic"] = time.monotonic() - mark
+        metrics.close()
+        self.health.save()
+        if self.timeouts:
+            self.timeouts.save()
+        open_hosts = self.health.get_open_hosts()
+        if open_hosts:
+            print(f"  -> Skipping unhealthy hosts: {', '.join(open_hosts)}")
+
+        # --- STOP PROXY (kept running in persistent mode) ---
+        if self.tunnel:
+            mark = time.monotonic()
+            result["tunnel"] = self.tunnel.end_cycle()
+            phases["proxy_stop"] = time.monotonic() - mark
+
+        # --- STOP TCPDUMP ---
+        mark = time.monotonic()
+        if not self.tunnel:
+            time.sleep(2)
+        self.stop_tcpdump(tcp_proc)
+        phases["capture_stop"] = time.monotonic() - mark
+
+        result.update(summarize_cycle(read_records([metrics.path])))
+        result["mbps"] = result["bytes"] * 8 / 1e6 / max(phases["traffic"], 0.001)
+        try:
+            result["capture_bytes"] = os.path.getsize(pcap_path)
+        except OSError:
+            result["capture_bytes"] = None
+        result["duration"] = time.monotonic() - started
+        return result
+
+    def close(self) -> None:
+        if self.tunnel:
+            self.tunnel.close()
+
+
+def run_loop(settings, mode: str) -> None:
+    """The interactive capture loop of a file transfer script"""
+    s = settings
+    if not os.path.exists(s.OUTPUT_DIR):
+        os.makedirs(s.OUTPUT_DIR)
+
+    print("=" * 70)
+    if mode == "proxy":
+        print("HTTP/3 Traffic Generator WITH MASQUE PROXY")
+        print("=" * 70)
+        print(f"Proxy: {s.PROXY_URL} ({s.TUNNEL_BACKEND})")
+        print("Note: Masque proxy handles HTTP/3 conversion")
+    else:
+        print("HTTP/3 Traffic Generator (HTTP/3-ONLY Mode)")
+        print("=" * 70)
+        print(f"Upload target: {s.VALID_UPLOAD_TARGETS[0]}")
+    print(f"Upload size: {s.UPLOAD_SIZE_MB}MB per cycle")
+    websites = str(s.DOWNLOAD_WEBSITES)
+    if s.WEBSITE_JITTER:
+        websites += f"-{s.DOWNLOAD_WEBSITES + s.WEBSITE_JITTER}"
+    print(f"Download: {s.DOWNLOAD_PHOTOS} photos + {websites} websites per cycle")
+    print("=" * 70)
+
+    # Every child process is started and stopped through the supervisor, so
+    # cleanup never touches the processes of another loop on this host.
+    # Clean up processes left over by a crashed run.
+    supervisor = ProcessSupervisor(os.path.basename(s.__file__))
+    supervisor.cleanup_stale()
+
+    try:
+        user_val = input("\nEnter loop count (Enter=Infinite): ").strip()
+        max_cycles = int(user_val) if user_val else 0
+    except (ValueError, EOFError):
+        max_cycles = 0
+
+    # Generated on the first run, then reused from ~/.cache
+    payload_pool = None
+    if s.PAYLOAD_POOL_MB:
+        payload_pool = PayloadPool(size=s.PAYLOAD_POOL_MB * 1024 * 1024)
+
+    loop = None
+    cycle_count = 1
+    try:
+        loop = TransferLoop(s, mode, supervisor, payload_pool)
+        while max_cycles <= 0 or cycle_count <= max_cycles:
+            print(f"\n{'=' * 70}")
+            limit = f" / {max_cycles}" if max_cycles > 0 else ""
+            print(f" CYCLE #{cycle_count}{limit}")
+            print(f"{'=' * 70}")
+            loop.run_cycle(cycle_count)
+
+            # --- REST ---
+            print(f"\n[SYSTEM] Resting {s.REST_TIME}s...")
+            time.sleep(s.REST_TIME)
+            cycle_count += 1
+    except KeyboardInterrupt:
+        print("\n[STOP] Script stopped by user.")
+    finally:
+        print("\n[CLEANUP] Cleaning up...")
+        if loop:
+            loop.close()
+        supervisor.close()
+        remove_upload_files()
+        print("[DONE] Finished.")
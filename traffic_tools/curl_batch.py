@@ -0,0 +1,167 @@
+# Imports #
+import json
+import subprocess
+import threading
+
+from .metrics import WRITE_OUT
+
+# Constants #
+STDERR_LIMIT = 4096  # Bytes of curl's own stderr kept for error reports
+
+
+# Functions #
+def quote_config(value: str) -> str:
+    """Quote a value for a curl config file."""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    escaped = escaped.replace("\n", "\\n").replace("\t", "\\t")
+    return f'"{escaped}"'
+
+
+def to_config_lines(options: list) -> list:
+    """
+    Turn command line options into curl config lines. Every token that
+    starts with a dash begins an option, the tokens after it are its value.
+    """
+    lines = []
+    for token in options:
+        if token.startswith("-") or not lines:
+            lines.append(token)
+        else:
+            lines[-1] += f" {quote_config(token)}"
+    return lines
+
+
+def build_config(
+    urls: list, options: list, per_url_options: list = None, output: str = "/dev/null"
+) -> str:
+    """
+    A curl config with one operation per URL, separated by `next`. Every
+    operation gets `options`, then its entry of `per_url_options` (so the
+    latter win), and writes to `output`.
+    """
+    common = to_config_lines(options)
+    blocks = []
+    for index, url in enumerate(urls):
+        lines = list(common)
+        if per_url_options and per_url_options[index]:
+            lines += to_config_lines(per_url_options[index])
+        lines.append(f"write-out = {quote_config(WRITE_OUT)}")
+        lines.append(f"output = {quote_config(output)}")
+        lines.append(f"url = {quote_config(url)}")
+        blocks.append("\n".join(lines))
+    return "\nnext\n".join(blocks) + "\n"
+
+
+def run_curl_batch(
+    curl_path: str,
+    urls: list,
+    options: list,
+    parallel_max: int = 8,
+    timeout: float = None,
+    on_result=None,
+    per_url_options: list = None,
+) -> list:
+    """
+    Download every URL with a single `curl --parallel` process.
+
+    `options` are the per-transfer command line options (proxy, timeouts,
+    user agent, ...) and apply to every URL; `per_url_options`, if given,
+    holds extra options for each URL (e.g. its own --max-time). All of it
+    is fed to curl as a config on stdin. curl reports each finished
+    transfer with a `--write-out` JSON line, which is mapped back to its
+    URL.
+
+    Results are `(returncode, stderr, error, report)` tuples: the
+    transfer's curl exit code, its error message, and its write-out
+    report. URLs without a report (curl crashed or exceeded `timeout`)
+    get `returncode` and `report` None and an `error`. Results are
+    returned in the order of `urls`, and `on_result(url, result)` is called in that same
+    order as soon as all earlier transfers finished.
+    """
+    if not urls:
+        return []
+
+    cmd = [
+        curl_path,
+        "--parallel",
+        "--parallel-max",
+        str(max(1, parallel_max)),
+        "--silent",  # The progress meter is global, not per operation
+        "--config",
+        "-",
+    ]
+    results = [None] * len(urls)
+    next_to_report = 0
+
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="ignore",
+    )
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+
+    # Drain stderr separately so a chatty curl can't block on a full pipe
+    stderr_chunks = []
+    stderr_reader = threading.Thread(
+        target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True
+    )
+    stderr_reader.start()
+
+    try:
+        try:
+            proc.stdin.write(build_config(urls, options, per_url_options))
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        for line in proc.stdout:
+            try:
+                report = json.loads(line)
+                index = int(report["urlnum"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if not 0 <= index < len(urls):
+                continue
+            results[index] = (
+                report.get("exitcode", 0),
+                report.get("errormsg") or "",
+                None,
+                report,
+            )
+
+            while next_to_report < len(urls) and results[next_to_report] is not None:
+                if on_result:
+                    on_result(urls[next_to_report], results[next_to_report])
+                next_to_report += 1
+        proc.wait()
+    finally:
+        if timer:
+            timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        stderr_reader.join(1)
+
+    if timed_out.is_set():
+        error = f"Batch timeout after {timeout}s"
+    else:
+        error = f"No report from curl (exit code {proc.returncode})"
+    stderr = "".join(stderr_chunks)[-STDERR_LIMIT:]
+    for index in range(next_to_report, len(urls)):
+        if results[index] is None:
+            results[index] = (None, stderr, error, None)
+        if on_result:
+            on_result(urls[index], results[index])
+    return results
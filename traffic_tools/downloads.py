@@ -0,0 +1,71 @@
+# Imports #
+import time
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# Functions #
+def get_host(url: str) -> str:
+    return urllib.parse.urlsplit(url).hostname or ""
+
+
+def run_download_phase(
+    urls: list,
+    download,
+    concurrency: int = 8,
+    per_host: int = 2,
+    delay: float = 0.0,
+    on_result=None,
+) -> list:
+    """
+    Run `download(url)` for every URL on a pool of `concurrency` workers.
+
+    At most `per_host` requests to the same host are in flight at once;
+    URLs whose host is busy are skipped over rather than blocking a worker,
+    so one slow host can't stall the others. Each worker pauses `delay`
+    seconds after a request. Results are returned in the order of `urls`,
+    and `on_result(url, result)` is called in that same order as soon as
+    all earlier results are in.
+    """
+    concurrency = max(1, concurrency)  # 0 or less would never dispatch anything
+    results = [None] * len(urls)
+    hosts = [get_host(url) for url in urls]
+    pending = list(range(len(urls)))
+    in_flight = {}  # future -> index
+    per_host_count = {}
+    next_to_report = 0
+    done = set()
+
+    def job(url: str):
+        try:
+            return download(url)
+        finally:
+            if delay:
+                time.sleep(delay)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while pending or in_flight:
+            # Dispatch, in order, every URL whose host has a free slot
+            for index in list(pending):
+                if len(in_flight) >= concurrency:
+                    break
+                host = hosts[index]
+                if per_host > 0 and per_host_count.get(host, 0) >= per_host:
+                    continue
+                pending.remove(index)
+                per_host_count[host] = per_host_count.get(host, 0) + 1
+                in_flight[executor.submit(job, urls[index])] = index
+
+            finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = in_flight.pop(future)
+                per_host_count[hosts[index]] -= 1
+                results[index] = future.result()
+                done.add(index)
+
+            while next_to_report in done:
+                if on_result:
+                    on_result(urls[next_to_report], results[next_to_report])
+                next_to_report += 1
+
+    return results
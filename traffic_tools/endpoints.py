@@ -0,0 +1,195 @@
+# Imports #
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .socks import parse_target
+
+# Constants #
+PROBE_VERSION = 0x1A2A3A4A  # Reserved to force version negotiation (RFC 9000)
+PROBE_SIZE = 1200  # Servers ignore long-header packets smaller than this
+CID_LENGTH = 8
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "traffic_tools")
+ENDPOINTS_PATH = os.path.join(CACHE_DIR, "endpoints.json")
+
+
+# Functions #
+def build_probe(dcid: bytes, scid: bytes) -> bytes:
+    """
+    A QUIC long-header packet with an unsupported version, padded to
+    PROBE_SIZE bytes. Any QUIC server answers it with a Version
+    Negotiation packet, without any handshake state or crypto.
+    """
+    header = bytes([0xC0]) + struct.pack("!I", PROBE_VERSION)
+    header += bytes([len(dcid)]) + dcid + bytes([len(scid)]) + scid
+    return header + bytes(PROBE_SIZE - len(header))
+
+
+def build_version_negotiation(probe: bytes, versions: tuple = (1,)) -> bytes:
+    """The Version Negotiation packet a server sends back for `probe`."""
+    dcid_length = probe[5]
+    dcid = probe[6 : 6 + dcid_length]
+    scid_length = probe[6 + dcid_length]
+    scid = probe[7 + dcid_length : 7 + dcid_length + scid_length]
+    # The client's source connection id becomes the destination one
+    packet = bytes([0x80]) + struct.pack("!I", 0)
+    packet += bytes([len(scid)]) + scid + bytes([len(dcid)]) + dcid
+    return packet + b"".join(struct.pack("!I", version) for version in versions)
+
+
+def parse_version_negotiation(packet: bytes, scid: bytes) -> list:
+    """
+    Return the versions offered by a Version Negotiation packet answering
+    a probe sent with `scid`, or None if `packet` is not one.
+    """
+    if len(packet) < 7 or not packet[0] & 0x80 or packet[1:5] != bytes(4):
+        return None
+    dcid_length = packet[5]
+    if packet[6 : 6 + dcid_length] != scid:
+        return None
+    offset = 6 + dcid_length
+    if offset >= len(packet):
+        return None
+    offset += 1 + packet[offset]
+    return [
+        struct.unpack("!I", packet[i : i + 4])[0]
+        for i in range(offset, len(packet) - 3, 4)
+    ]
+
+
+def probe_endpoint(endpoint: str, timeout: float = 1.0, attempts: int = 3) -> float:
+    """
+    Round-trip time in seconds of a version negotiation with the QUIC
+    server at `endpoint` ("host:port"), the best of `attempts` probes.
+    Returns None if it never answered.
+    """
+    host, port = parse_target(endpoint)
+    best = None
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)
+    except OSError:
+        return None
+    family, _, _, _, address = infos[0]
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        for _ in range(attempts):
+            dcid, scid = os.urandom(CID_LENGTH), os.urandom(CID_LENGTH)
+            started = time.monotonic()
+            try:
+                sock.sendto(build_probe(dcid, scid), address)
+                while True:
+                    packet = sock.recv(2048)
+                    if parse_version_negotiation(packet, scid) is not None:
+                        break
+                    # A late answer to an earlier attempt, keep waiting
+                    sock.settimeout(max(0.001, timeout - (time.monotonic() - started)))
+            except OSError:  # Including socket.timeout
+                continue
+            finally:
+                sock.settimeout(timeout)
+            rtt = time.monotonic() - started
+            best = rtt if best is None else min(best, rtt)
+    return best
+
+
+def measure_endpoints(endpoints: list, timeout: float = 1.0, attempts: int = 3) -> dict:
+    """Probe all endpoints in parallel: {endpoint: rtt or None}"""
+    if not endpoints:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+        rtts = executor.map(lambda e: probe_endpoint(e, timeout, attempts), endpoints)
+        return dict(zip(endpoints, rtts))
+
+
+# Main class #
+class EndpointSelector:
+    """
+    Ranks candidate MASQUE endpoints by QUIC round-trip time.
+
+    The ranking is measured with `measure_endpoints()` and cached in a JSON
+    file for `ttl` seconds, so restarts don't wait on probes. Endpoints
+    that did not answer stay at the end of the ranking (the probe may be
+    filtered where the tunnel itself works). `mark_failed()` moves an
+    endpoint the client could not start on to the end until the next
+    measurement.
+    """
+
+    def __init__(
+        self,
+        candidates: list,
+        path: str = ENDPOINTS_PATH,
+        ttl: float = 600.0,
+        timeout: float = 1.0,
+        attempts: int = 3,
+    ) -> None:
+        self.candidates: list = list(dict.fromkeys(candidates))
+        self.path: str = path
+        self.ttl: float = ttl
+        self.timeout: float = timeout
+        self.attempts: int = attempts
+        self.rtts: dict = {}
+        self._lock = threading.Lock()
+        self._ranking: list = None
+        self._measured_at: float = 0.0
+        self._load()
+
+    def ranking(self, refresh: bool = False) -> list:
+        """The candidates, fastest first, measured again once stale."""
+        with self._lock:
+            stale = time.time() - self._measured_at >= self.ttl
+            if refresh or stale or self._ranking is None:
+                self._measure()
+            return list(self._ranking)
+
+    def mark_failed(self, endpoint: str) -> None:
+        with self._lock:
+            if self._ranking and endpoint in self._ranking:
+                self._ranking.remove(endpoint)
+                self._ranking.append(endpoint)
+                self._save()
+
+    def _measure(self) -> None:
+        self.rtts = measure_endpoints(self.candidates, self.timeout, self.attempts)
+        reachable = sorted(
+            (e for e in self.candidates if self.rtts[e] is not None),
+            key=lambda e: self.rtts[e],
+        )
+        unreachable = [e for e in self.candidates if self.rtts[e] is None]
+        self._ranking = reachable + unreachable
+        self._measured_at = time.time()
+        self._save()
+
+    def _save(self) -> None:
+        data = json.dumps(
+            {
+                "measured_at": self._measured_at,
+                "rtts": self.rtts,
+                "ranking": self._ranking,
+            },
+            indent=2,
+        )
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp-{os.getpid()}"
+            with open(temp_path, "w") as file:
+                file.write(data)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass  # The next run measures again
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        ranking = data.get("ranking") or []
+        if sorted(ranking) != sorted(self.candidates):
+            return  # The candidate list changed since
+        self._ranking = ranking
+        self._measured_at = data.get("measured_at", 0.0)
+        self.rtts = data.get("rtts", {})
@@ -0,0 +1,135 @@
+# Imports #
+import os
+import random
+import threading
+import time
+
+from .downloads import get_host
+from .state import load_state, update_state
+
+# Constants #
+CLOSED = "closed"  # Healthy, picked normally
+OPEN = "open"  # Failing, skipped until the cooldown is over
+HALF_OPEN = "half_open"  # Cooldown over, a single probe request is allowed
+FAILURE_CODES = (7, 28)  # curl: couldn't connect, operation timed out
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "traffic_tools")
+
+
+# Functions #
+def get_health_path(name: str) -> str:
+    return os.path.join(CACHE_DIR, f"target_health_{name}.json")
+
+
+# Main class #
+class TargetHealth:
+    """
+    A circuit breaker per target host, persisted in a JSON file that the
+    loops of one mode share: `save()` writes the breakers this loop changed
+    and takes over the ones other loops changed.
+
+    `failure_threshold` consecutive failures (curl exit codes in
+    `failure_codes`, or a timeout) open a host's breaker and it stops
+    being picked. After `cooldown` seconds it is half-open: one request
+    is let through as a probe, which closes the breaker again on success
+    or reopens it for another cooldown on failure.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        failure_threshold: int = 3,
+        cooldown: float = 300.0,
+        failure_codes: tuple = FAILURE_CODES,
+    ) -> None:
+        self.path: str = path
+        self.failure_threshold: int = failure_threshold
+        self.cooldown: float = cooldown
+        self.failure_codes: tuple = failure_codes
+        self._lock = threading.Lock()
+        self._hosts: dict = self._load()
+        self._changed: set = set()  # Hosts to write on the next save()
+
+    def choose(self, candidates: list, rng=random) -> str:
+        """
+        Pick a random candidate (URL or host name) whose host may be used,
+        or None if every one of them is open. Picking a half-open host
+        reserves its single probe. `rng` is the random.Random to draw from.
+        """
+        with self._lock:
+            available = [c for c in candidates if self._is_available(self._key(c))]
+            if not available:
+                return None
+            choice = rng.choice(available)
+            host = self._key(choice)
+            entry = self._entry(host)
+            if entry["state"] != CLOSED:
+                entry["state"] = HALF_OPEN
+                entry["probing"] = True
+                self._changed.add(host)
+            return choice
+
+    def record(self, url: str, returncode: int, error: str = None) -> None:
+        """Update a host's breaker with the outcome of a request to it."""
+        failed = returncode in self.failure_codes or (
+            returncode is None and error and "timeout" in error.lower()
+        )
+        with self._lock:
+            host = self._key(url)
+            self._changed.add(host)
+            entry = self._entry(host)
+            entry["probing"] = False
+            if not failed:
+                if returncode == 0:
+                    entry.update(state=CLOSED, failures=0)
+                return
+            entry["failures"] += 1
+            if (
+                entry["state"] == HALF_OPEN
+                or entry["failures"] >= self.failure_threshold
+            ):
+                entry.update(state=OPEN, opened_at=time.time())
+
+    def get_open_hosts(self) -> list:
+        with self._lock:
+            return [h for h, e in self._hosts.items() if e["state"] != CLOSED]
+
+    def save(self) -> None:
+        """Merge the changed breakers into the file, under its lock"""
+        with self._lock:
+
+            def merge(hosts: dict) -> dict:
+                hosts.update((host, self._hosts[host]) for host in self._changed)
+                return hosts
+
+            try:
+                hosts = update_state(self.path, merge, indent=2)
+            except OSError:
+                return  # Losing the state only costs a few failed requests
+            for host, entry in hosts.items():
+                if host not in self._changed:
+                    entry["probing"] = False  # Another loop's probe
+                    self._hosts[host] = entry
+            self._changed.clear()
+
+    @staticmethod
+    def _key(candidate: str) -> str:
+        return get_host(candidate) or candidate
+
+    def _entry(self, host: str) -> dict:
+        return self._hosts.setdefault(
+            host, {"state": CLOSED, "failures": 0, "opened_at": 0.0, "probing": False}
+        )
+
+    def _is_available(self, host: str) -> bool:
+        entry = self._hosts.get(host)
+        if entry is None or entry["state"] == CLOSED:
+            return True
+        if entry.get("probing"):
+            return False
+        return time.time() - entry["opened_at"] >= self.cooldown
+
+    def _load(self) -> dict:
+        hosts = load_state(self.path)
+        for entry in hosts.values():
+            entry["probing"] = False  # A probe of an earlier run never finished
+        return hosts
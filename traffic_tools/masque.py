@@ -0,0 +1,181 @@
+"""
+The MASQUE client behind the SOCKS5 proxy of a capture loop, shared by
+the file transfer loops (traffic_tools.core) and the YouTube loop.
+"""
+
+# Imports #
+import time
+
+from .endpoints import EndpointSelector
+from .proxy import ProxyManager
+from .proxy_log import ProxyLog, get_log_path
+from .socks import ProxyNotReady, probe_socks5
+from .tunnels import TunnelBackend, get_backend
+
+
+# Main class #
+class MasqueProxy:
+    """
+    Runs the MASQUE client of a capture loop: the fastest endpoint by QUIC
+    RTT is tried first, then the next ones, with the client picked by
+    TUNNEL_BACKEND. Its output is drained into a log file per cycle, next
+    to the pcap, and a `ProxyManager` decides when it is restarted.
+
+    The configuration is read from `settings` (a script module): PROXY_*,
+    TUNNEL_BACKEND, MASQUE_ENDPOINTS, ENDPOINT_CACHE_TTL and
+    MAX_ENDPOINT_ATTEMPTS. `steps` numbers the "proxy" and "stop_proxy"
+    steps in the log. `endpoints` and `backend` replace the ones built
+    from the settings, `mode` replaces PROXY_MODE.
+
+    Per cycle, `begin_cycle(pcap_path)` returns the running client (None
+    if it could not start) and `end_cycle()` stops it, unless it is kept
+    for the next cycles, and returns the summary of its lifecycle events.
+    """
+
+    def __init__(
+        self,
+        settings,
+        supervisor,
+        steps: dict,
+        mode: str = None,
+        endpoints: EndpointSelector = None,
+        backend: TunnelBackend = None,
+    ) -> None:
+        s = settings
+        self.settings = settings
+        self.steps: dict = steps
+        # Ranked by QUIC RTT, re-measured every ENDPOINT_CACHE_TTL seconds
+        self.endpoints: EndpointSelector = endpoints or EndpointSelector(
+            s.MASQUE_ENDPOINTS, ttl=s.ENDPOINT_CACHE_TTL
+        )
+        self.backend: TunnelBackend = backend or get_backend(
+            s.TUNNEL_BACKEND,
+            host=s.PROXY_HOST,
+            port=s.PROXY_PORT,
+            supervisor=supervisor,
+        )
+        self.backend.prepare()
+        self.log: ProxyLog = ProxyLog(patterns=self.backend.patterns)
+        self.manager: ProxyManager = ProxyManager(
+            self.start,
+            self.stop,
+            self.check,
+            mode=mode or s.PROXY_MODE,
+            rotate_every=s.PROXY_ROTATE_EVERY,
+            check_interval=s.PROXY_CHECK_INTERVAL,
+        )
+
+    @property
+    def persistent(self) -> bool:
+        return self.manager.persistent
+
+    def launch(self, endpoint: str):
+        """Start the MASQUE client on one endpoint, return it once the proxy is usable"""
+        s, backend = self.settings, self.backend
+        # Output is drained into the cycle's log in the background, so the
+        # client never blocks on a full pipe
+        proc = backend.start(endpoint)
+        self.log.attach(proc, backend.name)
+
+        # Move on as soon as the tunnel passes traffic (or give up at the deadline)
+        print(
+            f"  -> Waiting for {backend.name} to establish QUIC connection "
+            f"to {endpoint}..."
+        )
+        try:
+            ready_after = backend.wait_ready(
+                proc, s.PROXY_READY_TIMEOUT, s.PROXY_PROBE_TARGET or None
+            )
+        except ProxyNotReady as e:
+            if proc.poll() is not None:
+                print(f"  -> ERROR: {backend.name} exited prematurely!")
+                for line in self.log.tail()[-5:]:
+                    print(f"  -> {line[:200]}")
+            else:
+                print(f"  ✗ ERROR: Proxy on port {s.PROXY_PORT} is not usable: {e}")
+                self.stop(proc)
+            return None
+
+        self.log.mark(
+            proc,
+            "ready",
+            f"SOCKS5 on port {s.PROXY_PORT} passes traffic via {endpoint}",
+        )
+        print(f"  ✓ Masque client {backend.name} started (PID: {proc.pid})")
+        print(
+            f"  ✓ Proxy ready on {s.PROXY_HOST}:{s.PROXY_PORT} "
+            f"after {ready_after:.1f}s"
+        )
+        return proc
+
+    def start(self):
+        """Start Masque Client (Proxy) on the fastest endpoint, failing over to the next ones"""
+        print(
+            f"[PROXY]  {self.steps['proxy']}. Starting Masque Client "
+            f"({self.backend.name})..."
+        )
+        ranking = self.endpoints.ranking()
+        for endpoint in ranking[: self.settings.MAX_ENDPOINT_ATTEMPTS]:
+            rtt = self.endpoints.rtts.get(endpoint)
+            rtt_label = f" (RTT {rtt * 1000:.0f}ms)" if rtt else " (no RTT)"
+            print(f"  -> Endpoint {endpoint}{rtt_label}")
+            proc = self.launch(endpoint)
+            if proc:
+                return proc
+            self.endpoints.mark_failed(endpoint)
+        return None
+
+    def check(self) -> None:
+        """Health check of the running proxy (raises OSError if it's broken)"""
+        s = self.settings
+        probe_socks5(
+            s.PROXY_HOST, s.PROXY_PORT, timeout=5, target=s.PROXY_PROBE_TARGET or None
+        )
+
+    def stop(self, proc) -> None:
+        """Stop Masque Client"""
+        print(
+            f"[PROXY]  {self.steps['stop_proxy']}. Stopping Masque Client "
+            f"({self.backend.name}, Closing Flow)..."
+        )
+        if proc:
+            try:
+                print(f"  -> Stopping process group for PID {proc.pid}...")
+                self.backend.stop(proc)
+            except Exception as e:
+                print(f"  -> Could not stop process group: {e}")
+        time.sleep(1)
+
+    def report(self) -> dict:
+        """Save the cycle's MASQUE client lifecycle events and print the tunnel setup time"""
+        summary = self.log.end_cycle()
+        counts = summary["events"]
+        if summary["establish"] is not None:
+            status = f"up after {summary['establish']:.1f}s"
+        elif counts.get("start"):
+            status = "never came up"
+        else:
+            status = "kept from an earlier cycle"
+        print(
+            f"  -> Tunnel ({summary.get('process', '?')}) {status}, "
+            f"{counts.get('reconnect', 0)} reconnects, {counts.get('error', 0)} errors"
+        )
+        return summary
+
+    # --- Cycle ---
+
+    def begin_cycle(self, pcap_path: str):
+        """Log into the pcap's proxy log and return a running client, or None"""
+        self.log.begin_cycle(get_log_path(pcap_path))
+        return self.manager.begin_cycle()
+
+    def end_cycle(self) -> dict:
+        """Stop the client unless it is persistent, return the tunnel summary"""
+        self.manager.end_cycle()
+        if not self.persistent:
+            time.sleep(2)
+        return self.report()
+
+    def close(self) -> None:
+        self.manager.close()
+        self.log.close()
@@ -0,0 +1,201 @@
+"""
+Per-transfer curl metrics.
+
+Every transfer's `--write-out` JSON is appended to a per-cycle JSONL file
+next to the cycle's pcap. Run `python -m traffic_tools.metrics FILE...`
+(or a directory) to print per-target percentiles for each mode (and
+tunnel backend, for the proxy mode).
+"""
+
+# Imports #
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+# Constants #
+WRITE_OUT = "%{json}\n"  # One JSON object per finished transfer (curl >= 7.75)
+METRICS_SUFFIX = ".metrics.jsonl"
+FIELDS = (  # Kept from curl's write-out report
+    "exitcode",
+    "http_code",
+    "http_version",
+    "remote_ip",
+    "time_namelookup",
+    "time_connect",
+    "time_appconnect",
+    "time_starttransfer",
+    "time_total",
+    "size_download",
+    "size_upload",
+    "speed_download",
+    "speed_upload",
+    "num_redirects",
+)
+SUMMARY_COLUMNS = (  # (heading, field, scale, format)
+    ("connect", "time_connect", 1000, "{:.0f}ms"),
+    ("tls", "time_appconnect", 1000, "{:.0f}ms"),
+    ("ttfb", "time_starttransfer", 1000, "{:.0f}ms"),
+    ("total", "time_total", 1000, "{:.0f}ms"),
+    ("speed", "speed", 1 / 1024**2, "{:.2f}MB/s"),
+)
+PERCENTILES = (50, 90, 99)
+
+
+# Classes #
+class MetricsRecorder:
+    """Appends one JSON line per transfer to a metrics file."""
+
+    def __init__(
+        self, path: str, mode: str, cycle: int = None, backend: str = None
+    ) -> None:
+        self.path: str = path
+        self.mode: str = mode
+        self.cycle: int = cycle
+        self.backend: str = backend
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def record(
+        self, kind: str, url: str, report: dict = None, error: str = None
+    ) -> None:
+        """Store one transfer: its write-out `report`, or the `error` it hit."""
+        entry = {
+            "time": time.time(),
+            "cycle": self.cycle,
+            "mode": self.mode,
+            "backend": self.backend,
+            "kind": kind,
+            "target": urllib.parse.urlsplit(url).hostname or url,
+            "url": url,
+        }
+        if report:
+            entry.update({field: report.get(field) for field in FIELDS})
+        if error:
+            entry["error"] = error
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "MetricsRecorder":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+# Functions #
+def parse_write_out(text: str) -> dict:
+    """Return the last write-out JSON object found in curl's stdout."""
+    for line in reversed(text.splitlines()):
+        line = line.strip()
+        if line.startswith("{"):
+            try:
+                return json.loads(line)
+            except ValueError:
+                continue
+    return None
+
+
+def get_metrics_path(pcap_path: str) -> str:
+    """The metrics file belonging to a pcap: <name>.metrics.jsonl"""
+    return os.path.splitext(pcap_path)[0] + METRICS_SUFFIX
+
+
+def percentile(values: list, percent: float) -> float:
+    """Linearly interpolated percentile of a list of numbers."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def read_records(paths: list) -> list:
+    records = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "*" + METRICS_SUFFIX)))
+        else:
+            files = [path]
+        for name in files:
+            with open(name, "r") as file:
+                for line in file:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+    return records
+
+
+def summarize(records: list, by: str = "target") -> list:
+    """
+    Group records by (mode, `by`) and compute percentiles per column. The
+    mode of records with a tunnel backend is "<mode>/<backend>".
+    """
+    groups = {}
+    for record in records:
+        mode = record.get("mode", "?")
+        if record.get("backend"):
+            mode = f"{mode}/{record['backend']}"
+        key = (mode, record.get(by) or "?")
+        groups.setdefault(key, []).append(record)
+
+    rows = []
+    for (mode, name), group in sorted(groups.items()):
+        ok = [r for r in group if r.get("exitcode") == 0 and not r.get("error")]
+        row = {"mode": mode, by: name, "count": len(group), "ok": len(ok)}
+        for heading, field, scale, _ in SUMMARY_COLUMNS:
+            if field == "speed":
+                values = [
+                    (r.get("speed_download") or 0) + (r.get("speed_upload") or 0)
+                    for r in ok
+                ]
+            else:
+                values = [r[field] for r in ok if r.get(field) is not None]
+            row[heading] = {p: percentile(values, p) * scale for p in PERCENTILES}
+        rows.append(row)
+    return rows
+
+
+def print_summary(rows: list, by: str = "target") -> None:
+    percent = "/".join(f"p{p}" for p in PERCENTILES)
+    print(f"Values are {percent}")
+    header = f"{'mode':<20}{by:<28}{'ok/count':>10}"
+    for heading, *_ in SUMMARY_COLUMNS:
+        header += f"  {heading:>24}"
+    print(header)
+    for row in rows:
+        line = f"{row['mode'][:19]:<20}{str(row[by])[:27]:<28}"
+        line += f"{row['ok']:>5}/{row['count']:<4}"
+        for heading, _, _, fmt in SUMMARY_COLUMNS:
+            values = "/".join(fmt.format(row[heading][p]) for p in PERCENTILES)
+            line += f"  {values:>24}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "paths", nargs="+", help=f"{METRICS_SUFFIX} files or directories"
+    )
+    parser.add_argument(
+        "--by", choices=("target", "kind"), default="target", help="group rows by"
+    )
+    args = parser.parse_args()
+    rows = summarize(read_records(args.paths), by=args.by)
+    if not rows:
+        print("No metrics found")
+        return
+    print_summary(rows, by=args.by)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# Imports #
+import mmap
+import os
+import random
+import subprocess
+import threading
+
+# Constants #
+CHUNK_SIZE = 1024 * 1024  # Bytes generated and written at a time
+POOL_SIZE = 64 * 1024 * 1024
+DEFAULT_POOL_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "traffic_tools", "payload.pool"
+)
+
+
+# Functions #
+def get_file_size(path: str) -> int:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return -1
+
+
+def get_mask_table() -> bytes:
+    """
+    A random byte substitution table for `bytes.translate`. Masking with
+    it runs at memcpy speed, unlike an XOR through Python integers.
+    """
+    return bytes(random.sample(range(256), 256))
+
+
+def iter_payload(size: int, chunk_size: int = CHUNK_SIZE):
+    """Yield `size` bytes of incompressible filler, `chunk_size` at a time."""
+    remaining = size
+    while remaining > 0:
+        length = min(chunk_size, remaining)
+        yield os.urandom(length)
+        remaining -= length
+
+
+def stream_to_process(
+    cmd: list, chunks, timeout: float = None
+) -> subprocess.CompletedProcess:
+    """
+    Run `cmd` and write every chunk to its stdin as it is generated, so
+    memory use stays at one chunk whatever the total size. Behaves like
+    `subprocess.run(cmd, capture_output=True, timeout=timeout)`: stdout
+    and stderr are captured, and TimeoutExpired is raised (after killing
+    the process) once `timeout` seconds have passed.
+    """
+    proc = subprocess.Popen(
+        cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+
+    # Drain the output pipes while stdin is written, so neither side blocks
+    output = {}
+    readers = [
+        threading.Thread(
+            target=lambda name, pipe: output.__setitem__(name, pipe.read()),
+            args=(name, pipe),
+            daemon=True,
+        )
+        for name, pipe in (("stdout", proc.stdout), ("stderr", proc.stderr))
+    ]
+    for reader in readers:
+        reader.start()
+
+    try:
+        try:
+            for chunk in chunks:
+                proc.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            pass  # The process exited (or was killed) before reading it all
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        proc.wait()
+    finally:
+        if timer:
+            timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        for reader in readers:
+            reader.join(1)
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(
+            cmd, timeout, output.get("stdout"), output.get("stderr")
+        )
+    return subprocess.CompletedProcess(
+        cmd, proc.returncode, output.get("stdout", b""), output.get("stderr", b"")
+    )
+
+
+# Classes #
+class PayloadPool:
+    """
+    A large file of random bytes, generated once and memory-mapped, that
+    uploads slice their payloads from. Each payload starts at a random
+    offset, wraps around at the end of the pool, and has its bytes
+    remapped through a random substitution table (a new one after every
+    wrap), so payloads stay distinct and incompressible without asking
+    the kernel for fresh random bytes each time.
+    """
+
+    def __init__(self, path: str = DEFAULT_POOL_PATH, size: int = POOL_SIZE) -> None:
+        self.path: str = path
+        self.size: int = size
+        if get_file_size(path) != size:
+            self._generate()
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def iter_payload(self, size: int, chunk_size: int = CHUNK_SIZE, mask: bool = True):
+        """Yield `size` bytes sliced from the pool, `chunk_size` at a time."""
+        chunk_size = min(chunk_size, self.size)
+        offset = random.randrange(self.size)
+        table = get_mask_table() if mask else None
+        remaining = size
+        while remaining > 0:
+            length = min(chunk_size, remaining, self.size - offset)
+            chunk = self._map[offset : offset + length]
+            if table:
+                chunk = chunk.translate(table)
+            yield chunk
+            remaining -= length
+            offset += length
+            if offset >= self.size:
+                offset = 0
+                table = get_mask_table() if mask else None
+
+    def close(self) -> None:
+        self._map.close()
+
+    def _generate(self) -> None:
+        """Write the pool to a temporary file, then move it into place."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp-{os.getpid()}"
+        try:
+            with open(temp_path, "wb") as file:
+                for chunk in iter_payload(self.size):
+                    file.write(chunk)
+            os.replace(temp_path, self.path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
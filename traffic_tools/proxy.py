@@ -0,0 +1,116 @@
+# Imports #
+import threading
+
+# Constants #
+PROXY_MODES = ("persistent", "per_cycle")
+
+
+# Main class #
+class ProxyManager:
+    """
+    Decides when the proxy process is started and stopped.
+
+    In "per_cycle" mode (the default) every cycle gets a fresh process.
+    In the opt-in "persistent" mode one process is kept across cycles: a
+    background thread runs `probe()` every `check_interval` seconds, and
+    the process is restarted only when it exited or failed `max_failures`
+    probes in a row. `rotate_every` additionally restarts it every N cycles (0 never).
+
+    `start()` returns the new process (or None if it could not start),
+    `stop(proc)` ends it, and `probe()` raises OSError or returns False
+    when the proxy does not work.
+    """
+
+    def __init__(
+        self,
+        start,
+        stop,
+        probe,
+        mode: str = "per_cycle",
+        rotate_every: int = 0,
+        check_interval: float = 10.0,
+        max_failures: int = 2,
+    ) -> None:
+        if mode not in PROXY_MODES:
+            raise ValueError(f"Unknown proxy mode: {mode}")
+        self.start = start
+        self.stop = stop
+        self.probe = probe
+        self.mode: str = mode
+        self.rotate_every: int = rotate_every
+        self.check_interval: float = check_interval
+        self.max_failures: int = max_failures
+        self.restarts: int = 0
+
+        self._proc = None
+        self._cycles: int = 0  # Cycles served by the current process
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._checker = None
+
+    @property
+    def persistent(self) -> bool:
+        return self.mode == "persistent"
+
+    def begin_cycle(self):
+        """Return a running proxy process for the next cycle, or None."""
+        with self._lock:
+            rotate = self.rotate_every and self._cycles >= self.rotate_every
+            if not self.persistent or rotate or not self._is_running():
+                self._restart()
+            if self._proc is not None:
+                self._cycles += 1
+            if self.persistent and self._checker is None:
+                self._checker = threading.Thread(
+                    target=self._check_loop, name="proxy-health", daemon=True
+                )
+                self._checker.start()
+            return self._proc
+
+    def end_cycle(self) -> None:
+        """Stop the process, unless it is kept for the next cycles."""
+        if not self.persistent:
+            with self._lock:
+                self._stop()
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            self._stop()
+
+    def _is_running(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def _is_healthy(self) -> bool:
+        try:
+            return self.probe() is not False
+        except OSError:
+            return False
+
+    def _restart(self) -> None:
+        if self._proc is not None:
+            self._stop()
+            self.restarts += 1
+        self._proc = self.start()
+        self._cycles = 0
+
+    def _stop(self) -> None:
+        if self._proc is not None:
+            self.stop(self._proc)
+            self._proc = None
+
+    def _check_loop(self) -> None:
+        failures = 0
+        while not self._closed.wait(self.check_interval):
+            with self._lock:
+                if self._closed.is_set() or self._proc is None:
+                    continue
+                if self._is_running() and self._is_healthy():
+                    failures = 0
+                    continue
+                failures += 1
+                if self._is_running() and failures < self.max_failures:
+                    continue
+                print("[PROXY]  Health check failed, restarting the proxy...")
+                self._restart()
+                failures = 0
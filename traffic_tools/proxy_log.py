@@ -0,0 +1,210 @@
+# Imports #
+import collections
+import json
+import os
+import re
+import threading
+import time
+
+# Constants #
+LOG_SUFFIX = ".masque.log"
+EVENTS_SUFFIX = ".tunnel.json"
+EVENT_PATTERNS = (  # (event, regex) tried in order on every output line
+    ("register", r"regist|enroll"),
+    (
+        "tunnel_up",
+        r"connected to|tunnel (is )?(up|established)|handshake (complete|done)"
+        r"|connection established",
+    ),
+    ("listening", r"listening|serving"),
+    ("reconnect", r"reconnect|retrying|connection lost"),
+    ("error", r"\berror\b|fail|panic|fatal"),
+)
+MAX_LOG_BYTES = 50 * 1024 * 1024  # Then renamed to <name>.1, replacing an older .1
+
+
+# Functions #
+def get_log_path(pcap_path: str) -> str:
+    """The proxy log belonging to a pcap: <name>.masque.log"""
+    return os.path.splitext(pcap_path)[0] + LOG_SUFFIX
+
+
+def get_events_path(log_path: str) -> str:
+    """The lifecycle events belonging to a proxy log: <name>.tunnel.json"""
+    name = log_path[: -len(LOG_SUFFIX)] if log_path.endswith(LOG_SUFFIX) else log_path
+    return name + EVENTS_SUFFIX
+
+
+# Main class #
+class ProxyLog:
+    """
+    Drains the output of the proxy processes in the background, so a full
+    pipe never blocks them, into one log file per cycle.
+
+    `attach(proc)` starts a reader thread per pipe of a process started
+    with stdout/stderr=PIPE (text mode, errors="replace"). Every line is
+    timestamped into the current log file and matched against `patterns`;
+    matches become lifecycle events, stored with their offset from the
+    process start. `mark()` adds events seen by the script itself, such
+    as "ready" once the SOCKS port passes traffic.
+
+    `begin_cycle(path)` switches to a new log file, `end_cycle()` writes
+    the cycle's events next to it and returns their summary, including
+    the tunnel establishment latency of a process started in the cycle.
+    """
+
+    def __init__(
+        self,
+        patterns: tuple = EVENT_PATTERNS,
+        max_bytes: int = MAX_LOG_BYTES,
+        tail_lines: int = 50,
+    ) -> None:
+        self.patterns: list = [
+            (event, re.compile(pattern, re.IGNORECASE)) for event, pattern in patterns
+        ]
+        self.max_bytes: int = max_bytes
+        self.path: str = None
+        self._file = None
+        self._events: list = []  # Events of the current cycle
+        self._started: dict = {}  # pid -> monotonic start time
+        self._tail: collections.deque = collections.deque(maxlen=tail_lines)
+        self._lock = threading.Lock()
+
+    def attach(self, proc, name: str = "masque-plus") -> None:
+        """Start draining a process' pipes; call right after starting it."""
+        with self._lock:
+            self._started[proc.pid] = time.monotonic()
+        self.mark(proc, "start", name)
+        for stream, label in ((proc.stdout, "out"), (proc.stderr, "err")):
+            if stream is None:
+                continue
+            threading.Thread(
+                target=self._drain,
+                args=(proc, stream, label),
+                name=f"{name}-{label}",
+                daemon=True,
+            ).start()
+
+    def mark(self, proc, event: str, line: str = "") -> None:
+        """Record a lifecycle event of `proc` seen outside its output."""
+        with self._lock:
+            self._add_event(proc.pid, event, line)
+            self._write(f"[{event}] {line}".rstrip())
+
+    def tail(self) -> list:
+        """The last output lines, for error messages."""
+        with self._lock:
+            return list(self._tail)
+
+    def begin_cycle(self, path: str) -> None:
+        with self._lock:
+            self._close_file()
+            self.path = path
+            self._events = []
+            try:
+                self._file = open(path, "a", buffering=1)
+            except OSError as e:
+                print(f"  -> Could not open proxy log {path}: {e}")
+                self._file = None
+
+    def end_cycle(self) -> dict:
+        """Write the cycle's events next to its log and return the summary."""
+        with self._lock:
+            events = list(self._events)
+            path = self.path
+        summary = self.summarize(events)
+        if path:
+            try:
+                with open(get_events_path(path), "w") as file:
+                    json.dump({"summary": summary, "events": events}, file, indent=2)
+            except OSError:
+                pass
+        return summary
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_file()
+
+    @staticmethod
+    def summarize(events: list) -> dict:
+        """
+        Counts per event, and `establish`: seconds from the last process
+        start in `events` to its tunnel being up (or, failing a log line
+        for it, to the SOCKS port being ready). None if it never was.
+        `process` names that last started process.
+        """
+        counts = collections.Counter(event["event"] for event in events)
+        summary = {"events": dict(counts), "establish": None, "ready": None}
+        starts = [e for e in events if e["event"] == "start"]
+        if starts:
+            summary["process"] = starts[-1]["line"]
+            pid = starts[-1]["pid"]
+            for event in events:
+                if event["pid"] != pid:
+                    continue
+                if event["event"] == "tunnel_up" and summary["establish"] is None:
+                    summary["establish"] = event["offset"]
+                if event["event"] == "ready" and summary["ready"] is None:
+                    summary["ready"] = event["offset"]
+            if summary["establish"] is None:
+                summary["establish"] = summary["ready"]
+        return summary
+
+    def _drain(self, proc, stream, label: str) -> None:
+        try:
+            for line in stream:
+                self._add_line(proc, label, line)
+        except UnicodeDecodeError as e:
+            # A strict text pipe got invalid output: record it, then keep
+            # draining the bytes underneath so the process never blocks
+            self.mark(proc, "decode_error", f"{label}: {e}")
+            try:
+                for raw in getattr(stream, "buffer", ()):
+                    self._add_line(proc, label, raw.decode(errors="replace"))
+            except (OSError, ValueError):
+                pass
+        except (OSError, ValueError):
+            pass  # The pipe was closed under us
+        if label == "out" or proc.stdout is None:
+            self.mark(proc, "exit", f"pipes closed (returncode {proc.poll()})")
+
+    def _add_line(self, proc, label: str, line: str) -> None:
+        line = line.rstrip("\n")
+        with self._lock:
+            self._tail.append(line)
+            self._write(f"{label}: {line}")
+            for event, pattern in self.patterns:
+                if pattern.search(line):
+                    self._add_event(proc.pid, event, line)
+                    break
+
+    def _add_event(self, pid: int, event: str, line: str) -> None:
+        started = self._started.get(pid)
+        offset = time.monotonic() - started if started is not None else None
+        self._events.append(
+            {
+                "event": event,
+                "time": time.time(),
+                "offset": None if offset is None else round(offset, 3),
+                "pid": pid,
+                "line": line[:500],
+            }
+        )
+
+    def _write(self, text: str) -> None:
+        if self._file is None:
+            return
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            self._file.write(f"{stamp} {text}\n")
+            if self._file.tell() >= self.max_bytes:
+                self._file.close()
+                os.replace(self.path, self.path + ".1")
+                self._file = open(self.path, "a", buffering=1)
+        except (OSError, ValueError):
+            self._file = None
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
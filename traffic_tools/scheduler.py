@@ -0,0 +1,166 @@
+# Imports #
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# Classes #
+class TokenBucket:
+    """
+    Tokens refill at `rate` per second, up to `burst`. `take()` may drive
+    the balance negative (a debt), which is how costs that are only known
+    afterwards, like transferred bytes, are charged.
+    """
+
+    def __init__(self, rate: float, burst: float, tokens: float = None) -> None:
+        self.rate: float = rate
+        self.burst: float = burst
+        self.tokens: float = burst if tokens is None else tokens
+        self._updated: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, amount: float) -> None:
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+    def wait_time(self, amount: float = 0.0) -> float:
+        """Seconds until at least `amount` tokens are available."""
+        with self._lock:
+            self._refill()
+            missing = amount - self.tokens
+        return max(0.0, missing / self.rate) if missing > 0 else 0.0
+
+
+class RequestScheduler:
+    """
+    Dispatches jobs to a pool of `concurrency` workers at a controlled load.
+
+    `request_rate` caps requests per second, with even gaps or, if
+    `poisson`, exponentially distributed ones (a Poisson process with the
+    same mean). `throughput_mbps` caps the transferred bits per second:
+    each finished job is charged `size_of(result)` bytes and dispatching
+    pauses while the bucket is in debt. Either limit may be 0 (none).
+
+    The phase stops dispatching once `byte_budget` bytes were transferred
+    or `time_budget` seconds passed (0 means no budget); jobs in flight
+    are always allowed to finish.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        request_rate: float = 0.0,
+        throughput_mbps: float = 0.0,
+        poisson: bool = False,
+        burst_seconds: float = 1.0,
+        rng=None,
+    ) -> None:
+        self.concurrency: int = max(1, concurrency)
+        self.rng = rng or random  # Draws the Poisson gaps
+        self.request_rate: float = request_rate
+        self.poisson: bool = poisson
+        self.requests = None
+        if request_rate and not poisson:
+            # Start with a single token, so a phase doesn't open with a burst
+            self.requests = TokenBucket(
+                request_rate, max(1.0, request_rate * burst_seconds), tokens=1.0
+            )
+        self.bytes = None
+        if throughput_mbps:
+            rate = throughput_mbps * 1_000_000 / 8
+            self.bytes = TokenBucket(rate, rate * burst_seconds)
+
+    def run(
+        self,
+        next_job,
+        size_of,
+        byte_budget: int = 0,
+        time_budget: float = 0.0,
+        on_result=None,
+    ) -> dict:
+        """
+        Call `next_job()` for each request to make; it returns a `(name,
+        job)` pair, or None when there is nothing left. `job()` runs on a
+        worker, and `on_result(name, result)` is called in completion
+        order. Returns totals: requests, bytes and elapsed seconds.
+        """
+        started = time.monotonic()
+        deadline = started + time_budget if time_budget else None
+        next_arrival = started
+        transferred = 0
+        requests = 0
+        in_flight = {}  # future -> name
+        exhausted = False
+
+        def budget_left() -> bool:
+            if byte_budget and transferred >= byte_budget:
+                return False
+            return deadline is None or time.monotonic() < deadline
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while in_flight or (not exhausted and budget_left()):
+                delay = None  # Until the next dispatch is allowed
+                if (
+                    not exhausted
+                    and budget_left()
+                    and len(in_flight) < self.concurrency
+                ):
+                    delay = self._dispatch_delay(next_arrival)
+                    if delay == 0:
+                        job = next_job()
+                        if job is None:
+                            exhausted = True
+                        else:
+                            name, run = job
+                            in_flight[executor.submit(run)] = name
+                            requests += 1
+                            if self.requests:
+                                self.requests.take(1)
+                            if self.poisson and self.request_rate:
+                                next_arrival = max(next_arrival, time.monotonic())
+                                next_arrival += self.rng.expovariate(self.request_rate)
+                            continue
+
+                if not in_flight:
+                    if delay:
+                        time.sleep(self._cap_to_deadline(delay, deadline))
+                    continue
+
+                timeout = self._cap_to_deadline(delay, deadline) if delay else None
+                finished, _ = wait(list(in_flight), timeout, FIRST_COMPLETED)
+                for future in finished:
+                    name = in_flight.pop(future)
+                    result = future.result()
+                    size = size_of(result) or 0
+                    transferred += size
+                    if self.bytes:
+                        self.bytes.take(size)
+                    if on_result:
+                        on_result(name, result)
+
+        return {
+            "requests": requests,
+            "bytes": transferred,
+            "elapsed": time.monotonic() - started,
+        }
+
+    def _dispatch_delay(self, next_arrival: float) -> float:
+        delays = [max(0.0, next_arrival - time.monotonic())]
+        if self.requests:
+            delays.append(self.requests.wait_time(1))
+        if self.bytes:
+            delays.append(self.bytes.wait_time(0))
+        return max(delays)
+
+    @staticmethod
+    def _cap_to_deadline(delay: float, deadline: float) -> float:
+        if deadline is None:
+            return delay
+        return max(0.0, min(delay, deadline - time.monotonic()))
@@ -0,0 +1,118 @@
+# Imports #
+import socket
+import struct
+import time
+
+# Constants #
+SOCKS_VERSION = 5
+NO_AUTH = 0
+CMD_CONNECT = 1
+ATYP_IPV4 = 1
+ATYP_DOMAIN = 3
+ATYP_IPV6 = 4
+REPLY_MESSAGES = {
+    1: "general SOCKS server failure",
+    2: "connection not allowed by ruleset",
+    3: "network unreachable",
+    4: "host unreachable",
+    5: "connection refused",
+    6: "TTL expired",
+    7: "command not supported",
+    8: "address type not supported",
+}
+
+
+# Classes #
+class ProxyNotReady(Exception):
+    """The SOCKS5 proxy did not accept (or pass) traffic before the deadline."""
+
+
+# Functions #
+def parse_target(target: str) -> tuple:
+    """Split "host:port" (or "[v6]:port") into (host, port)."""
+    host, _, port = target.rpartition(":")
+    return host.strip("[]"), int(port)
+
+
+def _recv_exact(sock: socket.socket, length: int) -> bytes:
+    data = b""
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by the proxy")
+        data += chunk
+    return data
+
+
+def probe_socks5(host: str, port: int, timeout: float, target: str = None) -> None:
+    """
+    Greet the SOCKS5 proxy at host:port without authentication, and, if a
+    `target` ("host:port") is given, CONNECT to it through the proxy.
+    Raises OSError (or ConnectionError) when any step fails.
+    """
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(bytes([SOCKS_VERSION, 1, NO_AUTH]))
+        version, method = _recv_exact(sock, 2)
+        if version != SOCKS_VERSION or method != NO_AUTH:
+            raise ConnectionError(
+                f"Unexpected SOCKS5 greeting reply: {version} {method}"
+            )
+        if not target:
+            return
+
+        # The proxy resolves the name, like curl's socks5h://
+        target_host, target_port = parse_target(target)
+        name = target_host.encode("idna")
+        sock.sendall(
+            bytes([SOCKS_VERSION, CMD_CONNECT, 0, ATYP_DOMAIN, len(name)])
+            + name
+            + struct.pack("!H", target_port)
+        )
+        version, reply, _, address_type = _recv_exact(sock, 4)
+        if reply != 0:
+            message = REPLY_MESSAGES.get(reply, f"reply code {reply}")
+            raise ConnectionError(f"CONNECT {target} failed: {message}")
+        if address_type == ATYP_IPV4:
+            _recv_exact(sock, 4 + 2)
+        elif address_type == ATYP_IPV6:
+            _recv_exact(sock, 16 + 2)
+        elif address_type == ATYP_DOMAIN:
+            _recv_exact(sock, _recv_exact(sock, 1)[0] + 2)
+
+
+def wait_for_socks5(
+    host: str,
+    port: int,
+    deadline: float = 30.0,
+    target: str = None,
+    is_alive=None,
+    initial_delay: float = 0.05,
+    max_delay: float = 1.0,
+) -> float:
+    """
+    Probe the proxy until it works, waiting `initial_delay` seconds after
+    the first failure and twice as long after each further one (up to
+    `max_delay`). Returns the seconds it took to become ready.
+
+    Raises ProxyNotReady once `deadline` seconds have passed, or as soon
+    as `is_alive()` (e.g. a check that the proxy process still runs)
+    returns False.
+    """
+    started = time.monotonic()
+    delay = initial_delay
+    last_error = None
+    while True:
+        if is_alive is not None and not is_alive():
+            raise ProxyNotReady(f"The proxy process exited (last error: {last_error})")
+        remaining = deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            raise ProxyNotReady(
+                f"Not ready after {deadline}s (last error: {last_error})"
+            )
+        try:
+            probe_socks5(host, port, timeout=min(remaining, 5.0), target=target)
+            return time.monotonic() - started
+        except OSError as error:
+            last_error = error
+        time.sleep(min(delay, max(0.0, deadline - (time.monotonic() - started))))
+        delay = min(delay * 2, max_delay)
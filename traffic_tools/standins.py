@@ -0,0 +1,451 @@
+"""
+Local stand-ins for the remote services the scripts talk to, so their
+helpers can be exercised offline.
+
+`python -m traffic_tools.standins tcpdump|masque-plus ...` runs a fake
+of the binary (see `main()`), for putting in front of the real ones on
+PATH.
+"""
+
+# Imports #
+import argparse
+import http.server
+import json
+import os
+import random
+import signal
+import socket
+import ssl
+import struct
+import subprocess
+import threading
+import time
+
+from .endpoints import build_version_negotiation
+from .payloads import iter_payload
+from .socks import (
+    ATYP_DOMAIN,
+    ATYP_IPV4,
+    ATYP_IPV6,
+    CMD_CONNECT,
+    NO_AUTH,
+    SOCKS_VERSION,
+    _recv_exact,
+    parse_target,
+)
+
+# Constants #
+PCAP_HEADER = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)  # Ethernet
+RELAY_CHUNK = 64 * 1024
+
+
+# Classes #
+class QuicStandIn:
+    """
+    A UDP responder on 127.0.0.1 answering every QUIC probe with a Version
+    Negotiation packet after `delay` seconds (a simulated RTT). With
+    `silent`, it never answers, like a filtered endpoint.
+
+        with QuicStandIn(delay=0.02) as standin:
+            probe_endpoint(standin.endpoint)
+    """
+
+    def __init__(
+        self, delay: float = 0.0, silent: bool = False, host: str = "127.0.0.1"
+    ) -> None:
+        self.delay: float = delay
+        self.silent: bool = silent
+        self.probes: int = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, 0))
+        self._sock.settimeout(0.1)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._sock.getsockname()
+        return f"{host}:{port}"
+
+    def close(self) -> None:
+        self._closed.set()
+        self._thread.join()
+        self._sock.close()
+
+    def __enter__(self) -> "QuicStandIn":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _serve(self) -> None:
+        while not self._closed.is_set():
+            try:
+                packet, address = self._sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            self.probes += 1
+            if self.silent or len(packet) < 7 or not packet[0] & 0x80:
+                continue
+            if self.delay:
+                time.sleep(self.delay)
+            self._sock.sendto(build_version_negotiation(packet), address)
+
+
+class _HttpHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so batch downloads reuse connections
+    server_version = "StandIn/1.0"
+
+    def setup(self) -> None:
+        if isinstance(self.request, ssl.SSLSocket):
+            self.request.do_handshake()  # In this thread, not in the accept loop
+        super().setup()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        standin = self.server.standin
+        page = standin.pages.get(self.path.split("?")[0])
+        if page is not None:
+            body = page.encode("utf-8")
+            self._send(200, "text/html; charset=utf-8", len(body), [body])
+        elif "text/html" in self.headers.get("Accept", ""):
+            # Browsers get a page, padded with a comment
+            padding = os.urandom(standin.get_size() // 2).hex()
+            body = f"<html><body><!-- {padding} --></body></html>".encode("ascii")
+            self._send(200, "text/html; charset=utf-8", len(body), [body])
+        else:
+            size = standin.get_size()
+            self._send(200, "application/octet-stream", size, iter_payload(size))
+
+    def do_POST(self) -> None:
+        received = 0
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            # curl -T - streams stdin in chunks of unknown total size
+            while True:
+                length = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if length == 0:
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass  # Trailers
+                    break
+                received += len(self.rfile.read(length))
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get("Content-Length") or 0)
+            while remaining > 0:
+                chunk = self.rfile.read(min(RELAY_CHUNK, remaining))
+                if not chunk:
+                    break
+                received += len(chunk)
+                remaining -= len(chunk)
+        self.server.standin.count(received=received)
+        body = json.dumps({"received": received}).encode("ascii")
+        self._send(200, "application/json", len(body), [body])
+
+    do_PUT = do_POST
+
+    def _send(self, code: int, content_type: str, length: int, chunks) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(chunk)
+        self.server.standin.count(sent=length)
+
+
+class _HttpServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        self.standin.count(errors=1)  # Clients hanging up mid-transfer
+
+
+class HttpStandIn:
+    """
+    An HTTP server on 127.0.0.1 in a background thread. GET answers with a
+    random body of `min_size` to `max_size` bytes (an HTML page for
+    browsers, or one of `pages`, a {path: html} dict); POST and PUT take
+    uploads, plain or chunked, and discard them. With `certfile` (and
+    `keyfile`) it speaks HTTPS, see `make_certificate()`.
+
+    `requests`, `bytes_sent` and `bytes_received` count the traffic served.
+    Body sizes are drawn from their own RNG (`seed`), so serving doesn't
+    change what a seeded workload draws next.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 10 * 1024,
+        max_size: int = 500 * 1024,
+        certfile: str = None,
+        keyfile: str = None,
+        pages: dict = None,
+        host: str = "127.0.0.1",
+        seed: int = None,
+    ) -> None:
+        self.min_size: int = min_size
+        self.max_size: int = max_size
+        self.pages: dict = pages or {}
+        self.requests: int = 0
+        self.bytes_sent: int = 0
+        self.bytes_received: int = 0
+        self.errors: int = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _HttpServer((host, 0), _HttpHandler)
+        self._server.standin = self
+        self.scheme: str = "http"
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            context.set_alpn_protocols(["http/1.1"])
+            self._server.socket = context.wrap_socket(
+                self._server.socket, server_side=True, do_handshake_on_connect=False
+            )
+            self.scheme = "https"
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.1},
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        return f"{self.scheme}://{self.address}"
+
+    def get_size(self) -> int:
+        with self._lock:
+            return self._rng.randint(self.min_size, self.max_size)
+
+    def count(self, sent: int = 0, received: int = 0, errors: int = 0) -> None:
+        with self._lock:
+            self.requests += 1 if sent else 0
+            self.bytes_sent += sent
+            self.bytes_received += received
+            self.errors += errors
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._thread.join()
+        self._server.server_close()
+
+    def __enter__(self) -> "HttpStandIn":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class Socks5StandIn:
+    """
+    A SOCKS5 proxy (no authentication, CONNECT only) on `host`:`port` in a
+    background thread. With `redirect` ((host, port)), every CONNECT goes
+    there whatever its target, so real hostnames reach a local stand-in.
+    `connections` and `bytes_relayed` count the traffic passed.
+    """
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 0, redirect: tuple = None
+    ) -> None:
+        self.redirect: tuple = redirect
+        self.connections: int = 0
+        self.bytes_relayed: int = 0
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(64)
+        self._sock.settimeout(0.1)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._sock.getsockname()
+        return f"{host}:{port}"
+
+    def close(self) -> None:
+        self._closed.set()
+        self._thread.join()
+        self._sock.close()
+
+    def __enter__(self) -> "Socks5StandIn":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _serve(self) -> None:
+        while not self._closed.is_set():
+            try:
+                client, address = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client: socket.socket) -> None:
+        with client:
+            try:
+                client.settimeout(10)
+                version, methods = _recv_exact(client, 2)
+                _recv_exact(client, methods)
+                client.sendall(bytes([SOCKS_VERSION, NO_AUTH]))
+                version, command, _, address_type = _recv_exact(client, 4)
+                if address_type == ATYP_IPV4:
+                    host = socket.inet_ntoa(_recv_exact(client, 4))
+                elif address_type == ATYP_IPV6:
+                    host = socket.inet_ntop(socket.AF_INET6, _recv_exact(client, 16))
+                elif address_type == ATYP_DOMAIN:
+                    host = _recv_exact(client, _recv_exact(client, 1)[0]).decode("idna")
+                else:
+                    self._reply(client, 8)  # Address type not supported
+                    return
+                port = struct.unpack("!H", _recv_exact(client, 2))[0]
+                if command != CMD_CONNECT:
+                    self._reply(client, 7)  # Command not supported
+                    return
+                try:
+                    upstream = socket.create_connection(
+                        self.redirect or (host, port), timeout=10
+                    )
+                except OSError:
+                    self._reply(client, 5)  # Connection refused
+                    return
+                with upstream:
+                    self._reply(client, 0)
+                    with self._lock:
+                        self.connections += 1
+                    client.settimeout(None)
+                    upstream.settimeout(None)
+                    other = threading.Thread(
+                        target=self._relay, args=(upstream, client), daemon=True
+                    )
+                    other.start()
+                    self._relay(client, upstream)
+                    other.join()
+            except (OSError, ValueError):
+                pass  # The client went away
+
+    def _relay(self, source: socket.socket, target: socket.socket) -> None:
+        try:
+            while True:
+                chunk = source.recv(RELAY_CHUNK)
+                if not chunk:
+                    break
+                target.sendall(chunk)
+                with self._lock:
+                    self.bytes_relayed += len(chunk)
+        except OSError:
+            pass
+        try:
+            target.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _reply(client: socket.socket, code: int) -> None:
+        client.sendall(bytes([SOCKS_VERSION, code, 0, ATYP_IPV4]) + bytes(6))
+
+
+# Functions #
+def make_certificate(directory: str, name: str = "localhost") -> tuple:
+    """A throwaway self-signed certificate (via openssl): (certfile, keyfile)."""
+    certfile = os.path.join(directory, f"{name}.crt")
+    keyfile = os.path.join(directory, f"{name}.key")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-days", "2", "-subj", f"/CN={name}",
+            "-keyout", keyfile, "-out", certfile,
+        ],  # fmt: skip
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return certfile, keyfile
+
+
+def _wait_for_signal() -> int:
+    """Block until SIGTERM or SIGINT, return the signal."""
+    received = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: received.append(signum))
+    while not received:
+        time.sleep(0.05)
+    return received[0]
+
+
+def run_tcpdump(record: str, argv: list) -> None:
+    """
+    Fake tcpdump: write an empty pcap to the `-w` path, wait for a signal,
+    then append the invocation (argv, pid, start and stop) to `record`.
+    """
+    entry = {"argv": argv, "pid": os.getpid(), "started": time.time()}
+    if "-w" in argv[:-1]:
+        with open(argv[argv.index("-w") + 1], "wb") as file:
+            file.write(PCAP_HEADER)
+    entry["signal"] = _wait_for_signal()
+    entry["stopped"] = time.time()
+    with open(record, "a") as file:
+        file.write(json.dumps(entry) + "\n")
+
+
+def run_masque_plus(
+    endpoint: str, bind: str, redirect: str = None, delay: float = 0.0
+) -> None:
+    """
+    Fake masque-plus: after `delay` seconds of "handshake", serve a SOCKS5
+    proxy on `bind` until a signal, logging like the real client.
+    """
+    print(f"Connecting to MASQUE endpoint {endpoint}", flush=True)
+    time.sleep(delay)
+    host, port = parse_target(bind)
+    with Socks5StandIn(host, port, parse_target(redirect) if redirect else None):
+        print(f"Connected to {endpoint}, tunnel established", flush=True)
+        print(f"SOCKS5 proxy listening on {bind}", flush=True)
+        _wait_for_signal()
+    print("Tunnel closed", flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Fake binaries backed by the stand-ins, for offline runs."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    tcpdump = commands.add_parser(
+        "tcpdump", help="write an empty pcap, record the invocation on exit"
+    )
+    tcpdump.add_argument("--record", required=True, help="JSONL file to append to")
+    tcpdump.add_argument("argv", nargs="*", help="tcpdump's own arguments, after --")
+    masque = commands.add_parser(
+        "masque-plus", help="serve a SOCKS5 proxy, log like masque-plus"
+    )
+    masque.add_argument("--endpoint", required=True)
+    masque.add_argument("--bind", default="127.0.0.1:1080")
+    masque.add_argument("--redirect", help="host:port every CONNECT goes to")
+    masque.add_argument(
+        "--delay", type=float, default=0.0, help="simulated handshake seconds"
+    )
+    args = parser.parse_args()
+    if args.command == "tcpdump":
+        run_tcpdump(args.record, args.argv)
+    else:
+        run_masque_plus(args.endpoint, args.bind, args.redirect, args.delay)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Imports #
+import contextlib
+import fcntl
+import json
+import os
+
+# Constants #
+LOCK_SUFFIX = ".lock"
+
+
+# Functions #
+def load_state(path: str) -> dict:
+    """The JSON object stored in `path`, or {} if it's missing or broken"""
+    try:
+        with open(path, "r") as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+@contextlib.contextmanager
+def lock_state(path: str):
+    """Hold an exclusive lock on the state file `path` (raises OSError)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + LOCK_SUFFIX, "a") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def update_state(path: str, merge, indent: int = None) -> dict:
+    """
+    Write `merge(data)` to `path`, where `data` is what the file holds
+    right now, and return it. The read and the write happen under one
+    lock, so loops sharing a state file never drop each other's updates.
+    """
+    with lock_state(path):
+        data = merge(load_state(path))
+        temp_path = f"{path}.tmp-{os.getpid()}"
+        with open(temp_path, "w") as file:
+            json.dump(data, file, indent=indent)
+        os.replace(temp_path, path)
+    return data
@@ -0,0 +1,287 @@
+# Imports #
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+
+# Constants #
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "traffic_tools")
+RUN_DIR = os.path.join(CACHE_DIR, "run")
+TERM_TIMEOUT = 5.0  # Seconds between SIGTERM and SIGKILL
+KILL_TIMEOUT = 2.0  # Seconds to wait for SIGKILL to take effect
+
+
+# Functions #
+def _get_started(pid: int) -> float:
+    """The create time of a process, or None if it does not exist."""
+    try:
+        return psutil.Process(pid).create_time()
+    except psutil.Error:
+        return None
+
+
+def _find(pid: int, started: float) -> psutil.Process:
+    """The process `pid`, unless it exited and the PID was reused since."""
+    try:
+        process = psutil.Process(pid)
+        if started is None or abs(process.create_time() - started) < 0.01:
+            return process
+    except psutil.Error:
+        pass
+    return None
+
+
+def _running(processes) -> list:
+    """The processes that still run (zombies only wait for their parent)."""
+    running = []
+    for process in processes:
+        try:
+            if process.status() != psutil.STATUS_ZOMBIE:
+                running.append(process)
+        except psutil.Error:
+            continue
+    return running
+
+
+def _wait(processes: list, timeout: float) -> list:
+    """Wait up to `timeout` seconds for processes to end, reaping our own."""
+    deadline = time.monotonic() + timeout
+    while True:
+        _, alive = psutil.wait_procs(processes, timeout=0.05)
+        processes = _running(alive)
+        if not processes or time.monotonic() >= deadline:
+            return processes
+
+
+# Main class #
+class ProcessSupervisor:
+    """
+    Owns the child processes a script starts, so cleanup only ever touches
+    those instead of every tcpdump or masque-plus on the host.
+
+    `popen()` starts a child in its own process group, `adopt()` takes over
+    a process started elsewhere (e.g. geckodriver, with its Firefox tree).
+    Each child is listed with its process group, start time and known
+    descendants in a pidfile under RUN_DIR named after the script's PID.
+    `stop()` sends SIGTERM to the whole tree, SIGKILL to whatever is left
+    after `term_timeout` seconds, and reaps it. `cleanup_stale()` does the
+    same for the children of scripts that died without cleaning up.
+
+    Children started through sudo (`cmd[0] == "sudo"`) run as root: sudo
+    relays SIGTERM to them, and anything that can't be signaled directly
+    is killed with `sudo -n kill`.
+    """
+
+    def __init__(
+        self, name: str, run_dir: str = RUN_DIR, term_timeout: float = TERM_TIMEOUT
+    ) -> None:
+        self.name: str = name
+        self.run_dir: str = run_dir
+        self.term_timeout: float = term_timeout
+        self.pidfile: str = os.path.join(run_dir, f"{os.getpid()}.json")
+        self._started: float = _get_started(os.getpid())
+        self._children: dict = {}  # pid -> entry
+        self._popens: dict = {}  # pid -> Popen, polled to reap them
+        self._lock = threading.RLock()
+
+    def popen(self, name: str, cmd: list, **kwargs) -> subprocess.Popen:
+        """subprocess.Popen in a new process group, tracked until stopped."""
+        kwargs.setdefault("start_new_session", True)
+        proc = subprocess.Popen(cmd, **kwargs)
+        with self._lock:
+            self._popens[proc.pid] = proc
+            self._register(name, proc.pid, sudo=cmd[0] == "sudo")
+        return proc
+
+    def adopt(self, name: str, pid: int, sudo: bool = False) -> None:
+        """Track a process started elsewhere, together with its descendants."""
+        with self._lock:
+            self._register(name, pid, sudo)
+
+    def stop(self, proc, timeout: float = None) -> None:
+        """
+        Stop a tracked child (a Popen or a PID) and everything it started:
+        SIGTERM, then SIGKILL after `timeout` (default `term_timeout`).
+        """
+        pid = proc if isinstance(proc, int) else proc.pid
+        with self._lock:
+            entry = self._children.get(pid)
+            if entry is None:
+                entry = {"name": "?", "pid": pid, "pgid": None, "sudo": False}
+                entry.update(started=_get_started(pid), tree=[])
+            self._terminate(entry, self.term_timeout if timeout is None else timeout)
+            self._children.pop(pid, None)
+            popen = self._popens.pop(pid, None)
+            if popen is not None:
+                popen.poll()
+            self._save()
+
+    def stop_all(self, timeout: float = None) -> None:
+        with self._lock:
+            for pid in list(self._children):
+                self.stop(pid, timeout)
+
+    def reap(self) -> None:
+        """Forget children that exited (reaping them) and refresh the trees."""
+        with self._lock:
+            for pid, entry in list(self._children.items()):
+                popen = self._popens.get(pid)
+                running = popen is not None and popen.poll() is None
+                if not running and not self._get_processes(entry):
+                    del self._children[pid]
+                    self._popens.pop(pid, None)
+                    continue
+                entry["tree"] = self._get_tree(entry)
+            self._save()
+
+    def cleanup_stale(self, timeout: float = None) -> int:
+        """
+        Stop the children left behind by scripts that are no longer running.
+        Returns the number of stale pidfiles cleaned up.
+        """
+        timeout = self.term_timeout if timeout is None else timeout
+        try:
+            names = os.listdir(self.run_dir)
+        except OSError:
+            return 0
+        cleaned = 0
+        for name in names:
+            path = os.path.join(self.run_dir, name)
+            if not name.endswith(".json") or path == self.pidfile:
+                continue
+            try:
+                with open(path, "r") as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            if _find(data.get("owner", 0), data.get("started")) is not None:
+                continue  # Another loop on this host, still running
+            for entry in data.get("children", []):
+                print(
+                    f"  -> Stopping {entry['name']} (PID {entry['pid']}) "
+                    f"left over by {data.get('script', '?')}"
+                )
+                self._terminate(entry, timeout)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            cleaned += 1
+        return cleaned
+
+    def close(self) -> None:
+        """Stop every child and remove the pidfile."""
+        with self._lock:
+            self.stop_all()
+            try:
+                os.remove(self.pidfile)
+            except OSError:
+                pass
+
+    def __enter__(self) -> "ProcessSupervisor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _register(self, name: str, pid: int, sudo: bool) -> None:
+        try:
+            pgid = os.getpgid(pid)
+        except OSError:
+            pgid = None
+        entry = {"name": name, "pid": pid, "pgid": pgid, "sudo": sudo}
+        entry.update(started=_get_started(pid), tree=[])
+        entry["tree"] = self._get_tree(entry)
+        self._children[pid] = entry
+        self._save()
+
+    def _get_tree(self, entry: dict) -> list:
+        """[pid, create time] of the descendants, known before and now."""
+        tree = {
+            pid: started
+            for pid, started in entry.get("tree", [])
+            if _find(pid, started) is not None
+        }
+        root = _find(entry["pid"], entry.get("started"))
+        if root is not None:
+            try:
+                for child in root.children(recursive=True):
+                    tree[child.pid] = child.create_time()
+            except psutil.Error:
+                pass
+        return [[pid, started] for pid, started in tree.items()]
+
+    def _get_processes(self, entry: dict) -> list:
+        """The processes of an entry that are still running."""
+        processes = {}
+        known = [[entry["pid"], entry.get("started")]] + self._get_tree(entry)
+        for pid, started in known:
+            process = _find(pid, started)
+            if process is not None:
+                processes[process.pid] = process
+        # Members of the child's own group whose parent already exited,
+        # unless the group ID was reused by a new leader since
+        pgid = entry.get("pgid")
+        leader = _get_started(pgid) if pgid else None
+        if pgid == entry["pid"] and leader in (None, entry.get("started")):
+            for process in psutil.process_iter():
+                try:
+                    if os.getpgid(process.pid) == pgid:
+                        processes.setdefault(process.pid, process)
+                except OSError:
+                    continue
+        return _running(processes.values())
+
+    def _terminate(self, entry: dict, timeout: float) -> None:
+        processes = self._get_processes(entry)
+        if not processes:
+            return
+        self._signal(processes, signal.SIGTERM, entry.get("sudo"))
+        alive = _wait(processes, timeout)
+        if alive:
+            self._signal(alive, signal.SIGKILL, entry.get("sudo"))
+            alive = _wait(alive, KILL_TIMEOUT)
+        for process in alive:
+            print(f"  -> Could not stop {entry['name']} process {process.pid}")
+
+    @staticmethod
+    def _signal(processes: list, sig: int, sudo: bool) -> None:
+        denied = []
+        for process in processes:
+            try:
+                process.send_signal(sig)
+            except psutil.AccessDenied:
+                denied.append(str(process.pid))
+            except psutil.Error:
+                continue
+        if denied and sudo:
+            subprocess.run(
+                ["sudo", "-n", "kill", f"-{int(sig)}", *denied],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+
+    def _save(self) -> None:
+        data = json.dumps(
+            {
+                "owner": os.getpid(),
+                "started": self._started,
+                "script": self.name,
+                "argv": sys.argv,
+                "children": list(self._children.values()),
+            },
+            indent=2,
+        )
+        try:
+            os.makedirs(self.run_dir, exist_ok=True)
+            temp_path = f"{self.pidfile}.tmp"
+            with open(temp_path, "w") as file:
+                file.write(data)
+            os.replace(temp_path, self.pidfile)
+        except OSError:
+            pass  # Only the cleanup after a crash needs it
@@ -0,0 +1,137 @@
+# Imports #
+import collections
+import os
+import threading
+
+from .downloads import get_host
+from .metrics import percentile
+from .state import load_state, update_state
+
+# Constants #
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "traffic_tools")
+
+
+# Functions #
+def get_timeouts_path(name: str) -> str:
+    return os.path.join(CACHE_DIR, f"latency_{name}.json")
+
+
+# Main class #
+class AdaptiveTimeouts:
+    """
+    Per-request curl timeouts derived from the latencies seen so far.
+
+    The last `window` successful transfers are kept per target host and
+    kind of request (e.g. "website", "upload"). Once there are
+    `min_samples` of them, `--max-time` becomes their `percent`-th
+    percentile total time times `margin`, and `--connect-timeout` the
+    same for the connect time, both clamped to [`floor`, `ceiling`]
+    (4 times the static value by default). Until then, the static
+    `default_max_time` and `default_connect` apply.
+
+    The samples are persisted in a JSON file that the loops of one mode
+    share: `save()` adds this loop's new samples to it and takes over the
+    ones other loops added.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        default_max_time: float,
+        default_connect: float = None,
+        percent: float = 99,
+        margin: float = 2.0,
+        min_samples: int = 20,
+        window: int = 200,
+        floor: float = 2.0,
+        ceiling: float = None,
+    ) -> None:
+        self.path: str = path
+        self.default_max_time: float = default_max_time
+        self.default_connect: float = default_connect
+        self.percent: float = percent
+        self.margin: float = margin
+        self.min_samples: int = min_samples
+        self.window: int = window
+        self.floor: float = floor
+        self.ceiling: float = ceiling
+        self._lock = threading.Lock()
+        self._samples: dict = self._load()
+        self._new: dict = {}  # Samples to add on the next save(), by key
+
+    def get(self, url: str, kind: str, default_max_time: float = None) -> tuple:
+        """
+        Return `(max_time, connect_timeout)` for a request (a None connect
+        timeout leaves curl's default). `default_max_time` replaces the
+        static max time for this kind of request, e.g. for uploads.
+        """
+        default_max_time = default_max_time or self.default_max_time
+        with self._lock:
+            samples = list(self._samples.get(self._key(url, kind), ()))
+        if len(samples) < self.min_samples:
+            return default_max_time, self.default_connect
+
+        ceiling = self.ceiling or default_max_time * 4
+        total = percentile([total for total, _ in samples], self.percent)
+        connect = percentile([connect for _, connect in samples], self.percent)
+        max_time = min(ceiling, max(self.floor, total * self.margin))
+        connect_timeout = min(max_time, max(self.floor, connect * self.margin))
+        return round(max_time, 1), round(connect_timeout, 1)
+
+    def get_options(self, url: str, kind: str, default_max_time: float = None) -> list:
+        """The curl command line options for `get()`."""
+        max_time, connect_timeout = self.get(url, kind, default_max_time)
+        options = ["--max-time", str(max_time)]
+        if connect_timeout:
+            options += ["--connect-timeout", str(connect_timeout)]
+        return options
+
+    def record(self, url: str, kind: str, report: dict) -> None:
+        """Add a finished transfer's write-out report to its histogram."""
+        if not report or report.get("exitcode") != 0:
+            return
+        total = report.get("time_total")
+        # Through a SOCKS proxy, time_connect only covers the local proxy
+        connect = max(
+            report.get("time_connect") or 0, report.get("time_appconnect") or 0
+        )
+        if total is None:
+            return
+        key = self._key(url, kind)
+        with self._lock:
+            samples = self._samples.setdefault(
+                key, collections.deque(maxlen=self.window)
+            )
+            samples.append((total, connect))
+            self._new.setdefault(key, []).append((total, connect))
+
+    def save(self) -> None:
+        """Add the new samples to the file, under its lock"""
+        with self._lock:
+
+            def merge(data: dict) -> dict:
+                for key, samples in self._new.items():
+                    data[key] = (data.get(key, []) + samples)[-self.window :]
+                return data
+
+            try:
+                data = update_state(self.path, merge)
+            except OSError:
+                return  # Only costs a few cycles with the static timeouts
+            self._samples = self._to_deques(data)
+            self._new.clear()
+
+    @staticmethod
+    def _key(url: str, kind: str) -> str:
+        return f"{kind}:{get_host(url) or url}"
+
+    def _load(self) -> dict:
+        return self._to_deques(load_state(self.path))
+
+    def _to_deques(self, data: dict) -> dict:
+        return {
+            key: collections.deque(
+                (tuple(sample) for sample in samples), maxlen=self.window
+            )
+            for key, samples in data.items()
+        }
@@ -0,0 +1,173 @@
+# Imports #
+import abc
+import json
+import os
+import subprocess
+
+from .proxy_log import EVENT_PATTERNS
+from .socks import parse_target, wait_for_socks5
+
+# Constants #
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "traffic_tools")
+DEFAULT_BIND = ("127.0.0.1", 1080)
+
+
+# Classes #
+class TunnelBackend(abc.ABC):
+    """
+    One MASQUE client binary, exposing a SOCKS5 proxy on `host`:`port`.
+
+    Subclasses build the command line (`command()`) and may add a one-time
+    setup (`prepare()`) and their own log `patterns` for `ProxyLog`. The
+    process is started and stopped through `supervisor` (a
+    `ProcessSupervisor`) when given, with plain Popen otherwise. It is
+    ready once the SOCKS5 port passes traffic to `target`.
+    """
+
+    name: str = None
+    patterns: tuple = EVENT_PATTERNS
+    stop_timeout: float = 3.0  # Seconds between SIGTERM and SIGKILL
+
+    def __init__(
+        self,
+        binary: str = None,
+        host: str = DEFAULT_BIND[0],
+        port: int = DEFAULT_BIND[1],
+        supervisor=None,
+        extra_args: list = (),
+    ) -> None:
+        self.binary: str = binary or f"./{self.name}"
+        self.host: str = host
+        self.port: int = port
+        self.supervisor = supervisor
+        self.extra_args: list = list(extra_args)
+
+    @abc.abstractmethod
+    def command(self, endpoint: str) -> list:
+        """The command line connecting to `endpoint`."""
+
+    def prepare(self) -> None:
+        """One-time setup before the first start."""
+
+    def start(self, endpoint: str) -> subprocess.Popen:
+        """Start the client on `endpoint` with its output on text pipes."""
+        cmd = self.command(endpoint) + self.extra_args
+        # Replace invalid UTF-8 rather than fail the reader threads on it
+        kwargs = dict(
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace"
+        )
+        if self.supervisor is not None:
+            return self.supervisor.popen(self.name, cmd, **kwargs)
+        return subprocess.Popen(cmd, start_new_session=True, **kwargs)
+
+    def wait_ready(self, proc, deadline: float, target: str = None) -> float:
+        """Seconds until the proxy passed traffic; raises ProxyNotReady."""
+        return wait_for_socks5(
+            self.host,
+            self.port,
+            deadline=deadline,
+            target=target,
+            is_alive=lambda: proc.poll() is None,
+        )
+
+    def stop(self, proc) -> None:
+        if self.supervisor is not None:
+            self.supervisor.stop(proc, timeout=self.stop_timeout)
+            return
+        proc.terminate()
+        try:
+            proc.wait(timeout=self.stop_timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+class MasquePlusBackend(TunnelBackend):
+    """masque-plus: registers on its own and connects to `--endpoint`."""
+
+    name = "masque-plus"
+
+    def command(self, endpoint: str) -> list:
+        cmd = [self.binary, "--endpoint", endpoint]
+        if (self.host, self.port) != DEFAULT_BIND:
+            cmd += ["--bind", f"{self.host}:{self.port}"]
+        return cmd
+
+
+class UsqueBackend(TunnelBackend):
+    """
+    usque: `usque register` writes a config.json once, then `usque socks`
+    serves the proxy. The endpoint address is taken from the config, so a
+    copy of it with the chosen endpoint is written per endpoint.
+    """
+
+    name = "usque"
+    patterns = (
+        ("register", r"regist|enroll"),
+        ("tunnel_up", r"connected to masque|established|tunnel (is )?up"),
+        ("listening", r"listening|serving"),
+        ("reconnect", r"reconnect|retrying|connection lost|tunnel.*(closed|down)"),
+        ("error", r"\berror\b|fail|panic|fatal"),
+    )
+
+    def __init__(self, *args, config: str = "config.json", **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.config: str = config
+
+    def prepare(self) -> None:
+        if os.path.exists(self.config):
+            return
+        print(f"  -> Registering a new usque device ({self.config})...")
+        subprocess.run(
+            [self.binary, "register", "--config", self.config],
+            input="y\n",  # Accept the terms of service prompt
+            text=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=60,
+        )
+
+    def command(self, endpoint: str) -> list:
+        host, port = parse_target(endpoint)
+        return [
+            self.binary,
+            "socks",
+            "--config",
+            self._get_config(host),
+            "--bind",
+            self.host,
+            "--port",
+            str(self.port),
+            "--connect-port",
+            str(port),
+        ]
+
+    def _get_config(self, endpoint_host: str) -> str:
+        """A copy of the config pointing at `endpoint_host`."""
+        try:
+            with open(self.config, "r") as file:
+                config = json.load(file)
+        except (OSError, ValueError):
+            return self.config  # Let usque report it
+        key = "endpoint_v6" if ":" in endpoint_host else "endpoint_v4"
+        if config.get(key) == endpoint_host:
+            return self.config
+        config[key] = endpoint_host
+        path = os.path.join(CACHE_DIR, f"usque_{endpoint_host.replace(':', '_')}.json")
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Only readable by us, it holds the device's private key
+        with open(
+            os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w"
+        ) as file:
+            json.dump(config, file, indent=2)
+        return path
+
+
+# Functions #
+BACKENDS = {backend.name: backend for backend in (MasquePlusBackend, UsqueBackend)}
+
+
+def get_backend(name: str, **kwargs) -> TunnelBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown tunnel backend: {name} ({', '.join(BACKENDS)})")
+    return BACKENDS[name](**kwargs)
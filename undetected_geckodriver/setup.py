@@ -43,7 +43,6 @@ setup(
         "Topic :: Software Development :: Testing",
         "Topic :: Software Development :: Libraries :: Python Modules",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
@@ -64,6 +63,6 @@ setup(
         "web scraping automated testing bot development anti-detection "
         "automation browser automation"
     ),
-    python_requires=">=3.6",
+    python_requires=">=3.7",
     license="MIT",
 )
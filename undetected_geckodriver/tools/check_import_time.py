@@ -0,0 +1,75 @@
+"""
+Import-time budget check for undetected_geckodriver.
+
+Imports the package in fresh interpreters with `python -X importtime` and
+fails if importing it takes longer than the budget, or if it eagerly
+pulls in modules that are only needed once a browser is started.
+
+    python tools/check_import_time.py --budget-ms 15
+"""
+
+# Imports #
+import argparse
+import subprocess
+import sys
+
+# Constants #
+PACKAGE = "undetected_geckodriver"
+EAGER_MODULES_FORBIDDEN = ("selenium", "psutil", "importlib.metadata")
+DEFAULT_BUDGET_MS = 15.0
+DEFAULT_RUNS = 5
+
+
+# Functions #
+def measure_import(package: str) -> tuple:
+    """Return the cumulative import time (ms) and the imported modules."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {package}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative_us = None
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        name = name.strip()
+        modules.add(name)
+        if name == package:
+            cumulative_us = int(cumulative)
+    if cumulative_us is None:
+        raise RuntimeError(f"{package} was not imported")
+    return cumulative_us / 1000, modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    args = parser.parse_args()
+
+    # The best of several runs filters out noise from a busy machine
+    timings = []
+    modules = set()
+    for _ in range(args.runs):
+        timing, modules = measure_import(PACKAGE)
+        timings.append(timing)
+    best = min(timings)
+
+    failures = []
+    if best > args.budget_ms:
+        failures.append(f"import took {best:.1f}ms, budget is {args.budget_ms:.1f}ms")
+    for module in EAGER_MODULES_FORBIDDEN:
+        if module in modules:
+            failures.append(f"{module} is imported eagerly")
+
+    print(f"import {PACKAGE}: best {best:.1f}ms of {args.runs} runs")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
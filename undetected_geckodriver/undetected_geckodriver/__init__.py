@@ -10,9 +10,36 @@
 """
 
 # Imports #
-import importlib.metadata
-
-from .driver import Firefox
+import importlib
 
 # Constants #
-__version__ = importlib.metadata.version("undetected-geckodriver")
+# Public names and the submodule they live in. They are imported on first
+# access (PEP 562), so helper processes that only need e.g. the patcher
+# don't pay for Selenium and psutil.
+_LAZY_ATTRIBUTES = {
+    "Firefox": ".driver",
+    "FirefoxPool": ".pool",
+    "PatchSet": ".patcher",
+}
+
+__all__ = ["Firefox", "FirefoxPool", "PatchSet", "__version__"]
+
+
+# Functions #
+def __getattr__(name: str):
+    if name == "__version__":
+        from importlib import metadata
+
+        value = metadata.version("undetected-geckodriver")
+    elif name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        value = getattr(module, name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,394 @@
+# Imports #
+import configparser
+import contextlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from .clone import clone_firefox_tree
+from .locking import Lease, file_lock, is_leased, is_process_alive
+from .patcher import get_file_fingerprint, hash_file
+from .resolution import LOCK_SUFFIX as RESOLUTION_LOCK_SUFFIX
+from .resolution import RESOLUTION_FILE
+
+# Constants #
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1  # Older releases kept one unversioned copy in the cache root
+BUILDS_DIR = "builds"
+CURRENT_LINK = "current"
+INSTANCES_DIR = "instances"
+LOCK_FILE = ".lock"
+LEASE_SUFFIX = ".lease"
+ORIGIN_FILE = ".origin"
+OWNER_FILE = ".owner"
+ISOLATION_MODES = ("shared", "worker", "instance")
+
+
+# Functions #
+def read_firefox_version(firefox_path: str) -> str:
+    """Read the Firefox version from application.ini, or "unknown"."""
+    parser = configparser.ConfigParser()
+    try:
+        parser.read(os.path.join(firefox_path, "application.ini"))
+        return parser.get("App", "Version")
+    except (configparser.Error, OSError):
+        return "unknown"
+
+
+def get_disk_usage(*paths: str) -> int:
+    """
+    Return the bytes the given directories exclusively own, counting every
+    file once. Files that are still hardlinked elsewhere (e.g. to the
+    system installation) are not counted.
+    """
+    links = {}  # (device, inode) -> [links seen, total links, bytes]
+    for path in paths:
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    stat = os.lstat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entry = links.setdefault(
+                    (stat.st_dev, stat.st_ino),
+                    [0, stat.st_nlink, stat.st_blocks * 512],
+                )
+                entry[0] += 1
+    return sum(size for seen, nlink, size in links.values() if seen >= nlink)
+
+
+# Main class #
+class PatchedFirefoxCache:
+    """
+    A cache of patched Firefox builds, keyed by the Firefox version and the
+    hash of the original libxul. Several builds are kept side by side, so
+    browsers that are already running keep their files when the system
+    installation is upgraded. Least recently used builds are evicted once
+    the cache grows beyond `size_limit` bytes.
+
+    A broken build that is still in use is replaced by a successor build
+    under a new key, which the index maps the original key to. The broken
+    one is retired: removed as soon as no browser uses it anymore.
+    """
+
+    def __init__(self, path: str, xul: str, size_limit: int) -> None:
+        self.path: str = path
+        self.xul: str = xul
+        self.size_limit: int = size_limit
+        self._builds_path: str = os.path.join(path, BUILDS_DIR)
+        self._index_path: str = os.path.join(path, INDEX_FILE)
+        self._instances_path: str = os.path.join(path, INSTANCES_DIR)
+        self._lock_path: str = os.path.join(path, LOCK_FILE)
+
+    def acquire(
+        self, firefox_path: str, build, validate=None, variant: str = ""
+    ) -> tuple:
+        """
+        Return the directory of the patched build for `firefox_path`,
+        together with a shared Lease that keeps it from being evicted.
+        `variant` tells apart builds patched differently from one source.
+
+        A missing (or, per `validate`, broken) build is created by calling
+        `build(path)` on a temporary directory, which is then renamed into
+        place, so a build is never visible half-finished. Everything runs
+        under an exclusive lock, so concurrent processes build only once.
+        """
+        os.makedirs(self._builds_path, exist_ok=True)
+        with file_lock(self._lock_path):
+            index = self._load_index()
+            if index.get("version", 0) < INDEX_VERSION:
+                self._remove_legacy_layout(firefox_path)
+                index["version"] = INDEX_VERSION
+
+            self._remove_retired(index)
+            base_key = self.get_build_key(firefox_path, index, variant)
+            key = self._get_successor(index, base_key)
+            build_path = os.path.join(self._builds_path, key)
+            if os.path.isdir(build_path) and validate and not validate(build_path):
+                if is_leased(build_path + LEASE_SUFFIX):
+                    # Never touch files of a running browser: build a successor
+                    # that later calls reuse, and retire this one
+                    index["builds"].setdefault(key, {})["retired"] = True
+                    key = f"{base_key}-{uuid.uuid4().hex[:8]}"
+                    index["successors"][base_key] = key
+                    build_path = os.path.join(self._builds_path, key)
+                else:
+                    shutil.rmtree(build_path, ignore_errors=True)
+
+            created = False
+            if not os.path.isdir(build_path):
+                self._create_build(build_path, build)
+                created = True
+
+            lease = Lease(build_path + LEASE_SUFFIX)
+            index["builds"].setdefault(key, {"created": time.time()})
+            index["builds"][key]["last_used"] = time.time()
+            self._switch_current(key)
+            if created:
+                self._evict(index, keep=key)
+            self._save_index(index)
+        return build_path, lease
+
+    def checkout(self, build_path: str, isolation: str, worker_id: str = None) -> tuple:
+        """
+        Return the working directory a browser should run from, together
+        with the Lease that has to be held while it runs.
+
+        `isolation` is one of:
+        - "shared": run straight from the (read-only) build directory;
+        - "worker": one directory per worker id, reused by its launches
+          and removed once its process is gone or its build is evicted;
+        - "instance": a private directory, removed once released.
+        Working directories hardlink every file of the build, so they cost
+        almost no disk space and never modify the shared build.
+        """
+        if isolation == "shared":
+            return build_path, None
+        if isolation not in ISOLATION_MODES:
+            raise ValueError(f"Unknown isolation mode: {isolation}")
+
+        os.makedirs(self._instances_path, exist_ok=True)
+        with file_lock(self._lock_path):
+            self._remove_stale_instances()
+            if isolation == "worker":
+                name = f"worker-{worker_id or os.getpid()}"
+                path = os.path.join(self._instances_path, name)
+                try:
+                    lease = Lease(path + LEASE_SUFFIX, shared=False, blocking=False)
+                except BlockingIOError:
+                    lease = None  # Busy with another browser of this worker
+                if lease is not None:
+                    if self._read_origin(path) != build_path:
+                        shutil.rmtree(path, ignore_errors=True)
+                        self._clone_instance(build_path, path)
+                    with open(os.path.join(path, OWNER_FILE), "w") as file:
+                        file.write(str(os.getpid()))
+                    return path, lease
+
+            name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            path = os.path.join(self._instances_path, name)
+            lease = Lease(path + LEASE_SUFFIX, shared=False)
+            self._clone_instance(build_path, path)
+            return path, lease
+
+    def checkin(self, path: str, lease: Lease) -> None:
+        """Release a working directory taken with checkout()."""
+        if lease is None:
+            return
+        if not os.path.basename(path).startswith("worker-"):
+            shutil.rmtree(path, ignore_errors=True)
+            with contextlib.suppress(OSError):
+                os.remove(lease.path)
+        lease.release()
+
+    def get_build_key(self, firefox_path: str, index: dict, variant: str = "") -> str:
+        version = read_firefox_version(firefox_path)
+        source_hash = self._get_source_hash(os.path.join(firefox_path, self.xul), index)
+        key = f"{version}-{source_hash[:16]}"
+        return f"{key}-{variant[:8]}" if variant else key
+
+    def _get_source_hash(self, source_path: str, index: dict) -> str:
+        """Hash the original libxul, reusing the last hash if it is unchanged."""
+        fingerprint = get_file_fingerprint(source_path)
+        cached = index["hashes"].get(source_path, {})
+        if all(cached.get(name) == value for name, value in fingerprint.items()):
+            return cached["sha256"]
+
+        source_hash = hash_file(source_path)
+        index["hashes"][source_path] = dict(fingerprint, sha256=source_hash)
+        return source_hash
+
+    def _create_build(self, build_path: str, build) -> None:
+        temp_path = f"{build_path}.tmp-{os.getpid()}"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        try:
+            build(temp_path)
+            os.rename(temp_path, build_path)
+        except OSError:
+            if not os.path.isdir(build_path):
+                raise
+        finally:
+            # Also after a patcher error or an interrupt, never leave a partial build
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def _switch_current(self, key: str) -> None:
+        """Atomically point the `current` symlink at the given build."""
+        link_path = os.path.join(self.path, CURRENT_LINK)
+        temp_link = f"{link_path}.tmp-{os.getpid()}"
+        target = os.path.join(BUILDS_DIR, key)
+        try:
+            if os.readlink(link_path) == target:
+                return
+        except OSError:
+            pass
+        if os.path.lexists(temp_link):
+            os.remove(temp_link)
+        os.symlink(target, temp_link)
+        os.replace(temp_link, link_path)
+
+    def _get_successor(self, index: dict, base_key: str) -> str:
+        """The key of the build replacing `base_key`'s, or `base_key` itself."""
+        key = index["successors"].get(base_key, base_key)
+        if key != base_key and not os.path.isdir(os.path.join(self._builds_path, key)):
+            del index["successors"][base_key]  # The successor was evicted
+            return base_key
+        return key
+
+    def _remove_retired(self, index: dict) -> None:
+        """Remove the retired builds no browser uses anymore."""
+        builds = index["builds"]
+        retired = [key for key in builds if builds[key].get("retired")]
+        if not retired:
+            return
+        instances = self._get_instances()
+        for key in retired:
+            build_path = os.path.join(self._builds_path, key)
+            paths = [build_path] + instances.get(build_path, [])
+            if any(is_leased(path + LEASE_SUFFIX) for path in paths):
+                continue
+            self._remove_paths(paths)
+            del builds[key]
+
+    def _remove_paths(self, paths: list) -> None:
+        """Remove builds or working directories, together with their lease files."""
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+            with contextlib.suppress(OSError):
+                os.remove(path + LEASE_SUFFIX)
+
+    def _evict(self, index: dict, keep: str) -> None:
+        """
+        Remove least recently used builds, together with the working
+        directories cloned from them, until the cache fits its limit.
+        """
+        builds = index["builds"]
+        for key in list(builds):
+            if not os.path.isdir(os.path.join(self._builds_path, key)):
+                del builds[key]
+
+        self._remove_stale_instances()
+        instances = self._get_instances()
+        usage = {}
+        for key in builds:
+            build_path = os.path.join(self._builds_path, key)
+            usage[key] = get_disk_usage(build_path, *instances.get(build_path, []))
+        total = sum(usage.values())
+        by_age = sorted(builds, key=lambda key: builds[key].get("last_used", 0))
+        for key in by_age:
+            if total <= self.size_limit:
+                break
+            build_path = os.path.join(self._builds_path, key)
+            paths = [build_path] + instances.get(build_path, [])
+            if key == keep or any(is_leased(path + LEASE_SUFFIX) for path in paths):
+                continue
+            self._remove_paths(paths)
+            del builds[key]
+            total -= usage[key]
+
+    def _clone_instance(self, build_path: str, path: str) -> None:
+        temp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        clone_firefox_tree(build_path, temp_path, mode="hardlink")
+        with open(os.path.join(temp_path, ORIGIN_FILE), "w") as file:
+            file.write(build_path)
+        os.rename(temp_path, path)
+
+    @staticmethod
+    def _read_origin(path: str) -> str:
+        try:
+            with open(os.path.join(path, ORIGIN_FILE), "r") as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def _get_instances(self) -> dict:
+        """Working directories by the build they were cloned from."""
+        instances = {}
+        if not os.path.isdir(self._instances_path):
+            return instances
+        for name in os.listdir(self._instances_path):
+            path = os.path.join(self._instances_path, name)
+            if (
+                name.endswith(LEASE_SUFFIX)
+                or ".tmp-" in name
+                or not os.path.isdir(path)
+            ):
+                continue
+            instances.setdefault(self._read_origin(path), []).append(path)
+        return instances
+
+    def _is_worker_alive(self, path: str) -> bool:
+        """Whether a free worker directory can still be reused by its worker."""
+        origin = self._read_origin(path)
+        if origin is None or not os.path.isdir(origin):
+            return False  # Its build was evicted
+        try:
+            with open(os.path.join(path, OWNER_FILE), "r") as file:
+                return is_process_alive(int(file.read()))
+        except (OSError, ValueError):
+            return False
+
+    def _remove_stale_instances(self) -> None:
+        """
+        Remove private directories whose browser is gone (e.g. crashed), and
+        worker directories whose process is gone or whose build was evicted.
+        """
+        if not os.path.isdir(self._instances_path):
+            return
+        for name in os.listdir(self._instances_path):
+            if not name.endswith(LEASE_SUFFIX):
+                continue
+            lease_path = os.path.join(self._instances_path, name)
+            if is_leased(lease_path):
+                continue
+            path = lease_path[: -len(LEASE_SUFFIX)]
+            if name.startswith("worker-") and self._is_worker_alive(path):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            with contextlib.suppress(OSError):
+                os.remove(lease_path)
+
+    def _remove_legacy_layout(self, firefox_path: str) -> None:
+        """
+        Remove the unversioned copy of `firefox_path` that older releases
+        left in the cache root. Only the entries such a copy consists of
+        are removed, anything else in the directory is left alone.
+        """
+        if not os.path.exists(os.path.join(self.path, self.xul)):
+            return
+        managed = {
+            INDEX_FILE,
+            BUILDS_DIR,
+            CURRENT_LINK,
+            INSTANCES_DIR,
+            LOCK_FILE,
+            RESOLUTION_FILE,
+            RESOLUTION_FILE + RESOLUTION_LOCK_SUFFIX,
+        }
+        for name in os.listdir(firefox_path):
+            path = os.path.join(self.path, name)
+            if name in managed or not os.path.lexists(path):
+                continue
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path, "r") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("hashes", {})
+        index.setdefault("builds", {})
+        index.setdefault("successors", {})
+        return index
+
+    def _save_index(self, index: dict) -> None:
+        temp_path = f"{self._index_path}.tmp-{os.getpid()}"
+        with open(temp_path, "w") as file:
+            json.dump(index, file, indent=2)
+        os.replace(temp_path, self._index_path)
@@ -0,0 +1,108 @@
+# Imports #
+import fcntl
+import os
+import shutil
+
+# Constants #
+FICLONE = 0x40049409  # Linux ioctl, see ioctl_ficlone(2)
+CLONE_MODES = ("auto", "hardlink", "reflink", "copy")
+METHODS_BY_MODE = {
+    "auto": ("hardlink", "reflink", "copy"),
+    "hardlink": ("hardlink", "copy"),
+    "reflink": ("reflink", "copy"),
+    "copy": ("copy",),
+}
+# Private files are modified after cloning, so they must never share an inode
+PRIVATE_METHODS = ("reflink", "copy")
+
+
+# Functions #
+def reflink_file(source: str, destination: str) -> None:
+    """Create a copy-on-write clone of a file (btrfs, XFS, ...)."""
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(destination)
+            raise
+    shutil.copystat(source, destination)
+
+
+def hardlink_file(source: str, destination: str) -> None:
+    os.link(source, destination)
+
+
+def copy_file(source: str, destination: str) -> None:
+    shutil.copy2(source, destination)
+
+
+CLONE_METHODS = {
+    "hardlink": hardlink_file,
+    "reflink": reflink_file,
+    "copy": copy_file,
+}
+
+
+def clone_file(source: str, destination: str, methods: tuple, unsupported: set) -> str:
+    """
+    Clone a single file using the first method that works and return its
+    name. Methods that fail are remembered in `unsupported`, so a
+    filesystem without link support only pays for the failure once.
+    """
+    for method in methods:
+        if method in unsupported and method != "copy":
+            continue
+        try:
+            CLONE_METHODS[method](source, destination)
+            return method
+        except OSError:
+            if method == "copy":
+                raise
+            unsupported.add(method)
+    raise OSError(f"Could not clone {source}")
+
+
+def clone_firefox_tree(
+    source: str, destination: str, private_files: tuple = (), mode: str = "auto"
+) -> dict:
+    """
+    Clone a Firefox installation directory.
+
+    Every file is hardlinked or reflinked where the filesystem allows it,
+    falling back to a full copy otherwise. Files listed in `private_files`
+    (paths relative to `source`) always get their own inode, since they
+    are patched afterwards. Returns a count of files per clone method.
+    """
+    if mode not in CLONE_MODES:
+        raise ValueError(f"Unknown clone mode: {mode}")
+
+    private_files = {os.path.normpath(path) for path in private_files}
+    counts = {method: 0 for method in CLONE_METHODS}
+    unsupported = set()
+
+    def clone_directory(source_dir: str, destination_dir: str) -> None:
+        os.makedirs(destination_dir)
+        for entry in os.scandir(source_dir):
+            entry_destination = os.path.join(destination_dir, entry.name)
+            if entry.is_dir():
+                clone_directory(entry.path, entry_destination)
+                continue
+            if not entry.is_file():
+                if entry.is_symlink():  # dangling symlink, keep it as is
+                    os.symlink(os.readlink(entry.path), entry_destination)
+                continue
+
+            relative_path = os.path.relpath(entry.path, source)
+            is_private = relative_path in private_files
+            methods = METHODS_BY_MODE[mode]
+            if is_private and mode != "copy":
+                methods = PRIVATE_METHODS
+            # Resolve symlinks, mirroring shutil.copytree's default behaviour
+            entry_source = os.path.realpath(entry.path)
+            method = clone_file(entry_source, entry_destination, methods, unsupported)
+            counts[method] += 1
+        shutil.copystat(source_dir, destination_dir)
+
+    clone_directory(source, destination)
+    return counts
@@ -1,5 +1,8 @@
 # Constants #
 TO_REPLACE_STRING = b"webdriver"
+PATCH_MARKER_SUFFIX = ".undetected.json"
+DEFAULT_CACHE_SIZE_LIMIT = 2 * 1024**3  # Bytes, across all cached builds
+PROFILE_ENV_VAR = "UNDETECTED_GECKODRIVER_PROFILE"
 
 PLATFORM_DEPENDENT_PARAMS = {
     # Do not remove, the (actual) support for Windows & macOS is coming soon
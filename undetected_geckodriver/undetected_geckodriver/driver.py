@@ -3,7 +3,6 @@ import os
 import shutil
 import time
 
-import psutil
 from selenium.webdriver.common.driver_finder import DriverFinder
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.firefox.remote_connection import FirefoxRemoteConnection
@@ -11,13 +10,21 @@ from selenium.webdriver.firefox.service import Service
 from selenium.webdriver.firefox.webdriver import WebDriver
 from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
 
-from .constants import TO_REPLACE_STRING
+from .cache import PatchedFirefoxCache, read_firefox_version
+from .clone import clone_firefox_tree
+from .constants import DEFAULT_CACHE_SIZE_LIMIT, PROFILE_ENV_VAR
 from .mixins import WebDriverMixin
-from .utils import (
-    generate_random_string,
-    get_platform_dependent_params,
-    get_webdriver_instance,
+from .patcher import (
+    DEFAULT_PATCH_SET,
+    PatchSet,
+    get_hit_counts,
+    is_patched,
+    patch_libxul,
+    read_patch_marker,
 )
+from .profiling import StartupProfile
+from .resolution import ResolutionCache
+from .utils import get_platform_dependent_params, get_webdriver_instance
 
 
 # Main class #
@@ -27,13 +34,41 @@ class Firefox(RemoteWebDriver, WebDriverMixin):
     """
 
     def __init__(
-        self, options: Options = None, service: Service = None, keep_alive: bool = True
+        self,
+        options: Options = None,
+        service: Service = None,
+        keep_alive: bool = True,
+        clone_mode: str = "auto",
+        cache_size_limit: int = DEFAULT_CACHE_SIZE_LIMIT,
+        patch_set: PatchSet = DEFAULT_PATCH_SET,
+        cache_dir: str = None,
+        profile_startup: bool = False,
+        isolation: str = "shared",
+        worker_id: str = None,
     ) -> None:
-        self.webdriver: WebDriver = get_webdriver_instance()
+        self._leases: list = []
+        self._profile: StartupProfile = StartupProfile(
+            enabled=profile_startup or bool(os.getenv(PROFILE_ENV_VAR))
+        )
+        with self._profile.phase("webdriver_instance"):
+            self.webdriver: WebDriver = get_webdriver_instance()
         self._platform_dependent_params: dict = get_platform_dependent_params()
-        self._firefox_path: str = self._get_firefox_installation_path()
-        self._undetected_path: str = self._get_undetected_firefox_path()
+        cache_path: str = cache_dir or self._get_undetected_firefox_path()
+        self._resolution: ResolutionCache = ResolutionCache(cache_path)
+        with self._profile.phase("install_discovery"):
+            self._firefox_path: str = self._get_firefox_installation_path()
+        self._cache: PatchedFirefoxCache = PatchedFirefoxCache(
+            cache_path,
+            self._platform_dependent_params["xul"],
+            cache_size_limit,
+        )
+        self._clone_mode: str = clone_mode
+        self._isolation: str = isolation
+        self._worker_id: str = worker_id
+        self._patch_set: PatchSet = patch_set
+        self.patch_report: dict = {}
 
+        # Timed inside: "clone" and "patch" on a cache miss, then "checkout"
         self._setup_firefox_environment()
 
         self.service: Service = service or Service()
@@ -41,18 +76,69 @@ class Firefox(RemoteWebDriver, WebDriverMixin):
         self.options.binary_location = self._find_platform_dependent_executable()
         self.keep_alive: bool = keep_alive
 
-        self._initialize_service()
+        try:
+            self._initialize_service()
+        except Exception:
+            self._release_undetected_firefox()
+            raise
+
+    @property
+    def startup_profile(self) -> StartupProfile:
+        """Per-phase timings of this instance, or None if profiling is off."""
+        return self._profile if self._profile.enabled else None
 
     def _setup_firefox_environment(self) -> None:
-        """Set up the undetected Firefox environment."""
-        self._create_undetected_firefox_directory()
-        self._patch_libxul_file()
+        """
+        Set up the undetected Firefox environment. The patched build is
+        taken from the cache, which rebuilds it whenever the system
+        Firefox changes.
+        """
+        build_path, build_lease = self._cache.acquire(
+            self._firefox_path,
+            self._build_undetected_firefox,
+            validate=self._is_libxul_patched,
+            variant=self._patch_set.digest(),
+        )
+        self._leases.append(build_lease)
+        with self._profile.phase("checkout"):
+            self._undetected_path, self._working_lease = self._cache.checkout(
+                build_path, self._isolation, self._worker_id
+            )
+        xul: str = self._platform_dependent_params["xul"]
+        marker: dict = read_patch_marker(os.path.join(self._undetected_path, xul))
+        self.patch_report = get_hit_counts(marker)
+
+    def quit(self) -> None:
+        """
+        Quit the browser and stop geckodriver before releasing the
+        undetected Firefox directory, which may be removed afterwards.
+        """
+        try:
+            super().quit()
+        finally:
+            self.service.stop()
+            self._release_undetected_firefox()
+
+    def _release_undetected_firefox(self) -> None:
+        working_lease = self.__dict__.pop("_working_lease", None)
+        if working_lease is not None:
+            self._cache.checkin(self._undetected_path, working_lease)
+        while self._leases:
+            self._leases.pop().release()
+
+    def _build_undetected_firefox(self, path: str) -> None:
+        """Build a patched copy of Firefox in the given directory."""
+        with self._profile.phase("clone"):
+            self._create_undetected_firefox_directory(path)
+        with self._profile.phase("patch"):
+            self._patch_libxul_file(path)
 
     def _initialize_service(self) -> None:
         """Initialize the Firefox service and remote connection."""
-        finder = DriverFinder(self.service, self.options)
-        self.service.path = finder.get_driver_path()
-        self.service.start()
+        with self._profile.phase("driver_path"):
+            self.service.path = self._get_driver_path()
+        with self._profile.phase("service_start"):
+            self.service.start()
 
         executor = FirefoxRemoteConnection(
             remote_server_addr=self.service.service_url,
@@ -60,13 +146,25 @@ class Firefox(RemoteWebDriver, WebDriverMixin):
             ignore_proxy=self.options._ignore_local_proxy,
         )
         try:
-            super().__init__(command_executor=executor, options=self.options)
+            with self._profile.phase("session"):
+                super().__init__(command_executor=executor, options=self.options)
         except Exception:
             self.quit()
             raise
 
         self._is_remote = False
 
+    def _get_driver_path(self) -> str:
+        """
+        Get the geckodriver path. Selenium's DriverFinder may spawn
+        selenium-manager, so its answer is cached per Firefox version.
+        """
+        finder = DriverFinder(self.service, self.options)
+        if self.service.path:
+            return finder.get_driver_path()
+        version: str = read_firefox_version(self._firefox_path)
+        return self._resolution.get_driver_path(version, finder.get_driver_path)
+
     def _get_firefox_installation_path(self) -> str:
         """
         Unlike _get_binary_location, this method returns the path to the
@@ -82,24 +180,34 @@ class Firefox(RemoteWebDriver, WebDriverMixin):
         # Fixes #4
         # If the first method fails, we can try to find the path by running
         # Firefox, checking its process path, and then killing it using psutil.
-        # This is a last resort method, and might slow down the initialization.
+        # This is a last resort method, and might slow down the initialization,
+        # so its result is cached for as long as the executable is unchanged.
         for firefox_exec in self._platform_dependent_params["firefox_execs"]:
-            if shutil.which(firefox_exec):
-                process = psutil.Popen(
-                    [firefox_exec, "--headless", "--new-instance"],
-                    stdout=psutil.subprocess.DEVNULL,
-                    stderr=psutil.subprocess.DEVNULL,
+            exec_path = shutil.which(firefox_exec)
+            if exec_path:
+                return self._resolution.get_installation_path(
+                    exec_path, lambda: self._locate_running_firefox(firefox_exec)
                 )
-                time.sleep(0.1)  # Wait for the process to truly start
-                process_dir = os.path.dirname(process.exe())
-                # Kill the process
-                process.kill()
-                return process_dir
 
         raise FileNotFoundError("Could not find Firefox installation path")
 
+    def _locate_running_firefox(self, firefox_exec: str) -> str:
+        """Start Firefox, read the directory of its process and kill it."""
+        import psutil
+
+        process = psutil.Popen(
+            [firefox_exec, "--headless", "--new-instance"],
+            stdout=psutil.subprocess.DEVNULL,
+            stderr=psutil.subprocess.DEVNULL,
+        )
+        time.sleep(0.1)  # Wait for the process to truly start
+        process_dir = os.path.dirname(process.exe())
+        # Kill the process
+        process.kill()
+        return process_dir
+
     def _get_undetected_firefox_path(self) -> str:
-        """Get the path for the undetected Firefox."""
+        """Get the path of the cache holding the undetected Firefox builds."""
         try:
             user = os.getlogin()
         except OSError:
@@ -108,27 +216,44 @@ class Firefox(RemoteWebDriver, WebDriverMixin):
             USER=user
         )
 
-    def _create_undetected_firefox_directory(self) -> str:
-        """Create a directory for the undetected Firefox if it doesn't exist."""
-        if not os.path.exists(self._undetected_path):
-            shutil.copytree(self._firefox_path, self._undetected_path)
-        return self._undetected_path
+    def _create_undetected_firefox_directory(self, path: str) -> str:
+        """
+        Create a directory for the undetected Firefox.
+        Untouched files are hardlinked or reflinked from the original
+        installation (see `clone_mode`), only libxul gets a private copy.
+        """
+        clone_firefox_tree(
+            self._firefox_path,
+            path,
+            private_files=(self._platform_dependent_params["xul"],),
+            mode=self._clone_mode,
+        )
+        return path
+
+    def _is_libxul_patched(self, path: str) -> bool:
+        """Check the patch marker of the libxul file in the given directory."""
+        xul: str = self._platform_dependent_params["xul"]
+        return is_patched(
+            os.path.join(path, xul),
+            os.path.join(self._firefox_path, xul),
+            self._patch_set,
+        )
 
-    def _patch_libxul_file(self) -> None:
-        """Patch the libxul file in the undetected Firefox directory."""
+    def _patch_libxul_file(self, path: str) -> None:
+        """
+        Patch the libxul file in the given undetected Firefox directory.
+        Skipped when the patch marker shows the copy is already patched.
+        """
         xul: str = self._platform_dependent_params["xul"]
-        libxul_path: str = os.path.join(self._undetected_path, xul)
+        libxul_path: str = os.path.join(path, xul)
         if not os.path.exists(libxul_path):
             raise FileNotFoundError(f"Could not find {xul}")
 
-        with open(libxul_path, "rb") as file:
-            libxul_data = file.read()
-
-        random_string: str = generate_random_string(len(TO_REPLACE_STRING))
-        random_bytes: bytes = random_string.encode()
-        libxul_data: bytes = libxul_data.replace(TO_REPLACE_STRING, random_bytes)
-        with open(libxul_path, "wb") as file:
-            file.write(libxul_data)
+        if self._is_libxul_patched(path):
+            return
+        patch_libxul(
+            libxul_path, os.path.join(self._firefox_path, xul), self._patch_set
+        )
 
     def _find_platform_dependent_executable(self) -> str:
         """Find the platform-dependent executable for patched Firefox."""
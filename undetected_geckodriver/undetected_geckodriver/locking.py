@@ -0,0 +1,67 @@
+# Imports #
+import contextlib
+import fcntl
+import os
+
+
+# Classes #
+class Lease:
+    """
+    An advisory flock(2) held on a file until `release()` is called or the
+    process exits. Shared leases mark something as in use; an exclusive
+    lease marks it as owned by a single process.
+    """
+
+    def __init__(self, path: str, shared: bool = True, blocking: bool = True) -> None:
+        self.path: str = path
+        self._file = open(path, "a")
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(self._file.fileno(), flags)
+        except OSError:
+            self._file.close()
+            raise
+
+    def release(self) -> None:
+        if not self._file.closed:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+
+
+# Functions #
+@contextlib.contextmanager
+def file_lock(path: str):
+    """Hold an exclusive lock on `path` for the duration of the block."""
+    lease = Lease(path, shared=False)
+    try:
+        yield
+    finally:
+        lease.release()
+
+
+def is_leased(path: str) -> bool:
+    """Check whether any process currently holds a lease on `path`."""
+    if not os.path.exists(path):
+        return False
+    try:
+        Lease(path, shared=False, blocking=False).release()
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def is_process_alive(pid: int) -> bool:
+    """Check whether a process with the given PID exists."""
+    if not pid or pid < 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Alive, but owned by another user
+    return True
@@ -0,0 +1,186 @@
+# Imports #
+import hashlib
+import json
+import mmap
+import os
+import re
+from typing import Iterator, Tuple
+
+from .constants import PATCH_MARKER_SUFFIX, TO_REPLACE_STRING
+from .utils import generate_random_string
+
+# Constants #
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# Classes #
+class PatchSet:
+    """
+    A set of byte signatures to rewrite in libxul. Each signature maps to
+    a replacement of the same length, or to None for a random replacement
+    generated at patch time. All signatures are matched in a single pass.
+    """
+
+    def __init__(self, signatures: dict) -> None:
+        if not signatures:
+            raise ValueError("A patch set needs at least one signature")
+        for signature, replacement in signatures.items():
+            if not signature:
+                raise ValueError("Signatures must not be empty")
+            if replacement is not None and len(replacement) != len(signature):
+                raise ValueError(
+                    f"Replacement for {signature!r} must be {len(signature)} bytes long"
+                )
+
+        self.signatures: dict = dict(signatures)
+        self._pattern = re.compile(
+            b"|".join(
+                re.escape(signature)
+                for signature in sorted(self.signatures, key=len, reverse=True)
+            ),
+            re.DOTALL,
+        )
+
+    def digest(self) -> str:
+        """A stable identifier of the signatures and fixed replacements."""
+        digest = hashlib.sha256()
+        for signature in sorted(self.signatures):
+            replacement = self.signatures[signature]
+            digest.update(signature.hex().encode() + b":")
+            digest.update(replacement.hex().encode() if replacement else b"*")
+            digest.update(b";")
+        return digest.hexdigest()
+
+    def get_replacements(self) -> dict:
+        """Resolve the replacement of every signature for one patch run."""
+        return {
+            signature: replacement or generate_random_string(len(signature)).encode()
+            for signature, replacement in self.signatures.items()
+        }
+
+    def find(self, data) -> Iterator[Tuple[int, bytes]]:
+        """
+        Yield (offset, signature) for every match in a bytes-like object.
+
+        All signatures are compiled into one alternation, so the data is
+        walked once whatever their number. Overlapping matches are resolved
+        in favour of the earliest one, and of the longest signature at the
+        same offset (alternatives are tried longest first).
+        """
+        for match in self._pattern.finditer(data):
+            yield match.start(), match.group()
+
+
+DEFAULT_PATCH_SET = PatchSet({TO_REPLACE_STRING: None})
+
+
+# Functions #
+def get_file_fingerprint(path: str) -> dict:
+    """Return a cheap identity (size, mtime, inode) for the given file."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino}
+
+
+def hash_file(path: str) -> str:
+    """Compute the SHA-256 of a file without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_marker_path(libxul_path: str) -> str:
+    return libxul_path + PATCH_MARKER_SUFFIX
+
+
+def read_patch_marker(libxul_path: str) -> dict:
+    """Read the patch marker stored next to libxul, or None if absent."""
+    try:
+        with open(get_marker_path(libxul_path), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def is_patched(
+    libxul_path: str, source_path: str, patch_set: PatchSet = DEFAULT_PATCH_SET
+) -> bool:
+    """
+    Check whether libxul was already patched from the current source with
+    the given patch set. Only file metadata is compared, so this never
+    reads the library.
+    """
+    marker = read_patch_marker(libxul_path)
+    if marker is None or marker.get("patch_set") != patch_set.digest():
+        return False
+
+    try:
+        target = get_file_fingerprint(libxul_path)
+        source = get_file_fingerprint(source_path)
+    except OSError:
+        return False
+
+    recorded_source = marker.get("source", {})
+    recorded_target = marker.get("target", {})
+    return (
+        recorded_source.get("size") == source["size"]
+        and recorded_source.get("mtime_ns") == source["mtime_ns"]
+        and recorded_target.get("size") == target["size"]
+        and recorded_target.get("mtime_ns") == target["mtime_ns"]
+    )
+
+
+def patch_libxul(
+    libxul_path: str, source_path: str, patch_set: PatchSet = DEFAULT_PATCH_SET
+) -> dict:
+    """
+    Patch libxul in place and record a marker next to it.
+
+    The library is memory-mapped and scanned once for all signatures of
+    the patch set. Only the matched byte ranges are rewritten, so neither
+    the whole file nor a modified copy of it is ever held in memory or
+    written back to disk. The returned marker holds per-signature hits.
+    """
+    source_hash = hash_file(source_path)
+    replacements = patch_set.get_replacements()
+    offsets = {signature: [] for signature in replacements}
+
+    if os.path.getsize(libxul_path) > 0:
+        with open(libxul_path, "r+b") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE) as mapped:
+                matches = list(patch_set.find(mapped))
+                for offset, signature in matches:
+                    offsets[signature].append(offset)
+                    mapped[offset : offset + len(signature)] = replacements[signature]
+                if matches:
+                    mapped.flush()
+
+    marker = {
+        "source": dict(get_file_fingerprint(source_path), sha256=source_hash),
+        "target": get_file_fingerprint(libxul_path),
+        "patch_set": patch_set.digest(),
+        "signatures": {
+            signature.decode("latin-1"): {
+                "count": len(signature_offsets),
+                "offsets": signature_offsets,
+            }
+            for signature, signature_offsets in offsets.items()
+        },
+    }
+    marker_path = get_marker_path(libxul_path)
+    temp_path = marker_path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(marker, file)
+    os.replace(temp_path, marker_path)
+    return marker
+
+
+def get_hit_counts(marker: dict) -> dict:
+    """Return the number of patched occurrences per signature of a marker."""
+    if not marker:
+        return {}
+    return {
+        signature.encode("latin-1"): entry["count"]
+        for signature, entry in marker.get("signatures", {}).items()
+    }
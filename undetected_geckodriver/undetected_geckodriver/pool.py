@@ -0,0 +1,218 @@
+# Imports #
+import collections
+import contextlib
+import threading
+import time
+
+# Constants #
+RETRY_DELAY = 1.0  # Seconds, doubled after every failed launch
+MAX_RETRY_DELAY = 30.0
+
+
+# Functions #
+def default_health_check(driver) -> bool:
+    """A session is healthy if it still executes scripts."""
+    try:
+        return driver.execute_script("return 1") == 1
+    except Exception:
+        return False
+
+
+def reset_session(driver) -> None:
+    """Close extra windows and leave the remaining one on a blank page."""
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+    driver.get("about:blank")
+
+
+# Main class #
+class FirefoxPool:
+    """
+    A pool of pre-launched undetected Firefox sessions.
+
+    A background thread keeps `size` idle sessions ready. Taking one with
+    `acquire()` immediately starts launching its replacement, unless the
+    pool already holds `max_live` sessions (e.g. when every browser has to
+    share one locked Firefox profile). Released sessions are reused until
+    they served `max_uses` callers or fail `health_check`, then they are
+    quit in the background and replaced.
+
+    With `prefill=False` nothing is launched ahead of time: a session is
+    only started while a caller waits in `acquire()`, so no browser starts
+    between two uses (e.g. outside of a traffic capture).
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        max_uses: int = 10,
+        max_live: int = None,
+        health_check=default_health_check,
+        factory=None,
+        prefill: bool = True,
+        **firefox_kwargs,
+    ) -> None:
+        if factory is None:
+            from .driver import Firefox
+
+            def factory():
+                return Firefox(**firefox_kwargs)
+
+        self.size: int = size
+        self.max_uses: int = max_uses
+        self.max_live: int = max_live
+        self.health_check = health_check
+        self.factory = factory
+        self.prefill: bool = prefill
+
+        self._idle: collections.deque = collections.deque()
+        self._uses: dict = {}
+        self._live: int = 0
+        self._launching: int = 0
+        self._waiting: int = 0
+        self._closed: bool = False
+        self._last_error: Exception = None
+        self._condition = threading.Condition()
+        self._launcher = threading.Thread(
+            target=self._launch_loop, name="firefox-pool", daemon=True
+        )
+        self._launcher.start()
+
+    def acquire(self, timeout: float = None):
+        """Take a ready session, waiting up to `timeout` seconds for one."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._waiting += 1
+            self._condition.notify_all()
+            try:
+                while not self._idle:
+                    if self._closed:
+                        raise RuntimeError("The pool is closed")
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(
+                            f"No Firefox session ready after {timeout}s "
+                            f"(last launch error: {self._last_error!r})"
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+            driver = self._idle.popleft()
+            self._condition.notify_all()
+            return driver
+
+    def release(self, driver, healthy: bool = True, wait: bool = False) -> None:
+        """
+        Give a session back to the pool, recycling it if needed. With
+        `wait`, a recycled session is quit before this returns.
+        """
+        with self._condition:
+            self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+            worn_out = self._uses[id(driver)] >= self.max_uses
+            surplus = len(self._idle) >= self.size
+            closed = self._closed
+
+        if healthy and not worn_out and not surplus and not closed:
+            try:
+                reset_session(driver)
+                healthy = self.health_check(driver)
+            except Exception:
+                healthy = False
+            if healthy:
+                with self._condition:
+                    # close() may have drained the pool meanwhile
+                    if not self._closed:
+                        self._idle.appendleft(driver)
+                        self._condition.notify_all()
+                        return
+
+        if wait:
+            self._quit(driver)
+        else:
+            self._retire(driver)
+
+    @contextlib.contextmanager
+    def session(self, timeout: float = None):
+        """Context manager around acquire() and release()."""
+        driver = self.acquire(timeout)
+        try:
+            yield driver
+        except Exception:
+            self.release(driver, healthy=self.health_check(driver))
+            raise
+        self.release(driver)
+
+    def close(self) -> None:
+        """Stop launching and quit every idle session."""
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._condition.notify_all()
+        for driver in idle:
+            self._quit(driver)
+
+    def __enter__(self) -> "FirefoxPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _can_launch(self) -> bool:
+        starting = len(self._idle) + self._launching
+        if starting >= self.size:
+            return False
+        if not self.prefill and self._launching >= self._waiting:
+            return False
+        return self.max_live is None or self._live + self._launching < self.max_live
+
+    def _launch_loop(self) -> None:
+        delay = RETRY_DELAY
+        while True:
+            with self._condition:
+                while not self._closed and not self._can_launch():
+                    self._condition.wait()
+                if self._closed:
+                    return
+                self._launching += 1
+
+            try:
+                driver = self.factory()
+            except Exception as error:
+                with self._condition:
+                    self._launching -= 1
+                    self._last_error = error
+                    self._condition.notify_all()
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+
+            delay = RETRY_DELAY
+            with self._condition:
+                self._launching -= 1
+                self._live += 1
+                self._uses[id(driver)] = 0
+                closed = self._closed
+                if not closed:
+                    self._idle.append(driver)
+                self._condition.notify_all()
+            if closed:
+                self._quit(driver)
+
+    def _retire(self, driver) -> None:
+        threading.Thread(target=self._quit, args=(driver,), daemon=True).start()
+
+    def _quit(self, driver) -> None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._condition:
+            self._uses.pop(id(driver), None)
+            self._live -= 1
+            self._condition.notify_all()
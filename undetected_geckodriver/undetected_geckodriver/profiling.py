@@ -0,0 +1,199 @@
+"""
+Startup profiling for undetected_geckodriver.Firefox.
+
+Run `python -m undetected_geckodriver.profiling --runs 5` to launch the
+browser repeatedly, with a fresh cache (cold) and with a prepared cache
+(warm), and print per-phase percentiles.
+"""
+
+# Imports #
+import argparse
+import contextlib
+import shutil
+import tempfile
+import threading
+import time
+from typing import NamedTuple
+
+# Constants #
+PROC_STATUS = "/proc/self/status"
+SAMPLE_INTERVAL = 0.01  # Seconds between two RSS samples during a phase
+PERCENTILES = (50, 90, 99)
+
+
+# Classes #
+class PhaseTiming(NamedTuple):
+    name: str
+    wall_time: float  # Seconds
+    peak_rss: int  # Bytes, highest resident set size sampled during the phase
+    rss_delta: int  # Bytes, resident set size after minus before the phase
+
+
+class RssSampler:
+    """
+    Samples the resident set size of this process in a background thread
+    and keeps the highest value. Unlike resetting VmHWM through
+    /proc/self/clear_refs, this leaves the process's own peak untouched.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        self.interval: float = interval
+        self.peak: int = get_rss()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="rss-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> int:
+        """Stop sampling and return the peak."""
+        self._stopped.set()
+        self._thread.join()
+        self.peak = max(self.peak, get_rss())
+        return self.peak
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, get_rss())
+
+
+class StartupProfile:
+    """Per-phase wall time and memory of a single Firefox construction."""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled: bool = enabled
+        self.phases: list = []
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        rss_before = get_rss()
+        sampler = RssSampler()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - started
+            peak_rss = sampler.stop()
+            rss_after = get_rss()
+            self.phases.append(
+                PhaseTiming(name, wall_time, peak_rss, rss_after - rss_before)
+            )
+
+    @property
+    def total_time(self) -> float:
+        return sum(phase.wall_time for phase in self.phases)
+
+    def as_dict(self) -> dict:
+        return {
+            "total_time": self.total_time,
+            "phases": [phase._asdict() for phase in self.phases],
+        }
+
+    def __repr__(self) -> str:
+        phases = ", ".join(
+            f"{phase.name}={phase.wall_time:.3f}s" for phase in self.phases
+        )
+        return f"StartupProfile({phases})"
+
+
+# Functions #
+def _read_status_kb(field: str) -> int:
+    try:
+        with open(PROC_STATUS, "r") as file:
+            for line in file:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def get_rss() -> int:
+    return _read_status_kb("VmRSS")
+
+
+def percentile(values: list, percent: float) -> float:
+    """Linearly interpolated percentile of a list of numbers."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def launch_once(cache_dir: str, headless: bool) -> StartupProfile:
+    from selenium.webdriver.firefox.options import Options
+
+    from .driver import Firefox
+
+    options = Options()
+    if headless:
+        options.add_argument("--headless")
+    driver = Firefox(options=options, cache_dir=cache_dir, profile_startup=True)
+    try:
+        return driver.startup_profile
+    finally:
+        driver.quit()
+
+
+def print_report(label: str, profiles: list) -> None:
+    names = []
+    for profile in profiles:
+        for phase in profile.phases:
+            if phase.name not in names:
+                names.append(phase.name)
+
+    header = "".join(f"{f'p{p}':>10}" for p in PERCENTILES)
+    print(f"\n{label} ({len(profiles)} runs)")
+    print(f"{'phase':<20}{header}{'peak RSS':>12}")
+    for name in names + ["total"]:
+        if name == "total":
+            times = [profile.total_time for profile in profiles]
+            peaks = [0]
+        else:
+            phases = [
+                p for profile in profiles for p in profile.phases if p.name == name
+            ]
+            times = [phase.wall_time for phase in phases]
+            peaks = [phase.peak_rss for phase in phases]
+        row = "".join(f"{percentile(times, p):>9.3f}s" for p in PERCENTILES)
+        peak = f"{max(peaks) / 1024 ** 2:>10.1f}MB" if max(peaks) else ""
+        print(f"{name:<20}{row}{peak:>12}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="launches per mode")
+    parser.add_argument(
+        "--no-headless", action="store_true", help="show the browser window"
+    )
+    args = parser.parse_args()
+    headless = not args.no_headless
+
+    cold_profiles = []
+    for _ in range(args.runs):
+        cache_dir = tempfile.mkdtemp(prefix="undetected_firefox_cold_")
+        try:
+            cold_profiles.append(launch_once(cache_dir, headless))
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    cache_dir = tempfile.mkdtemp(prefix="undetected_firefox_warm_")
+    try:
+        launch_once(cache_dir, headless)  # Prepare the cache
+        warm_profiles = [launch_once(cache_dir, headless) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print_report("Cold launches", cold_profiles)
+    print_report("Warm launches", warm_profiles)
+
+
+if __name__ == "__main__":
+    main()
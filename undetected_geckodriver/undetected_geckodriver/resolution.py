@@ -0,0 +1,88 @@
+# Imports #
+import json
+import os
+
+from .locking import file_lock
+
+# Constants #
+RESOLUTION_FILE = "resolution.json"
+LOCK_SUFFIX = ".lock"
+
+
+# Main class #
+class ResolutionCache:
+    """
+    A small persisted cache for lookups that are slow or spawn processes:
+    the geckodriver path (selenium-manager) and the Firefox installation
+    directory (which, as a last resort, requires launching Firefox).
+
+    Every entry stores the mtime of the file it resolved to, and is only
+    reused while that file is unchanged.
+    """
+
+    def __init__(self, cache_path: str) -> None:
+        self.path: str = os.path.join(cache_path, RESOLUTION_FILE)
+
+    def get_driver_path(self, browser_version: str, resolve) -> str:
+        """Return the geckodriver path for a Firefox version."""
+        return self._get("drivers", browser_version, resolve, executable=True)
+
+    def get_installation_path(self, firefox_exec: str, resolve) -> str:
+        """Return the installation directory of a Firefox executable."""
+        key = os.path.realpath(firefox_exec)
+        try:
+            mtime_ns = os.stat(key).st_mtime_ns
+        except OSError:
+            return resolve()
+
+        entries = self._load().get("installations", {})
+        entry = entries.get(key, {})
+        if entry.get("mtime_ns") == mtime_ns and os.path.isdir(entry.get("path", "")):
+            return entry["path"]
+
+        path = resolve()
+        self._store("installations", key, {"path": path, "mtime_ns": mtime_ns})
+        return path
+
+    def _get(self, section: str, key: str, resolve, executable: bool) -> str:
+        entry = self._load().get(section, {}).get(key, {})
+        path = entry.get("path")
+        if path and self._is_unchanged(path, entry.get("mtime_ns"), executable):
+            return path
+
+        path = resolve()
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return path
+        self._store(section, key, {"path": path, "mtime_ns": mtime_ns})
+        return path
+
+    @staticmethod
+    def _is_unchanged(path: str, mtime_ns: int, executable: bool) -> bool:
+        try:
+            if os.stat(path).st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            return False
+        return not executable or os.access(path, os.X_OK)
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _store(self, section: str, key: str, entry: dict) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with file_lock(self.path + LOCK_SUFFIX):
+                data = self._load()
+                data.setdefault(section, {})[key] = entry
+                temp_path = f"{self.path}.tmp-{os.getpid()}"
+                with open(temp_path, "w") as file:
+                    json.dump(data, file, indent=2)
+                os.replace(temp_path, self.path)
+        except OSError:
+            pass  # The cache is an optimisation only
@@ -2,14 +2,18 @@
 import platform
 import random
 import string
-
-from selenium import webdriver
+from typing import TYPE_CHECKING
 
 from .constants import PLATFORM_DEPENDENT_PARAMS
 
+if TYPE_CHECKING:  # Imported lazily at runtime, see get_webdriver_instance()
+    from selenium import webdriver
+
 
 # Functions #
-def get_webdriver_instance() -> webdriver.Firefox:
+def get_webdriver_instance() -> "webdriver.Firefox":
+    from selenium import webdriver
+
     return webdriver.Firefox.__new__(webdriver.Firefox)
 
 